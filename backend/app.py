@@ -1,31 +1,69 @@
+import os
 from flask import Flask, request, jsonify, session
-from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
 from flask_restful import Api, Resource
-from models import Staff, AdvanceLoan, Client, CoatMeasurement, RegularShirtMeasurement, SenatorShirtMeasurement, TrouserMeasurement, Inventory
+from extensions import db, get_bcrypt, track_app
+from models import Staff, AdvanceLoan, Client, Inventory, GARMENT_FIELDS
 from datetime import datetime,timezone, timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
-
-app = Flask(__name__)
-
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///inventory_system.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = 'chamanenyun'  #secure key
-
-# Initialize the database and Flask-RESTful API
-db = SQLAlchemy(app)
-api = Api(app)
-bcrypt = Bcrypt(app)
-session(app)
+from lazy import lazy_resource
+from commands import COMMANDS
+from metrics import init_metrics
+from query_log import DebugQueries, init_query_log
+from profiler import Profile, init_profiler
+from changes import Changes
+from events import Events
+from garment_orders import GarmentOrders, legacy_resources
+from work_orders import BulkUpdate
+from scheduler import Schedule
+from archive import archived_rows, include_archived, init_archive
+from revenue import RevenueReport
+from groups import Groups, Group
+from idempotency import idempotent
+from etags import precondition_failed, stale, tagged, versioned
+from batch import Batch
+from compression import cached_json, init_compression
+
+# Default configuration, overridden by whatever is passed to create_app
+DEFAULT_CONFIG = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///inventory_system.db',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'SECRET_KEY': 'chamanenyun',  #secure key
+    'METRICS_ENABLED': True,
+    'METRICS_DIR': None,  # shared directory for merging metrics across worker processes
+    'QUERY_LOG_ENABLED': True,
+    'SLOW_QUERY_MS': 100,
+    'N_PLUS_ONE_THRESHOLD': 10,  # identical statements in one request before it is flagged
+    'PROFILER_ENABLED': False,
+    'ARCHIVE_DATABASE': None,  # SQLite file for archived rows; defaults to <database>_archive.db beside it
+    'ARCHIVE_AFTER_DAYS': 180,  # default age for `flask archive`
+    'IDEMPOTENCY_TTL': 24 * 3600,  # seconds a response is replayed to retries with the same Idempotency-Key
+    'BATCH_MAX_REQUESTS': 20,  # sub-requests allowed in one POST /batch
+    'COMPRESSION_ENABLED': True,
+    'COMPRESSION_MIN_SIZE': 1024,  # bytes; smaller bodies are sent uncompressed
+    'RESPONSE_CACHE_SECONDS': 300,  # longest a worker reuses a cached list response without rebuilding it
+    'SCHEDULER_MAX_LOAD': 25,  # open orders a tailor may hold before the scheduler passes them over; None for no limit
+}
+
+# Resources are collected here and bound to every app built by create_app
+api = Api()
 
 # Hash the password
 def hash_password(password):
-    return bcrypt.generate_password_hash(password).decode('utf-8')
+    return get_bcrypt().generate_password_hash(password).decode('utf-8')
 
 # Check if the password matches
 def check_password(hashed_password, password):
-    return bcrypt.check_password_hash(hashed_password, password)
+    return get_bcrypt().check_password_hash(hashed_password, password)
+
+# Dates arrive as ISO strings ("2024-05-01" or "2024-05-01T10:00:00"); anything else raises ValueError
+def parse_date(value):
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(value)
+    return datetime.fromisoformat(value)
+
+BAD_PICKUP_DATE = {"message": "'pickup_date' must be a date like 2024-05-01"}
 
 class Login(Resource):
     def post(self):
@@ -39,7 +77,7 @@ class Login(Resource):
             user = Client.query.filter_by(email=email).first()
 
         if not user or not check_password_hash(user.password, password):
-            return jsonify({"message": "Invalid credentials"}), 401
+            return {"message": "Invalid credentials"}, 401
 
         # Store user details in session
         session['user_id'] = user.id
@@ -51,7 +89,7 @@ class Login(Resource):
         else:
             session['role'] = None  # Empty role for clients
 
-        return jsonify({"message": "Login successful", "role": session['role']}), 200
+        return {"message": "Login successful", "role": session['role']}, 200
 
 api.add_resource(Login, '/login')
 
@@ -65,7 +103,7 @@ api.add_resource(Login, '/login')
 
 #         # Check if email already exists    
 #         if Client.query.filter_by(email=email).first():
-#             return jsonify({"message": "Email already taken. Kindly Sign in."}), 400
+#             return {"message": "Email already taken. Kindly Sign in."}, 400
 
 #         # Hash password before saving
 #         password_hash = hash_password(password)
@@ -74,22 +112,23 @@ api.add_resource(Login, '/login')
 #         new_user = Client(username=username, password=password_hash, phone=phone, email=email, created_by=1)  # Assuming created_by is the Staff ID (admin or CEO)
 #         db.session.add(new_user)
 #         db.session.commit()
-#         return jsonify({"message": "Client created successfully"}), 201
+#         return {"message": "Client created successfully"}, 201
 
 # api.add_resource(SignUp, '/signup')  # Sign up route for clients only
 
 class Logout(Resource):
     def post(self):
         session.clear()
-        return jsonify({"message": "Logged out successfully"}), 200
+        return {"message": "Logged out successfully"}, 200
 
 api.add_resource(Logout, '/logout')
 
 class CreateStaff(Resource):
+    @idempotent
     def post(self):
         # Check if the logged-in user is Admin or CEO
         if 'role' not in session or session['role'] not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized access"}), 403
+            return {"message": "Unauthorized access"}, 403
 
         # Get data from request
         data = request.get_json()
@@ -103,9 +142,9 @@ class CreateStaff(Resource):
 
         # Check if the email or national ID already exists
         if Staff.query.filter_by(email=email).first():
-            return jsonify({"message": "Email already exists"}), 400
+            return {"message": "Email already exists"}, 400
         if Staff.query.filter_by(national_id=national_id).first():
-            return jsonify({"message": "National ID already exists"}), 400
+            return {"message": "National ID already exists"}, 400
 
         # Hash the password before storing
         hashed_password = generate_password_hash(password)
@@ -118,15 +157,16 @@ class CreateStaff(Resource):
         db.session.add(staff)
         db.session.commit()
 
-        return jsonify({"message": "Staff created successfully"}), 201
+        return {"message": "Staff created successfully"}, 201
 
 api.add_resource(CreateStaff, '/create_staff')
 
 class CreateClient(Resource):
+    @idempotent
     def post(self):
         # Check if the logged-in user is Admin or CEO
-        if 'role' not in session and session['role'] not in ['ADMIN', 'CEO', "MANAGER"]:
-            return jsonify({"message": "Unauthorized access"}), 403
+        if 'role' not in session or session['role'] not in ['ADMIN', 'CEO', "MANAGER"]:
+            return {"message": "Unauthorized access"}, 403
 
         # Get data from request
         data = request.get_json()
@@ -135,19 +175,22 @@ class CreateClient(Resource):
         email = data.get('email')
         buying_price = data.get('buying_price')
         balance_amount = data.get('balance_amount')
-        pickup_date = data.get('pickup_date')
+        try:
+            pickup_date = parse_date(data.get('pickup_date'))
+        except ValueError:
+            return BAD_PICKUP_DATE, 400
         group_name = data.get('group_name')
         created_by = data.get('created_by')  # This should be the ID of the admin/ceo/manager who is currently on session
         password = data.get('password')
 
         # Check if the email already exists
         if Client.query.filter_by(email=email).first():
-            return jsonify({"message": "Email already exists"}), 400
+            return {"message": "Email already exists"}, 400
 
         # Check if created_by exists and is an Admin or CEO
         creator = Staff.query.get(created_by)
         if not creator or creator.role not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized creator"}), 403
+            return {"message": "Unauthorized creator"}, 403
 
         # Hash the password before storing
         hashed_password = generate_password_hash(password)
@@ -162,7 +205,7 @@ class CreateClient(Resource):
         db.session.add(client)
         db.session.commit()
 
-        return jsonify({"message": "Client created successfully"}), 201
+        return {"message": "Client created successfully"}, 201
 
 api.add_resource(CreateClient, '/create_client')
 
@@ -170,7 +213,7 @@ api.add_resource(CreateClient, '/create_client')
 class Home(Resource):
     def get(self):
         if 'user_id' in session:
-            return f"Welcome back, {session['user_name']}!"
+            return f"Welcome back, {session['username']}!"
         return "Welcome to the Inventory Management System!"
 
 api.add_resource(Home, '/')
@@ -179,8 +222,11 @@ api.add_resource(Home, '/')
 class StaffList(Resource):
     def get(self):
         if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
-        
+            return {"message": "Unauthorized"}, 401
+
+        return cached_json(['staff'], self.rows)
+
+    def rows(self):
         staff = Staff.query.all()
         staff_list = []
         for s in staff:
@@ -190,12 +236,11 @@ class StaffList(Resource):
                 'phone': s.phone,
                 'email': s.email,
                 'passport': s.passport,
-                'role': s.role,
-                'status': s.status
+                'role': s.role
             }
             staff_list.append(staff_data)
-        
-        return jsonify(staff_list)
+
+        return staff_list
 
 api.add_resource(StaffList, '/staffs')
 
@@ -203,11 +248,11 @@ api.add_resource(StaffList, '/staffs')
 class StaffResource(Resource):
     def get(self, id):
         if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
         staff = Staff.query.get(id)
         if not staff:
-            return jsonify({"message": "Staff not found"}), 404
+            return {"message": "Staff not found"}, 404
         
         staff_data = {
             'id': staff.id,
@@ -217,20 +262,22 @@ class StaffResource(Resource):
             'email': staff.email,
             'passport': staff.passport,
             'role': staff.role,
-            'status': staff.status,
             'salary': staff.salary,
             'created_at': staff.created_at
         }
         
-        return jsonify(staff_data)
+        return tagged(jsonify(staff_data), staff.version)
 
+    @versioned
     def patch(self, id):
         if 'user_id' not in session or session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
         staff = Staff.query.get(id)
         if not staff:
-            return jsonify({"message": "Staff not found"}), 404
+            return {"message": "Staff not found"}, 404
+        if stale(staff):
+            return precondition_failed()
         
         data = request.get_json()
         if 'username' in data:
@@ -250,13 +297,16 @@ class StaffResource(Resource):
         
         return jsonify({"message": "Staff updated successfully"})
 
+    @versioned
     def delete(self, id):
         if 'user_id' not in session or session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
         staff = Staff.query.get(id)
         if not staff:
-            return jsonify({"message": "Staff not found"}), 404
+            return {"message": "Staff not found"}, 404
+        if stale(staff):
+            return precondition_failed()
         
         db.session.delete(staff)
         db.session.commit()
@@ -270,8 +320,11 @@ api.add_resource(StaffResource, '/staff/<int:id>')
 class ClientList(Resource):
     def get(self):
         if 'user_id' not in session and session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
+        return cached_json(['client'], self.rows)
+
+    def rows(self):
         clients = Client.query.all()
         clients_list = []
         for c in clients:
@@ -287,28 +340,34 @@ class ClientList(Resource):
                 'date_created': c.date_created
             }
             clients_list.append(client_data)
-        
-        return jsonify(clients_list)
 
+        return clients_list
+
+    @idempotent
     def post(self):
         if 'user_id' not in session and session.get('role') not in ['ADMIN', 'CEO']:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
         data = request.get_json()
         username = data['username']
         phone = data['phone']
         email = data['email']
-        password = generate_password_hash(data['password'], method='sha256')  # Hashing password
+        password = generate_password_hash(data['password'])  # Hashing password
         balance_amount = data['balance_amount']
-        pickup_date = data['pickup_date']
+        try:
+            pickup_date = parse_date(data['pickup_date'])
+        except ValueError:
+            return BAD_PICKUP_DATE, 400
         
         new_client = Client(
             username=username,
             phone=phone,
             email=email,
             password=password,
+            buying_price=data.get('buying_price'),
             balance_amount=balance_amount,
             pickup_date=pickup_date,
+            group_name=data.get('group_name') or 'none',
             created_by=session['user_id'],  # Set the client as created by the staff in session
             date_created=datetime.now()
         )
@@ -316,7 +375,7 @@ class ClientList(Resource):
         db.session.add(new_client)
         db.session.commit()
         
-        return jsonify({"message": "Client added successfully"}), 201
+        return {"message": "Client added successfully"}, 201
 
 api.add_resource(ClientList, '/clients')
 
@@ -324,11 +383,11 @@ api.add_resource(ClientList, '/clients')
 class ClientResource(Resource):
     def get(self, id):
         if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
         client = Client.query.get(id)
         if not client:
-            return jsonify({"message": "Client not found"}), 404
+            return {"message": "Client not found"}, 404
         
         client_data = {
             'id': client.id,
@@ -342,15 +401,18 @@ class ClientResource(Resource):
             'date_created': client.date_created
         }
         
-        return jsonify(client_data)
+        return tagged(jsonify(client_data), client.version)
 
+    @versioned
     def patch(self, id):
         if 'user_id' not in session and session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
         client = Client.query.get(id)
         if not client:
-            return jsonify({"message": "Client not found"}), 404
+            return {"message": "Client not found"}, 404
+        if stale(client):
+            return precondition_failed()
         
         data = request.get_json()
         if 'username' in data:
@@ -359,22 +421,33 @@ class ClientResource(Resource):
             client.phone = data['phone']
         if 'email' in data:
             client.email = data['email']
+        if 'buying_price' in data:
+            client.buying_price = data['buying_price']
         if 'balance_amount' in data:
             client.balance_amount = data['balance_amount']
+        if 'group_name' in data:
+            client.group_name = data['group_name'] or 'none'
         if 'pickup_date' in data:
-            client.pickup_date = data['pickup_date']
+            try:
+                client.pickup_date = parse_date(data['pickup_date'])
+            except ValueError:
+                db.session.rollback()
+                return BAD_PICKUP_DATE, 400
         
         db.session.commit()
         
         return jsonify({"message": "Client updated successfully"})
 
+    @versioned
     def delete(self, id):
         if 'user_id' not in session and session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
         client = Client.query.get(id)
         if not client:
-            return jsonify({"message": "Client not found"}), 404
+            return {"message": "Client not found"}, 404
+        if stale(client):
+            return precondition_failed()
         
         db.session.delete(client)
         db.session.commit()
@@ -388,27 +461,32 @@ api.add_resource(ClientResource, '/client/<int:id>')
 class AdvanceLoanList(Resource):
     def get(self):
         if 'user_id' not in session and session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
+        return cached_json(['advance_loan'], self.rows)
+
+    def rows(self):
         loans = AdvanceLoan.query.all()
+        if include_archived():
+            loans += archived_rows(AdvanceLoan)
         loan_list = []
         for loan in loans:
             loan_data = {
                 'id': loan.id,
-                'client_id': loan.client_id,
-                'loan_amount': loan.loan_amount,
+                'amount': loan.amount,
+                'type': loan.type,
+                'taken_by': loan.taken_by,
                 'status': loan.status,
-                'date_approved': loan.date_approved,
-                'approved_by': loan.approved_by,
-                'date_created': loan.date_created
+                'comment': loan.comment,
+                'date_taken': loan.date_taken
             }
             loan_list.append(loan_data)
-        
-        return jsonify(loan_list)
+
+        return loan_list
 
     # def post(self):
     #     if 'user_id' not in session and session.get('role') not in ['ADMIN', 'CEO', "MANAGER", "STAFF", "TAILOR"]:
-    #         return jsonify({"message": "Unauthorized"}), 401
+    #         return {"message": "Unauthorized"}, 401
 
     #     data = request.get_json()
     #     client_id = data['client_id']
@@ -428,7 +506,7 @@ class AdvanceLoanList(Resource):
     #     db.session.add(new_loan)
     #     db.session.commit()
 
-    #     return jsonify({"message": "Loan added successfully"}), 201
+    #     return {"message": "Loan added successfully"}, 201
 
 api.add_resource(AdvanceLoanList, '/advance_loans')
 
@@ -436,49 +514,56 @@ class AdvanceLoanResource(Resource):
     def get(self, id):
         # Check if the user is authorized
         if 'user_id' not in session :
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
         # Query for all loans taken by the staff member with the given ID
         loans = AdvanceLoan.query.filter_by(taken_by=id).all()  # Replace 'staff_id' with the actual field name
+        if include_archived():
+            loans += archived_rows(AdvanceLoan, taken_by=id)
 
         # Check if any loans were found
         if not loans:
-            return jsonify({"message": "No loans found for this staff member"}), 404
+            return {"message": "No loans found for this staff member"}, 404
 
-        # Prepare the list of loan data
+        # Prepare the list of loan data; each loan's version is its If-Match value for patch()
         loans_data = []
         for loan in loans:
             loans_data.append({
                 'id': loan.id,
-                'client_id': loan.client_id,
-                'loan_amount': loan.loan_amount,
+                'amount': loan.amount,
+                'type': loan.type,
+                'taken_by': loan.taken_by,
                 'status': loan.status,
-                'date_approved': loan.date_approved,
-                'approved_by': loan.approved_by,
-                'date_created': loan.date_created
+                'comment': loan.comment,
+                'date_taken': loan.date_taken,
+                'version': loan.version
             })
 
         # Return the list of loans
         return jsonify(loans_data)
 
 
+    @versioned
     def patch(self, id):
         if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
         loan = AdvanceLoan.query.get(id)
         if not loan:
-            return jsonify({"message": "Loan not found"}), 404
+            return {"message": "Loan not found"}, 404
+        if stale(loan):
+            return precondition_failed()
         
         # Ensure the loan was taken less than 10 minutes ago
         current_time = datetime.now(timezone.utc)
-        time_difference = current_time - loan.date_taken
+        date_taken = loan.date_taken.replace(tzinfo=timezone.utc)  # SQLite hands back naive UTC datetimes
+        time_difference = current_time - date_taken
         if time_difference > timedelta(minutes=10):
-            return jsonify({"message": "Loan can no longer be updated"}), 403
+            return {"message": "Loan can no longer be updated"}, 403
         
         data = request.get_json()
-        if 'loan_amount' in data:
-            loan.loan_amount = data['loan_amount']
+        if 'amount' in data:
+            loan.amount = data['amount']
         if 'status' in data:
             loan.status = data['status']
 
@@ -486,13 +571,16 @@ class AdvanceLoanResource(Resource):
 
         return jsonify({"message": "Loan updated successfully"})
 
+    @versioned
     def delete(self, id):
         if 'user_id' not in session or session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
         loan = AdvanceLoan.query.get(id)
         if not loan:
-            return jsonify({"message": "Loan not found"}), 404
+            return {"message": "Loan not found"}, 404
+        if stale(loan):
+            return precondition_failed()
         
         db.session.delete(loan)
         db.session.commit()
@@ -502,614 +590,28 @@ class AdvanceLoanResource(Resource):
 api.add_resource(AdvanceLoanResource, '/advance_loan/<int:id>')
 
 
-class CoatMeasurementList(Resource):
-    def get(self):
-        # Ensure the user is authenticated
-        if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        # Fetch all coat measurements
-        measurements = CoatMeasurement.query.all()
-        measurement_list = []
-        for m in measurements:
-            # Match fields from the model
-            measurement_data = {
-                'id': m.id,
-                'fabric': m.fabric,
-                'shoulder': float(m.shoulder) if m.shoulder else None,
-                'sleeves': float(m.sleeves) if m.sleeves else None,
-                'chest': float(m.chest) if m.chest else None,
-                'waist': float(m.waist) if m.waist else None,
-                'arm': float(m.arm) if m.arm else None,
-                'full_length': float(m.full_length) if m.full_length else None,
-                'bottom_length': float(m.bottom_length) if m.bottom_length else None,
-                'description': m.description,
-                'status': m.status,
-                'client': m.client,
-                'assigned_to': m.assigned_to,
-                'created_by': m.created_by,
-                'date_created': m.date_created
-            }
-            measurement_list.append(measurement_data)
-
-        return jsonify(measurement_list)
-
-    # def post(self):
-    #     # Ensure the user is authenticated
-    #     if 'user_id' not in session:
-    #         return jsonify({"message": "Unauthorized"}), 401
-
-    #     # Parse and validate input data
-    #     data = request.get_json()
-    #     required_fields = ['fabric', 'client']
-    #     for field in required_fields:
-    #         if field not in data:
-    #             return jsonify({"message": f"'{field}' is required"}), 400
-
-    #     # Extract and assign data to the new measurement
-    #     new_measurement = CoatMeasurement(
-    #         fabric=data['fabric'],
-    #         shoulder=data.get('shoulder'),
-    #         sleeves=data.get('sleeves'),
-    #         chest=data.get('chest'),
-    #         waist=data.get('waist'),
-    #         arm=data.get('arm'),
-    #         full_length=data.get('full_length'),
-    #         bottom_length=data.get('bottom_length'),
-    #         description=data.get('description'),
-    #         status=data.get('status', 'booked'),  # Default status if not provided
-    #         client=data['client'],
-    #         assigned_to=data.get('assigned_to'),
-    #         created_by=session['user_id'],  # Assuming the session contains the creator's ID
-    #         date_created=datetime.now(timezone.utc)
-    #     )
-
-    #     # Save to the database
-    #     db.session.add(new_measurement)
-    #     db.session.commit()
-
-    #     return jsonify({"message": "Coat measurement added successfully", "id": new_measurement.id}), 201
-
-
-# Add the resource to the API
-api.add_resource(CoatMeasurementList, '/coat_measurements')
-
-
-class CoatMeasurementResource(Resource):
-    def get(self, id):
-        # Ensure the user is authenticated
-        if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        # Fetch the coat measurement by ID
-        measurement = CoatMeasurement.query.get(id)
-        if not measurement:
-            return jsonify({"message": "Measurement not found"}), 404
-        
-        # Construct the response data
-        measurement_data = {
-            'id': measurement.id,
-            'fabric': measurement.fabric,
-            'shoulder': float(measurement.shoulder) if measurement.shoulder else None,
-            'sleeves': float(measurement.sleeves) if measurement.sleeves else None,
-            'chest': float(measurement.chest) if measurement.chest else None,
-            'waist': float(measurement.waist) if measurement.waist else None,
-            'arm': float(measurement.arm) if measurement.arm else None,
-            'full_length': float(measurement.full_length) if measurement.full_length else None,
-            'bottom_length': float(measurement.bottom_length) if measurement.bottom_length else None,
-            'description': measurement.description,
-            'status': measurement.status,
-            'client': measurement.client,
-            'assigned_to': measurement.assigned_to,
-            'created_by': measurement.created_by,
-            'date_created': measurement.date_created
-        }
-
-        return jsonify(measurement_data)
-
-    def patch(self, id):
-        # Ensure the user is authenticated
-        if 'user_id' not in session and session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        # Fetch the coat measurement by ID
-        measurement = CoatMeasurement.query.get(id)
-        if not measurement:
-            return jsonify({"message": "Measurement not found"}), 404
-        
-        # Get the request data
-        data = request.get_json()
-
-        # Update fields if they are provided in the request
-        if 'fabric' in data:
-            measurement.fabric = data['fabric']
-        if 'shoulder' in data:
-            measurement.shoulder = data['shoulder']
-        if 'sleeves' in data:
-            measurement.sleeves = data['sleeves']
-        if 'chest' in data:
-            measurement.chest = data['chest']
-        if 'waist' in data:
-            measurement.waist = data['waist']
-        if 'arm' in data:
-            measurement.arm = data['arm']
-        if 'full_length' in data:
-            measurement.full_length = data['full_length']
-        if 'bottom_length' in data:
-            measurement.bottom_length = data['bottom_length']
-        if 'description' in data:
-            measurement.description = data['description']
-        if 'status' in data:
-            measurement.status = data['status']
-        if 'assigned_to' in data:
-            measurement.assigned_to = data['assigned_to']
-
-        # Commit the changes
-        db.session.commit()
-
-        return jsonify({"message": "Coat measurement updated successfully"})
-
-    def delete(self, id):
-        # Ensure the user is authenticated and authorized
-        if 'user_id' not in session and session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        # Fetch the coat measurement by ID
-        measurement = CoatMeasurement.query.get(id)
-        if not measurement:
-            return jsonify({"message": "Measurement not found"}), 404
-        
-        # Delete the record
-        db.session.delete(measurement)
-        db.session.commit()
-
-        return jsonify({"message": "Coat measurement deleted successfully"})
-
-# Add the resource to the API
-api.add_resource(CoatMeasurementResource, '/coat_measurement/<int:id>')
-
-class RegularShirtMeasurementList(Resource):
-    def get(self):
-        # Ensure the user is authenticated
-        if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        # Fetch all regular shirt measurements
-        measurements = RegularShirtMeasurement.query.all()
-        measurement_list = []
-        for m in measurements:
-            # Match fields from the model
-            measurement_data = {
-                'id': m.id,
-                'fabric': m.fabric,
-                'shoulder': float(m.shoulder) if m.shoulder else None,
-                'sleeves': float(m.sleeves) if m.sleeves else None,
-                'chest': float(m.chest) if m.chest else None,
-                'waist': float(m.waist) if m.waist else None,
-                'arm': float(m.arm) if m.arm else None,
-                'full_length': float(m.full_length) if m.full_length else None,
-                'bottom_length': float(m.bottom_length) if m.bottom_length else None,
-                'description': m.description,
-                'status': m.status,
-                'client': m.client,
-                'assigned_to': m.assigned_to,
-                'created_by': m.created_by,
-                'date_created': m.date_created
-            }
-            measurement_list.append(measurement_data)
-
-        return jsonify(measurement_list)
-
-    # def post(self):
-    #     # Ensure the user is authenticated
-    #     if 'user_id' not in session:
-    #         return jsonify({"message": "Unauthorized"}), 401
-
-    #     # Parse and validate input data
-    #     data = request.get_json()
-    #     required_fields = ['fabric', 'client']
-    #     for field in required_fields:
-    #         if field not in data:
-    #             return jsonify({"message": f"'{field}' is required"}), 400
-
-    #     # Extract and assign data to the new measurement
-    #     new_measurement = RegularShirtMeasurement(
-    #         fabric=data['fabric'],
-    #         shoulder=data.get('shoulder'),
-    #         sleeves=data.get('sleeves'),
-    #         chest=data.get('chest'),
-    #         waist=data.get('waist'),
-    #         arm=data.get('arm'),
-    #         full_length=data.get('full_length'),
-    #         bottom_length=data.get('bottom_length'),
-    #         description=data.get('description'),
-    #         status=data.get('status', 'booked'),  # Default status if not provided
-    #         client=data['client'],
-    #         assigned_to=data.get('assigned_to'),
-    #         created_by=session['user_id'],  # Assuming the session contains the creator's ID
-    #         date_created=datetime.now(timezone.utc)
-    #     )
-
-    #     # Save to the database
-    #     db.session.add(new_measurement)
-    #     db.session.commit()
-
-    #     return jsonify({"message": "Regular shirt measurement added successfully", "id": new_measurement.id}), 201
-
-
-# Add the resource to the API
-api.add_resource(RegularShirtMeasurementList, '/regular_shirt_measurements')
-
-class RegularShirtMeasurementResource(Resource):
-    def get(self, id):
-        # Ensure the user is authenticated
-        if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        # Fetch the specific measurement by ID
-        measurement = RegularShirtMeasurement.query.get(id)
-        if not measurement:
-            return jsonify({"message": "Measurement not found"}), 404
-
-        # Serialize measurement data
-        measurement_data = {
-            'id': measurement.id,
-            'fabric': measurement.fabric,
-            'shoulder': float(measurement.shoulder) if measurement.shoulder else None,
-            'sleeves': float(measurement.sleeves) if measurement.sleeves else None,
-            'chest': float(measurement.chest) if measurement.chest else None,
-            'waist': float(measurement.waist) if measurement.waist else None,
-            'arm': float(measurement.arm) if measurement.arm else None,
-            'full_length': float(measurement.full_length) if measurement.full_length else None,
-            'bottom_length': float(measurement.bottom_length) if measurement.bottom_length else None,
-            'description': measurement.description,
-            'status': measurement.status,
-            'client': measurement.client,
-            'assigned_to': measurement.assigned_to,
-            'created_by': measurement.created_by,
-            'date_created': measurement.date_created
-        }
-
-        return jsonify(measurement_data)
-
-    def patch(self, id):
-        # Ensure the user is authenticated
-        if 'user_id' not in session and session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        # Fetch the specific measurement by ID
-        measurement = RegularShirtMeasurement.query.get(id)
-        if not measurement:
-            return jsonify({"message": "Measurement not found"}), 404
-
-        # Parse and apply updates
-        data = request.get_json()
-        if 'fabric' in data:
-            measurement.fabric = data['fabric']
-        if 'shoulder' in data:
-            measurement.shoulder = data['shoulder']
-        if 'sleeves' in data:
-            measurement.sleeves = data['sleeves']
-        if 'chest' in data:
-            measurement.chest = data['chest']
-        if 'waist' in data:
-            measurement.waist = data['waist']
-        if 'arm' in data:
-            measurement.arm = data['arm']
-        if 'full_length' in data:
-            measurement.full_length = data['full_length']
-        if 'bottom_length' in data:
-            measurement.bottom_length = data['bottom_length']
-        if 'description' in data:
-            measurement.description = data['description']
-        if 'status' in data:
-            measurement.status = data['status']
-        if 'assigned_to' in data:
-            measurement.assigned_to = data['assigned_to']
-
-        db.session.commit()
-
-        return jsonify({"message": "Regular shirt measurement updated successfully"})
-
-    def delete(self, id):
-        # Ensure the user is authenticated and authorized
-        if 'user_id' not in session or session.get('role') not in ['ADMIN', 'CEO']:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        # Fetch the specific measurement by ID
-        measurement = RegularShirtMeasurement.query.get(id)
-        if not measurement:
-            return jsonify({"message": "Measurement not found"}), 404
-
-        # Delete the measurement
-        db.session.delete(measurement)
-        db.session.commit()
-
-        return jsonify({"message": "Regular shirt measurement deleted successfully"})
-
-
-# Add the resource to the API
-api.add_resource(RegularShirtMeasurementResource, '/regular_shirt_measurement/<int:id>')
-
-class SenatorShirtMeasurementList(Resource):
-    def get(self):
-        if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        measurements = SenatorShirtMeasurement.query.all()
-        measurement_list = []
-        for m in measurements:
-            measurement_data = {
-                'id': m.id,
-                'fabric': m.fabric,
-                'shoulder': float(m.shoulder) if m.shoulder else None,
-                'sleeves': float(m.sleeves) if m.sleeves else None,
-                'chest': float(m.chest) if m.chest else None,
-                'waist': float(m.waist) if m.waist else None,
-                'arm': float(m.arm) if m.arm else None,
-                'full_length': float(m.full_length) if m.full_length else None,
-                'bottom_length': float(m.bottom_length) if m.bottom_length else None,
-                'neck': float(m.neck) if m.neck else None,
-                'wrist': float(m.wrist) if m.wrist else None,
-                'description': m.description,
-                'status': m.status,
-                'client': m.client,
-                'assigned_to': m.assigned_to,
-                'created_by': m.created_by,
-                'date_created': m.date_created
-            }
-            measurement_list.append(measurement_data)
-
-        return jsonify(measurement_list)
-    
-    def post(self):
-        if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        data = request.get_json()
-
-        # Validate required fields
-        if 'fabric' not in data or 'client' not in data or 'created_by' not in data:
-            return jsonify({"message": "Missing required fields: fabric, client, and created_by"}), 400
-
-        new_measurement = SenatorShirtMeasurement(
-            fabric=data['fabric'],
-            shoulder=data.get('shoulder'),
-            sleeves=data.get('sleeves'),
-            chest=data.get('chest'),
-            waist=data.get('waist'),
-            arm=data.get('arm'),
-            full_length=data.get('full_length'),
-            bottom_length=data.get('bottom_length'),
-            neck=data.get('neck'),
-            wrist=data.get('wrist'),
-            description=data.get('description'),
-            status=data.get('status', 'booked'),
-            client=data['client'],
-            assigned_to=data.get('assigned_to'),
-            created_by=data['created_by'],
-            date_created=datetime.now(timezone.utc)
-        )
-
-        db.session.add(new_measurement)
-        db.session.commit()
-
-        return jsonify({"message": "Senator shirt measurement added successfully"}), 201
-
-
-api.add_resource(SenatorShirtMeasurementList, '/senator_shirt_measurements')
-
-class SenatorShirtMeasurementResource(Resource):
-    def get(self, id):
-        if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        measurement = SenatorShirtMeasurement.query.get(id)
-        if not measurement:
-            return jsonify({"message": "Measurement not found"}), 404
-        
-        measurement_data = {
-            'id': measurement.id,
-            'client_id': measurement.client_id,
-            'chest': measurement.chest,
-            'waist': measurement.waist,
-            'hips': measurement.hips,
-            'sleeve_length': measurement.sleeve_length,
-            'collar': measurement.collar,
-            'neck': measurement.neck,
-            'date_created': measurement.date_created
-        }
-
-        return jsonify(measurement_data)
-
-    def patch(self, id):
-        if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        measurement = SenatorShirtMeasurement.query.get(id)
-        if not measurement:
-            return jsonify({"message": "Measurement not found"}), 404
-        
-        data = request.get_json()
-        if 'chest' in data:
-            measurement.chest = data['chest']
-        if 'waist' in data:
-            measurement.waist = data['waist']
-        if 'hips' in data:
-            measurement.hips = data['hips']
-        if 'sleeve_length' in data:
-            measurement.sleeve_length = data['sleeve_length']
-        if 'collar' in data:
-            measurement.collar = data['collar']
-        if 'neck' in data:
-            measurement.neck = data['neck']
-
-        db.session.commit()
-
-        return jsonify({"message": "Senator shirt measurement updated successfully"})
-
-    def delete(self, id):
-        if 'user_id' not in session or session.get('role') not in ['ADMIN', 'CEO']:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        measurement = SenatorShirtMeasurement.query.get(id)
-        if not measurement:
-            return jsonify({"message": "Measurement not found"}), 404
-        
-        db.session.delete(measurement)
-        db.session.commit()
-
-        return jsonify({"message": "Senator shirt measurement deleted successfully"})
-
-api.add_resource(SenatorShirtMeasurementResource, '/senator_shirt_measurement/<int:id>')
-
-class TrouserMeasurementList(Resource):
-    def get(self):
-        if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        measurements = TrouserMeasurement.query.all()
-        measurement_list = []
-        for m in measurements:
-            measurement_data = {
-                'id': m.id,
-                'fabric': m.fabric,
-                'waist': float(m.waist) if m.waist else None,
-                'thigh': float(m.thigh) if m.thigh else None,
-                'knee': float(m.knee) if m.knee else None,
-                'bottom': float(m.bottom) if m.bottom else None,
-                'fly': float(m.fly) if m.fly else None,
-                'hips': float(m.hips) if m.hips else None,
-                'description': m.description,
-                'status': m.status,
-                'client': m.client,
-                'assigned_to': m.assigned_to,
-                'created_by': m.created_by,
-                'date_created': m.date_created
-            }
-            measurement_list.append(measurement_data)
-
-        return jsonify(measurement_list)
-    
-    def post(self):
-        if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        data = request.get_json()
-
-        # Validate required fields
-        if 'fabric' not in data or 'client' not in data or 'created_by' not in data:
-            return jsonify({"message": "Missing required fields: fabric, client, and created_by"}), 400
-
-        new_measurement = TrouserMeasurement(
-            fabric=data['fabric'],
-            waist=data.get('waist'),
-            thigh=data.get('thigh'),
-            knee=data.get('knee'),
-            bottom=data.get('bottom'),
-            fly=data.get('fly'),
-            hips=data.get('hips'),
-            description=data.get('description'),
-            status=data.get('status', 'booked'),
-            client=data['client'],
-            assigned_to=data.get('assigned_to'),
-            created_by=data['created_by'],
-            date_created=datetime.now(timezone.utc)
-        )
-
-        db.session.add(new_measurement)
-        db.session.commit()
-
-        return jsonify({"message": "Trouser measurement added successfully"}), 201
-
-
-api.add_resource(TrouserMeasurementList, '/trouser_measurements')
-
-
-class TrouserMeasurementResource(Resource):
-    def get(self, id):
-        if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        measurement = TrouserMeasurement.query.get(id)
-        if not measurement:
-            return jsonify({"message": "Measurement not found"}), 404
-
-        measurement_data = {
-            'id': measurement.id,
-            'fabric': measurement.fabric,
-            'waist': float(measurement.waist) if measurement.waist else None,
-            'thigh': float(measurement.thigh) if measurement.thigh else None,
-            'knee': float(measurement.knee) if measurement.knee else None,
-            'bottom': float(measurement.bottom) if measurement.bottom else None,
-            'fly': float(measurement.fly) if measurement.fly else None,
-            'hips': float(measurement.hips) if measurement.hips else None,
-            'description': measurement.description,
-            'status': measurement.status,
-            'client': measurement.client,
-            'assigned_to': measurement.assigned_to,
-            'created_by': measurement.created_by,
-            'date_created': measurement.date_created
-        }
-
-        return jsonify(measurement_data)
-
-    def patch(self, id):
-        if 'user_id' not in session and session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        measurement = TrouserMeasurement.query.get(id)
-        if not measurement:
-            return jsonify({"message": "Measurement not found"}), 404
-
-        data = request.get_json()
-        if 'fabric' in data:
-            measurement.fabric = data['fabric']
-        if 'waist' in data:
-            measurement.waist = data['waist']
-        if 'thigh' in data:
-            measurement.thigh = data['thigh']
-        if 'knee' in data:
-            measurement.knee = data['knee']
-        if 'bottom' in data:
-            measurement.bottom = data['bottom']
-        if 'fly' in data:
-            measurement.fly = data['fly']
-        if 'hips' in data:
-            measurement.hips = data['hips']
-        if 'description' in data:
-            measurement.description = data['description']
-        if 'status' in data:
-            measurement.status = data['status']
-        if 'assigned_to' in data:
-            measurement.assigned_to = data['assigned_to']
-
-        db.session.commit()
-
-        return jsonify({"message": "Trouser measurement updated successfully"})
-
-    def delete(self, id):
-        if 'user_id' not in session and session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized"}), 401
-
-        measurement = TrouserMeasurement.query.get(id)
-        if not measurement:
-            return jsonify({"message": "Measurement not found"}), 404
-
-        db.session.delete(measurement)
-        db.session.commit()
-
-        return jsonify({"message": "Trouser measurement deleted successfully"})
+# Garment orders of every type, plus the per-garment routes over the same table
+api.add_resource(GarmentOrders, '/garment_orders')
+for garment in GARMENT_FIELDS:
+    measurement_list, measurement_resource = legacy_resources(garment)
+    api.add_resource(measurement_list, f'/{garment}_measurements')
+    api.add_resource(measurement_resource, f'/{garment}_measurement/<int:id>')
 
+# Status changes and reassignment for many orders at once (managers and up)
+api.add_resource(BulkUpdate, '/work_orders/bulk_update')
 
-api.add_resource(TrouserMeasurementResource, '/trouser_measurement/<int:id>')
+# Assign booked, unassigned orders to tailors by pickup date and load (managers and up)
+api.add_resource(Schedule, '/work_orders/schedule')
 
 # Inventory
 class InventoryList(Resource):
     def get(self):
         if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
+        return cached_json(['inventory'], self.rows)
+
+    def rows(self):
         inventories = Inventory.query.all()
         inventory_list = []
         for inventory in inventories:
@@ -1123,17 +625,18 @@ class InventoryList(Resource):
             }
             inventory_list.append(inventory_data)
 
-        return jsonify(inventory_list)
+        return inventory_list
 
+    @idempotent
     def post(self):
         if 'user_id' not in session and session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
         data = request.get_json()
 
         # Validate required fields
         if 'item_name' not in data or 'quantity' not in data or 'created_by' not in data:
-            return jsonify({"message": "Missing required fields: item_name, quantity, and created_by"}), 400
+            return {"message": "Missing required fields: item_name, quantity, and created_by"}, 400
 
         new_inventory = Inventory(
             item_name=data['item_name'],
@@ -1146,18 +649,18 @@ class InventoryList(Resource):
         db.session.add(new_inventory)
         db.session.commit()
 
-        return jsonify({"message": "Inventory item added successfully"}), 201
+        return {"message": "Inventory item added successfully"}, 201
     
 api.add_resource(InventoryList, '/inventories')
 
 class InventoryResource(Resource):
     def get(self, id):
         if 'user_id' not in session:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
         inventory = Inventory.query.get(id)
         if not inventory:
-            return jsonify({"message": "Inventory item not found"}), 404
+            return {"message": "Inventory item not found"}, 404
 
         inventory_data = {
             'id': inventory.id,
@@ -1168,15 +671,18 @@ class InventoryResource(Resource):
             'date_created': inventory.date_created
         }
 
-        return jsonify(inventory_data)
+        return tagged(jsonify(inventory_data), inventory.version)
 
+    @versioned
     def patch(self, id):
         if 'user_id' not in session and session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
         inventory = Inventory.query.get(id)
         if not inventory:
-            return jsonify({"message": "Inventory item not found"}), 404
+            return {"message": "Inventory item not found"}, 404
+        if stale(inventory):
+            return precondition_failed()
 
         data = request.get_json()
 
@@ -1191,13 +697,16 @@ class InventoryResource(Resource):
 
         return jsonify({"message": "Inventory item updated successfully"})
 
+    @versioned
     def delete(self, id):
         if 'user_id' not in session and session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
-            return jsonify({"message": "Unauthorized"}), 401
+            return {"message": "Unauthorized"}, 401
 
         inventory = Inventory.query.get(id)
         if not inventory:
-            return jsonify({"message": "Inventory item not found"}), 404
+            return {"message": "Inventory item not found"}, 404
+        if stale(inventory):
+            return precondition_failed()
 
         db.session.delete(inventory)
         db.session.commit()
@@ -1206,5 +715,82 @@ class InventoryResource(Resource):
 
 api.add_resource(InventoryResource, '/inventory/<int:id>')
 
+# Printable job cards, e.g. /job_cards?ids=coat:1,trouser:4
+api.add_resource(lazy_resource('job_cards', 'JobCards'), '/job_cards')
+
+# Statement timings and N+1 offenders since the worker started (admins only)
+api.add_resource(DebugQueries, '/debug/queries')
+
+# Sampling profiler, only when PROFILER_ENABLED (admins only)
+api.add_resource(Profile, '/debug/profile')
+
+# Incremental sync, e.g. /changes?since=1200
+api.add_resource(Changes, '/changes')
+
+# Order status changes as server-sent events
+api.add_resource(Events, '/events')
+
+# Revenue booked, collected and outstanding per period, e.g. /reports/revenue?from=2024-01-01&granularity=month
+api.add_resource(RevenueReport, '/reports/revenue')
+
+# Pickup deadlines against tailor capacity, day by day, with the orders at risk, e.g. /reports/capacity?days=14
+api.add_resource(lazy_resource('forecast', 'CapacityForecast'), '/reports/capacity')
+
+# Group orders (weddings, choirs): members, their orders and totals per group_name
+api.add_resource(Groups, '/groups')
+api.add_resource(Group, '/groups/<string:name>')
+
+# Closest previous profiles to a walk-in's measurements, e.g. /measurements/similar?garment=coat&chest=40&k=5
+api.add_resource(lazy_resource('measurement_search', 'SimilarMeasurements'), '/measurements/similar')
+
+# Fabric needed by open orders against the rolls in stock, and which roll each order is cut from
+api.add_resource(lazy_resource('fabric_plan', 'FabricPlan'), '/fabric/plan')
+
+# Several calls in one round trip, e.g. {"requests": [{"method": "GET", "path": "/staff/3"}, ...]}
+api.add_resource(Batch, '/batch')
+
+
+def create_app(config=None):
+    app = Flask(__name__)
+
+    # Database configuration
+    app.config.from_mapping(DEFAULT_CONFIG)
+    if 'DATABASE_URL' in os.environ:
+        app.config['SQLALCHEMY_DATABASE_URI'] = os.environ['DATABASE_URL']
+    if 'METRICS_DIR' in os.environ:
+        app.config['METRICS_DIR'] = os.environ['METRICS_DIR']
+    if 'PROFILER_ENABLED' in os.environ:
+        app.config['PROFILER_ENABLED'] = os.environ['PROFILER_ENABLED'] == '1'
+    if 'ARCHIVE_DATABASE' in os.environ:
+        app.config['ARCHIVE_DATABASE'] = os.environ['ARCHIVE_DATABASE']
+    if isinstance(config, dict):
+        app.config.from_mapping(config)
+    elif config is not None:
+        app.config.from_object(config)
+
+    # Initialize the database and Flask-RESTful API
+    db.init_app(app)
+    api.init_app(app)
+    init_archive(app)
+    for command in COMMANDS:
+        app.cli.add_command(command)
+
+    # Per-route latency, status and query counters at /metrics
+    if app.config['METRICS_ENABLED']:
+        init_metrics(app)
+
+    # gzip/brotli/zstd as the client accepts; registered after metrics so sizes are counted compressed
+    init_compression(app)
+
+    # Slow-query log and N+1 detection, summarised at /debug/queries
+    init_query_log(app)
+    init_profiler(app)
+
+    # Forked workers (gunicorn --preload) must open their own database connections
+    track_app(app)
+
+    return app
+
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
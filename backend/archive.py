@@ -0,0 +1,151 @@
+# Hot/cold archival of finished orders and paid loans.
+#
+#   flask --app app archive --days 180
+#   GET /garment_orders?include_archived=1
+#
+# Orders that have been done or archived for more than N days, and loans paid
+# more than N days ago, are moved into a separate SQLite file that is attached to
+# every connection as the "archive" schema. Its tables have the same columns and
+# ids as the hot ones, so a batch moves with one INSERT ... SELECT and one DELETE,
+# and garment_order, advance_loan and their indexes only hold live work. Read
+# routes leave the archive alone unless asked with ?include_archived=1; archived
+# rows are read-only.
+#
+# A row counts as finished since its last change_log entry, or since it was
+# booked or taken when it has none. The newest order of each garment type and
+# the newest loan always stay behind: new ids and order numbers continue from the
+# highest ones left in the hot table, so this keeps them from reusing one that is
+# already in the archive.
+#
+# Each batch records a delete in change_log for every row it moves, in the same
+# transaction, so /changes clients drop them and the caches built from change_log
+# (group views, the capacity forecast, the measurement search matrices) let them go.
+import os
+from datetime import datetime, timedelta, timezone
+
+from flask import request
+from sqlalchemy import Column, Index, MetaData, Table, delete, event, func, insert, select
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from changes import committed, record
+from extensions import db
+from models import AdvanceLoan, Change, GarmentOrder
+
+ARCHIVE_SCHEMA = 'archive'
+BATCH_SIZE = 5000
+
+# Statuses after which a row may be archived (compared lowercased)
+FINISHED = {
+    'garment_order': ('done', 'archived'),
+    'advance_loan': ('paid',),
+}
+
+archive_metadata = MetaData()
+
+
+# Same columns as the hot table, without its foreign keys (they cannot cross
+# database files in SQLite); index names are distinct so an unqualified
+# DROP INDEX never reaches into the archive
+def archive_table(table, *indexed):
+    return Table(
+        table.name, archive_metadata,
+        *(Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable) for c in table.columns),
+        *(Index(f'ix_archived_{table.name}_{"_".join(columns)}', *columns) for columns in indexed),
+        schema=ARCHIVE_SCHEMA,
+    )
+
+
+# Hot table name -> archived copy, indexed for the include_archived reads
+ARCHIVED = {
+    'garment_order': archive_table(GarmentOrder.__table__, ('garment_type', 'number'), ('client',),
+                                   ('assigned_to',)),
+    'advance_loan': archive_table(AdvanceLoan.__table__, ('taken_by',)),
+}
+
+
+# "inventory_system.db" -> "inventory_system_archive.db", next to the main database
+def archive_path(database):
+    if not database or database == ':memory:':
+        return ':memory:'
+    root, ext = os.path.splitext(database)
+    return f'{root}_archive{ext or ".db"}'
+
+
+# Attach the archive database to every new connection, creating its tables on first use
+def init_archive(app):
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return
+    path = app.config.get('ARCHIVE_DATABASE') or archive_path(engine.url.database)
+    ddl = []
+    for table in ARCHIVED.values():
+        ddl.append(str(CreateTable(table, if_not_exists=True).compile(dialect=engine.dialect)))
+        ddl.extend(str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+                   for index in table.indexes)
+
+    @event.listens_for(engine, 'connect')
+    def _attach(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f'ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}', (path,))
+            for statement in ddl:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+# Whether the current request asked for archived rows as well
+def include_archived():
+    return request.args.get('include_archived', '').lower() in ('1', 'true', 'yes')
+
+
+# Archived rows of `model` whose columns equal the given values, e.g.
+# archived_rows(GarmentOrder, 'number', garment_type='coat')
+def archived_rows(model, order_by='id', **values):
+    table = ARCHIVED[model.__tablename__]
+    query = select(table).where(*(table.c[name] == value for name, value in values.items()))
+    return db.session.execute(query.order_by(table.c[order_by])).all()
+
+
+# Condition for rows of `table` that finished before `cutoff` and have no change
+# since `changed_cutoff` (the change log keeps local time)
+def ready(table, finished_on, cutoff, changed_cutoff):
+    touched = select(Change.row_id).where(Change.table_name == table.name, Change.changed_at >= changed_cutoff)
+    if table.name == 'garment_order':
+        newest = select(func.max(table.c.id)).group_by(table.c.garment_type)
+    else:
+        newest = select(func.max(table.c.id))
+    return db.and_(
+        func.lower(table.c.status).in_(FINISHED[table.name]),
+        finished_on < cutoff,
+        table.c.id.not_in(touched),
+        table.c.id.not_in(newest),
+    )
+
+
+# Move rows finished more than `days` ago into the archive, one transaction per
+# batch so live writers are never locked out for long. Returns {table: rows moved}.
+def archive_finished(engine, days, batch_size=BATCH_SIZE, log=print):
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+    changed_cutoff = datetime.now() - timedelta(days=days)
+    moved = {}
+    for hot, finished_on in ((GarmentOrder.__table__, GarmentOrder.date_created),
+                             (AdvanceLoan.__table__, AdvanceLoan.date_taken)):
+        cold = ARCHIVED[hot.name]
+        condition = ready(hot, finished_on, cutoff, changed_cutoff)
+        moved[hot.name] = 0
+        while True:
+            with engine.begin() as conn:
+                ids = conn.scalars(select(hot.c.id).where(condition).order_by(hot.c.id).limit(batch_size)).all()
+                if not ids:
+                    break
+                # OR REPLACE: a batch interrupted between files (WAL mode) is simply moved again
+                conn.execute(insert(cold).prefix_with('OR REPLACE').from_select(
+                    [c.name for c in hot.columns], select(hot).where(hot.c.id.in_(ids))))
+                conn.execute(delete(hot).where(hot.c.id.in_(ids)))
+                changes = record(conn, [(hot.name, id, 'delete') for id in ids])
+            committed(changes)
+            moved[hot.name] += len(ids)
+            log(f"  {hot.name}: {moved[hot.name]} archived")
+    return moved
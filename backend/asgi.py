@@ -0,0 +1,324 @@
+# Optional async serving mode.
+#
+#   uvicorn asgi:application --port 5000
+#
+# GET requests for the list and item routes are answered here with SQLAlchemy's
+# asyncio extension over aiosqlite, so a slow SQLite read no longer holds a
+# thread. Everything else (logins, creates, patches, deletes) is handed to the
+# regular Flask app through asgiref's WSGI adapter and keeps its transactional
+# behaviour unchanged, as do reads with ?include_archived=1. The /events stream
+# is served here too, as a coroutine per subscriber. Bodies of the native reads
+# are compressed as the Flask app compresses its own (see compression.py), off
+# the event loop.
+#
+# The native reads answer exactly as the Flask routes do: each route selects only
+# the fields its Flask resource returns, and lists carry the same weak ETag as
+# cached_json(), so a client gets the same data and 304s from either server.
+import asyncio
+import contextvars
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import BadSignature
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.http import http_date, parse_etags, quote_etag
+
+from app import create_app
+from compression import LEVELS, compress, negotiate, version_query
+from events import HEARTBEAT, KEEPALIVE, QUEUE_SIZE, RESET, RETRY, bus, format_event, last_event_id, replay
+from extensions import db
+from garment_orders import legacy_order
+from models import Staff, AdvanceLoan, Client, Inventory, GarmentOrder, GARMENT_FIELDS
+
+# Fields each route returns, as its resource in app.py serialises them
+STAFF_LIST_FIELDS = ('id', 'username', 'phone', 'email', 'passport', 'role')
+STAFF_FIELDS = ('id', 'username', 'national_id', 'phone', 'email', 'passport', 'role', 'salary', 'created_at')
+CLIENT_FIELDS = ('id', 'username', 'phone', 'email', 'balance_amount', 'pickup_date', 'group_name', 'created_by',
+                 'date_created')
+LOAN_FIELDS = ('id', 'amount', 'type', 'taken_by', 'status', 'comment', 'date_taken')
+STAFF_LOAN_FIELDS = LOAN_FIELDS + ('version',)  # each loan's If-Match value for PATCH /advance_loan/<id>
+INVENTORY_FIELDS = ('id', 'item_name', 'quantity', 'description', 'created_by', 'date_created')
+
+# List routes served natively: path -> (model, fields)
+LIST_ROUTES = {
+    '/staffs': (Staff, STAFF_LIST_FIELDS),
+    '/clients': (Client, CLIENT_FIELDS),
+    '/advance_loans': (AdvanceLoan, LOAN_FIELDS),
+    '/inventories': (Inventory, INVENTORY_FIELDS),
+}
+
+# Item routes served natively: path prefix -> (model, fields, lookup column, returns a list)
+ITEM_ROUTES = {
+    '/staff/': (Staff, STAFF_FIELDS, 'id', False),
+    '/client/': (Client, CLIENT_FIELDS, 'id', False),
+    '/advance_loan/': (AdvanceLoan, STAFF_LOAN_FIELDS, 'taken_by', True),  # loans taken by a staff member
+    '/inventory/': (Inventory, INVENTORY_FIELDS, 'id', False),
+}
+
+# 404 message of each item route
+NOT_FOUND = {
+    Staff: "Staff not found",
+    Client: "Client not found",
+    AdvanceLoan: "No loans found for this staff member",
+    Inventory: "Inventory item not found",
+}
+
+# Per-garment routes over garment_order: list path or item prefix -> garment type
+GARMENT_LIST_ROUTES = {f'/{garment}_measurements': garment for garment in GARMENT_FIELDS}
+GARMENT_ITEM_ROUTES = {f'/{garment}_measurement/': garment for garment in GARMENT_FIELDS}
+
+
+# Async engine URL for the database the Flask app is configured with
+def async_database_url(flask_app):
+    with flask_app.app_context():
+        url = db.engine.url
+    if url.get_backend_name() != 'sqlite':
+        raise RuntimeError("Async serving mode only supports SQLite databases")
+    return url.set(drivername='sqlite+aiosqlite')
+
+
+def to_json(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return http_date(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# One /events subscriber; publish() may run on any thread
+class AsyncSubscriber:
+    def __init__(self, role, user_id, loop):
+        self.role = role
+        self.user_id = user_id
+        self.overflowed = False
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def deliver(self, event):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class AsyncReadApp:
+    def __init__(self, flask_app, database_url=None):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.sessions = SecureCookieSessionInterface().get_signing_serializer(flask_app)
+        self.database_url = database_url
+        self.engine = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        if scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] == '/events':
+            return await self.events(scope, receive, send)
+
+        route = self.match(scope) if scope['type'] == 'http' else None
+        if route is None:
+            # asgiref's sync-thread bookkeeping otherwise leaks from one request to the next on a
+            # kept-alive connection ("CurrentThreadExecutor already quit"); give each one a fresh context.
+            # The task copies the context it is created in (create_task's context= needs Python 3.11).
+            loop = asyncio.get_running_loop()
+            return await contextvars.Context().run(loop.create_task, self.wsgi(scope, receive, send))
+
+        if 'user_id' not in self.session(scope):
+            return await self.respond(send, 401, {"message": "Unauthorized"})
+
+        model, fields, column, key, many = route
+        if model is GarmentOrder:
+            status, body, version = await self.read_garments(column, key)
+        else:
+            status, body, version = await self.read(model, fields, column, key, many)
+        headers = dict(scope['headers'])
+        coding = None
+        if self.flask_app.config['COMPRESSION_ENABLED']:
+            coding = negotiate(headers.get(b'accept-encoding', b'').decode('latin-1'))
+        if version is None:
+            return await self.respond(send, status, body, coding=coding)
+        # Single rows carry their version as the ETag, as the Flask routes send it, and
+        # lists the weak version of their table, as cached_json() sends it
+        etag, weak = str(version), key is None
+        etags = parse_etags(headers.get(b'if-none-match', b'').decode('latin-1'))
+        if etags.contains_weak(etag) if weak else etags.contains(etag):
+            return await self.respond(send, 304, None, etag, weak=weak)
+        await self.respond(send, status, body, etag, coding, weak)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.engine is not None:
+                    await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def start(self):
+        if self.engine is None:
+            self.engine = create_async_engine(self.database_url or async_database_url(self.flask_app))
+
+    # (model, fields, column, key, many) for GETs on a native read route, otherwise None.
+    # Garment routes come back as (GarmentOrder, None, garment type, number or None, many).
+    def match(self, scope):
+        if scope['method'] != 'GET':
+            return None
+        # The archive database is only attached to the Flask app's connections
+        if 'include_archived' in parse_qs(scope['query_string'].decode('latin-1')):
+            return None
+        path = scope['path'].rstrip('/') or '/'
+        if path in LIST_ROUTES:
+            return (*LIST_ROUTES[path], None, None, True)
+        if path in GARMENT_LIST_ROUTES:
+            return GarmentOrder, None, GARMENT_LIST_ROUTES[path], None, True
+        prefix, _, key = path.rpartition('/')
+        if not key.isdigit():
+            return None
+        if prefix + '/' in GARMENT_ITEM_ROUTES:
+            return GarmentOrder, None, GARMENT_ITEM_ROUTES[prefix + '/'], int(key), False
+        route = ITEM_ROUTES.get(prefix + '/')
+        if route is None:
+            return None
+        model, fields, column, many = route
+        return model, fields, column, int(key), many
+
+    # The Flask session from the signed session cookie, empty when missing or invalid
+    def session(self, scope):
+        cookies = SimpleCookie()
+        for name, value in scope['headers']:
+            if name == b'cookie':
+                cookies.load(value.decode('latin-1'))
+        morsel = cookies.get(self.flask_app.config['SESSION_COOKIE_NAME'])
+        if morsel is None:
+            return {}
+        try:
+            return self.sessions.loads(
+                morsel.value, max_age=int(self.flask_app.permanent_session_lifetime.total_seconds())
+            )
+        except BadSignature:
+            return {}
+
+    async def events(self, scope, receive, send):
+        data = self.session(scope)
+        if 'user_id' not in data:
+            return await self.respond(send, 401, {"message": "Unauthorized"})
+
+        role, user_id = data.get('role'), data['user_id']
+        headers = dict(scope['headers'])
+        args = {k: v[-1] for k, v in parse_qs(scope['query_string'].decode('latin-1')).items()}
+        since = last_event_id({'Last-Event-ID': headers.get(b'last-event-id', b'').decode('latin-1')}, args)
+
+        # Subscribe before replaying so nothing committed in between is lost
+        subscriber = bus.subscribe(AsyncSubscriber(role, user_id, asyncio.get_running_loop()))
+        disconnected = asyncio.ensure_future(self.disconnect(receive))
+        try:
+            replayed = await asyncio.to_thread(self.replay, since, role, user_id) if since is not None else []
+            await send({
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                ],
+            })
+            chunks = [RETRY]
+            if replayed is None:
+                chunks.append(RESET)
+                replayed = []
+            chunks += [format_event(event) for event in replayed]
+            await send({'type': 'http.response.body', 'body': b''.join(chunks), 'more_body': True})
+            seen = replayed[-1]['version'] if replayed else 0
+
+            while not subscriber.overflowed and not disconnected.done():
+                get = asyncio.ensure_future(subscriber.queue.get())
+                await asyncio.wait({get, disconnected}, timeout=HEARTBEAT, return_when=asyncio.FIRST_COMPLETED)
+                if not get.done():
+                    get.cancel()
+                    if not disconnected.done():
+                        await send({'type': 'http.response.body', 'body': KEEPALIVE, 'more_body': True})
+                elif get.result()['version'] > seen:
+                    await send({'type': 'http.response.body', 'body': format_event(get.result()), 'more_body': True})
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            bus.unsubscribe(subscriber)
+            disconnected.cancel()
+
+    async def disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    def replay(self, since, role, user_id):
+        with self.flask_app.app_context():
+            return replay(since, role, user_id)
+
+    # (status, body, version of the row or of a whole list's table, else None)
+    async def read(self, model, fields, column, key, many):
+        self.start()
+        table = model.__table__
+        columns = [table.c[name] for name in fields]
+        query = select(*columns) if many else select(*columns, table.c.version)
+        if column is not None:
+            query = query.where(table.c[column] == key)
+
+        async with self.engine.connect() as conn:
+            version = await conn.scalar(version_query([table.name])) if column is None else None
+            rows = (await conn.execute(query)).mappings().all()
+
+        if many:
+            if column is not None and not rows:
+                return 404, {"message": NOT_FOUND[model]}, None
+            return 200, [dict(row) for row in rows], version
+        if not rows:
+            return 404, {"message": NOT_FOUND[model]}, None
+        row = dict(rows[0])
+        return 200, row, row.pop('version')
+
+    async def read_garments(self, garment, number):
+        self.start()
+        table = GarmentOrder.__table__
+        query = select(table).where(table.c.garment_type == garment)
+        query = query.where(table.c.number == number) if number is not None else query.order_by(table.c.number)
+
+        async with self.engine.connect() as conn:
+            version = await conn.scalar(version_query([table.name])) if number is None else None
+            rows = (await conn.execute(query)).all()
+
+        if number is None:
+            return 200, [legacy_order(row) for row in rows], version
+        if not rows:
+            return 404, {"message": "Measurement not found"}, None
+        return 200, legacy_order(rows[0]), rows[0].version
+
+    async def respond(self, send, status, body, etag=None, coding=None, weak=False):
+        payload = json.dumps(body, default=to_json).encode('utf-8') if body is not None else b''
+        headers = []
+        if body is not None:
+            headers.append((b'content-type', b'application/json'))
+        if body is not None or status == 304:
+            headers.append((b'vary', b'Accept-Encoding'))
+        if coding is not None and len(payload) >= self.flask_app.config['COMPRESSION_MIN_SIZE']:
+            payload = await asyncio.to_thread(compress, payload, coding, LEVELS[coding])
+            headers.append((b'content-encoding', coding.encode('latin-1')))
+        headers.append((b'content-length', str(len(payload)).encode('latin-1')))
+        if etag is not None:
+            headers.append((b'etag', quote_etag(etag, weak).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': payload})
+
+
+application = AsyncReadApp(create_app())
@@ -0,0 +1,144 @@
+# Several API calls in one round trip, for apps on slow mobile links.
+#
+#   POST /batch   {"requests": [{"method": "GET", "path": "/staff/3"},
+#                               {"method": "GET", "path": "/coat_measurements"},
+#                               {"method": "PATCH", "path": "/coat_measurement/7",
+#                                "headers": {"If-Match": "\"4\""}, "body": {"chest": 40}}]}
+#   -> {"responses": [{"status": 200, "headers": {"ETag": "\"1\""}, "body": {...}}, ...]}
+#
+# Each sub-request goes through the app's own routing, hooks and resources in
+# process, with no socket or HTTP parsing in between. It carries the caller's
+# session cookie, so it is authorised exactly as if it had been sent alone. They
+# run in the order given and one failing does not stop the rest.
+#
+# Sub-requests share the batch's database session. Reads run inside one SQLite
+# read transaction, so every read up to the first write comes from the same
+# snapshot, and the reads after a write see it and share a new one. They are not
+# spread over threads: a SQLite connection runs one statement at a time and a
+# session cannot be shared between threads, and reads on connections of their own
+# could stall behind another worker's writer waiting on the batch's snapshot.
+#
+# Event streams (/events) cannot be batched, and changes a sub-request makes
+# to the session (/login, /logout) are not kept. Sub-responses are never
+# compressed on their own (an Accept-Encoding given for one is dropped); the
+# batch response is, as a whole.
+import logging
+from urllib.parse import urlsplit
+
+from flask import current_app, g, jsonify, request, session
+from flask_restful import Resource
+from werkzeug.test import EnvironBuilder
+
+from extensions import db
+
+log = logging.getLogger(__name__)
+
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+# Headers of the batch request every sub-request is sent with
+INHERITED_HEADERS = ('Cookie', 'User-Agent', 'Accept-Language')
+# Headers of a sub-request that are dropped: only the batch response itself is compressed
+DROPPED_HEADERS = {'accept-encoding'}
+# Headers of each sub-response passed back to the caller
+RETURNED_HEADERS = ('ETag', 'Location', 'Idempotent-Replayed')
+
+
+def invalid(index, message):
+    return {"message": f"Request {index}: {message}"}, 400
+
+
+# The sub-requests in a batch body as dicts of method, path, headers and body, or an error response
+def parse(data, limit):
+    subs = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(subs, list) or not subs:
+        return {"message": "'requests' must be a non-empty list"}, 400
+    if len(subs) > limit:
+        return {"message": f"At most {limit} requests can be batched"}, 400
+
+    parsed = []
+    for index, sub in enumerate(subs):
+        if not isinstance(sub, dict):
+            return invalid(index, "must be an object")
+        method = sub.get('method', 'GET')
+        path = sub.get('path')
+        headers = sub.get('headers') or {}
+        if not isinstance(method, str) or method.upper() not in METHODS:
+            return invalid(index, f"'method' must be one of {', '.join(METHODS)}")
+        if not isinstance(path, str) or not path.startswith('/') or path.startswith('//'):
+            return invalid(index, "'path' must be a path on this server, e.g. /staff/3")
+        if urlsplit(path).path.rstrip('/') == request.path.rstrip('/'):
+            return invalid(index, "batches cannot be nested")
+        if not isinstance(headers, dict) or not all(isinstance(v, str) for v in headers.values()):
+            return invalid(index, "'headers' must map header names to strings")
+        parsed.append({'method': method.upper(), 'path': path, 'headers': headers, 'body': sub.get('body')})
+    return parsed
+
+
+# Keep the session's connection in a read transaction, so the reads that follow share one
+# snapshot. The SQLite driver only opens a transaction before a write, otherwise every
+# statement would see the database as it is at that moment.
+def hold_snapshot():
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN')
+
+
+# Run one sub-request through the app and return its status, headers and body
+def dispatch(sub):
+    headers = {name: request.headers[name] for name in INHERITED_HEADERS if name in request.headers}
+    headers.update((name, value) for name, value in sub['headers'].items() if name.lower() not in DROPPED_HEADERS)
+    builder = EnvironBuilder(path=sub['path'], method=sub['method'], headers=headers, base_url=request.host_url,
+                             json=sub['body'], environ_base={'REMOTE_ADDR': request.remote_addr})
+    app = current_app._get_current_object()
+
+    # The sub-request shares the batch's app context, and so g, where the metrics and
+    # query log hooks keep their per-request state; give it a clean one and restore ours
+    outer = dict(vars(g))
+    vars(g).clear()
+    try:
+        with app.request_context(builder.get_environ()):
+            response = app.full_dispatch_request()
+    except Exception:
+        log.exception("Batched %s %s failed", sub['method'], sub['path'])
+        db.session.rollback()
+        return {'status': 500, 'headers': {}, 'body': {"message": "Internal Server Error"}}
+    finally:
+        builder.close()
+        vars(g).clear()
+        vars(g).update(outer)
+
+    # A request that failed may have left the session mid-transaction
+    if response.status_code >= 500:
+        db.session.rollback()
+    if response.mimetype == 'text/event-stream':
+        response.close()
+        return {'status': 400, 'headers': {}, 'body': {"message": "Event streams cannot be batched"}}
+    returned = {name: response.headers[name] for name in RETURNED_HEADERS if name in response.headers}
+    if response.status_code in (204, 304):
+        body = None
+    elif response.is_json:
+        body = response.get_json(silent=True)
+    else:
+        body = response.get_data(as_text=True) or None
+    response.close()
+    return {'status': response.status_code, 'headers': returned, 'body': body}
+
+
+class Batch(Resource):
+    def post(self):
+        if 'user_id' not in session:
+            return {"message": "Unauthorized"}, 401
+
+        subs = parse(request.get_json(silent=True), current_app.config['BATCH_MAX_REQUESTS'])
+        if isinstance(subs, tuple):
+            return subs
+
+        responses = []
+        for sub in subs:
+            if sub['method'] == 'GET':
+                hold_snapshot()
+            else:
+                # Writes start outside the snapshot: SQLite fails a write at once, rather
+                # than waiting, when its connection is already reading and another is writing
+                db.session.rollback()
+            responses.append(dispatch(sub))
+        return jsonify({'responses': responses})
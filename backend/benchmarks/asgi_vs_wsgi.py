@@ -0,0 +1,58 @@
+# Compare the threaded WSGI server with the async (ASGI) read mode.
+#
+#   python benchmarks/asgi_vs_wsgi.py --rows 5000 --concurrency 1 16 64 --duration 10
+#
+# Both servers are started against the same temporary SQLite file and hammered
+# with GET requests on the list and item routes by N concurrent keep-alive
+# connections. Throughput, latency percentiles and the server's peak RSS are
+# reported for each mode and concurrency level.
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from common import free_port, peak_rss, run_load, seed, start_server
+
+SERVERS = {
+    'wsgi': [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--with-threads', '--port'],
+    'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:application', '--log-level', 'warning', '--port'],
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare threaded WSGI and async ASGI read throughput')
+    parser.add_argument('--rows', type=int, default=2000, help='coat measurement rows to seed')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--duration', type=float, default=10, help='seconds per run')
+    parser.add_argument('--modes', nargs='+', default=['wsgi', 'asgi'], choices=list(SERVERS))
+    parser.add_argument('--json', dest='json_path', help='also write results to this file')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='star_mis_bench_')
+    database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    env = dict(os.environ, DATABASE_URL=database_url)
+    cookie = seed(database_url, args.rows)
+
+    results = []
+    for mode in args.modes:
+        port = free_port()
+        proc = start_server(SERVERS[mode] + [str(port)], port, env)
+        try:
+            for concurrency in args.concurrency:
+                result = run_load(port, cookie, concurrency, args.duration)
+                result.update(mode=mode, concurrency=concurrency, peak_rss_mib=peak_rss(proc.pid))
+                results.append(result)
+                print(f"{mode:5} c={concurrency:<4} {result['rps']:>9} req/s  p50={result['p50_ms']}ms  "
+                      f"p99={result['p99_ms']}ms  errors={result['errors']}  rss={result['peak_rss_mib']}MiB")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
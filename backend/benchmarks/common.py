@@ -0,0 +1,158 @@
+# Helpers shared by the benchmark scripts
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+READ_PATHS = ['/coat_measurements', '/clients', '/inventories', '/coat_measurement/1', '/client/1']
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# Create the schema and some rows to read, returning a session cookie the servers accept
+def seed(database_url, rows):
+    from flask.sessions import SecureCookieSessionInterface
+    from app import create_app
+    from extensions import db
+    from models import Staff, Client, GarmentOrder, Inventory
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+    now = datetime.now(timezone.utc)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Staff(id=1, username='bench', national_id=1, phone='0700000000',
+                             email='bench@example.com', role='ADMIN', password='x'))
+        db.session.add(Client(id=1, username='client', phone='0700000001', email='client@example.com',
+                              password='x', created_by=1))
+        db.session.add_all(Inventory(item_name=f'fabric {i}', quantity=10, created_by=1, date_created=now)
+                           for i in range(100))
+        db.session.add_all(GarmentOrder(garment_type='coat', number=number, fabric='wool', client=1, created_by=1,
+                                        date_created=now,
+                                        measurements={'shoulder': 18, 'sleeves': 25, 'chest': 40, 'waist': 34})
+                           for number in range(1, rows + 1))
+        db.session.commit()
+
+    serializer = SecureCookieSessionInterface().get_signing_serializer(app)
+    return serializer.dumps({'user_id': 1, 'username': 'bench', 'role': 'ADMIN'})
+
+
+# Start a server command from the backend directory and wait until it accepts connections
+def start_server(cmd, port, env, timeout=30):
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            break
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"Server did not start: {' '.join(cmd)}")
+
+
+# Peak resident memory of a process and its children in MiB (Linux only)
+def peak_rss(pid):
+    total = 0
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids += [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+    for p in pids:
+        try:
+            with open(f'/proc/{p}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        total += int(line.split()[1])
+        except OSError:
+            return None
+    return round(total / 1024, 1)
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+# One load-generating process: `threads` keep-alive connections issuing GETs until `stop`
+def _load_process(port, cookie, threads, stop, paths, offset):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(n):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        headers = {'Cookie': f'session={cookie}'}
+        mine = []
+        failed = 0
+        i = n
+        while time.time() < stop:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                continue
+            mine.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    pool = [threading.Thread(target=worker, args=(offset + n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies, errors[0]
+
+
+# Drive `concurrency` connections for `duration` seconds, spread over `processes` client processes
+def run_load(port, cookie, concurrency, duration, processes=1, paths=READ_PATHS):
+    processes = max(1, min(processes, concurrency))
+    stop = time.time() + duration
+    shares = [concurrency // processes + (i < concurrency % processes) for i in range(processes)]
+    offsets = [sum(shares[:i]) for i in range(processes)]
+
+    if processes == 1:
+        parts = [_load_process(port, cookie, concurrency, stop, paths, 0)]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            parts = pool.starmap(_load_process, [(port, cookie, n, stop, paths, o) for n, o in zip(shares, offsets)])
+
+    latencies = [l for part, _ in parts for l in part]
+    errors = sum(e for _, e in parts)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+    }
@@ -0,0 +1,136 @@
+# Throughput of concurrent PATCHes to a few hot rows, with and without If-Match.
+#
+#   python benchmarks/contention.py --concurrency 8 --duration 10 --hot 4 --output results.json
+#   python benchmarks/contention.py --compare results.json      # against an earlier run
+#
+# Seeds a temporary SQLite file, starts the threaded Flask server and has every
+# thread patch the measurements of --hot coat orders for --duration seconds,
+# once in each mode:
+#   blind      PATCH without If-Match, as clients have always done (last writer wins)
+#   if-match   GET for the ETag, then PATCH with If-Match; a 412 reads again and retries
+# Prints applied updates per second, 412s, 409s and errors per mode. With --compare,
+# exits non-zero when blind throughput fell more than --max-loss percent below
+# the earlier run's, e.g. one measured before rows carried versions.
+import argparse
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from common import free_port, seed, start_server
+
+MODES = ('blind', 'if-match')
+
+
+def patch_loop(port, cookie, hot, mode, stop, n, totals, lock):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Cookie': f'session={cookie}', 'Content-Type': 'application/json'}
+    counts = {'applied': 0, 'conflicts': 0, 'busy': 0, 'errors': 0, 'requests': 0}
+    i = n
+    while time.time() < stop:
+        number = i % hot + 1
+        i += 1
+        path = f'/coat_measurement/{number}'
+        body = json.dumps({'chest': 36 + i % 10})
+        try:
+            request_headers = dict(headers)
+            if mode == 'if-match':
+                conn.request('GET', path, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                counts['requests'] += 1
+                request_headers['If-Match'] = resp.getheader('ETag')
+            conn.request('PATCH', path, body=body, headers=request_headers)
+            resp = conn.getresponse()
+            resp.read()
+            counts['requests'] += 1
+        except (OSError, http.client.HTTPException):
+            counts['errors'] += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            continue
+        if resp.status == 200:
+            counts['applied'] += 1
+        elif resp.status == 412:
+            counts['conflicts'] += 1
+        elif resp.status == 409:
+            counts['busy'] += 1
+        else:
+            counts['errors'] += 1
+    conn.close()
+    with lock:
+        for name, count in counts.items():
+            totals[name] += count
+
+
+def run_mode(port, cookie, hot, mode, concurrency, duration):
+    totals = {'applied': 0, 'conflicts': 0, 'busy': 0, 'errors': 0, 'requests': 0}
+    lock = threading.Lock()
+    stop = time.time() + duration
+    threads = [threading.Thread(target=patch_loop, args=(port, cookie, hot, mode, stop, n, totals, lock))
+               for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    totals['updates_per_s'] = round(totals['applied'] / duration, 1)
+    totals['requests_per_s'] = round(totals['requests'] / duration, 1)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent PATCH throughput on hot rows')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per mode')
+    parser.add_argument('--hot', type=int, default=4, help='rows all threads patch')
+    parser.add_argument('--modes', default=','.join(MODES), help='comma-separated: blind, if-match')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--compare', help='earlier results JSON to compare blind throughput against')
+    parser.add_argument('--max-loss', type=float, default=5, help='allowed drop in blind updates/s, percent')
+    args = parser.parse_args()
+    modes = [m for m in args.modes.split(',') if m]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown mode(s): {', '.join(sorted(unknown))}")
+
+    tmp = tempfile.mkdtemp(prefix='star_mis_bench_')
+    database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    cookie = seed(database_url, args.hot)
+
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url)
+    proc = start_server([sys.executable, '-m', 'flask', '--app', 'app', 'run', '--with-threads',
+                         '--port', str(port)], port, env)
+    try:
+        run_mode(port, cookie, args.hot, 'blind', args.concurrency, 1)  # warm up
+        results = {mode: run_mode(port, cookie, args.hot, mode, args.concurrency, args.duration) for mode in modes}
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    print(f"{'mode':10} {'updates/s':>10} {'req/s':>8} {'412':>6} {'409':>6} {'errors':>7}")
+    for mode, r in results.items():
+        print(f"{mode:10} {r['updates_per_s']:>10} {r['requests_per_s']:>8} {r['conflicts']:>6} "
+              f"{r['busy']:>6} {r['errors']:>7}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+                       'modes': results}, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            before = json.load(f)['modes'].get('blind')
+        now = results.get('blind')
+        if before and now:
+            change = (now['updates_per_s'] - before['updates_per_s']) / before['updates_per_s'] * 100
+            print(f"blind updates/s {before['updates_per_s']} -> {now['updates_per_s']} ({change:+.1f}%)")
+            if change < -args.max_loss:
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
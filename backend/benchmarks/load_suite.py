@@ -0,0 +1,433 @@
+# Reproducible load test covering every route.
+#
+#   python benchmarks/load_suite.py --concurrency 16 --duration 30 --output results.json
+#   python benchmarks/load_suite.py --compare results.json          # against an earlier run
+#
+# Seeds a temporary SQLite file with staff for each role, clients, all four
+# garment types, loans and inventory, starts the app, and first touches every
+# route once (including the deletes, on rows reserved for them). Then virtual
+# users log in through /login as ADMIN, MANAGER, TAILOR or client and run a
+# role-specific mix of list polling, item reads, measurement creation, status
+# patches, inventory edits and logins. Per-route throughput and p50/p95/p99
+# latency are printed and written as JSON together with the commit they were
+# measured on. Everything random is driven by --seed.
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from common import BACKEND_DIR, free_port, percentile, start_server
+
+PASSWORD = 'password'
+GARMENTS = ['coat', 'regular_shirt', 'senator_shirt', 'trouser']
+STATUSES = ['booked', 'on progress', 'final touches', 'done']
+
+SERVERS = {
+    'wsgi': lambda port, workers: [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--with-threads',
+                                   '--port', str(port)],
+    'gunicorn': lambda port, workers: [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                                       '--workers', str(workers), '--bind', f'127.0.0.1:{port}'],
+    'asgi': lambda port, workers: [sys.executable, '-m', 'uvicorn', 'asgi:application', '--log-level', 'warning',
+                                   '--workers', str(workers), '--port', str(port)],
+}
+
+# Share of virtual users per role
+ROLE_WEIGHTS = {'ADMIN': 1, 'MANAGER': 3, 'TAILOR': 8, 'client': 4}
+
+
+# Seed the database and return the ids the workload needs
+def seed(database_url, scale, rng):
+    from werkzeug.security import generate_password_hash
+    from app import create_app
+    from extensions import db
+    from models import Staff, AdvanceLoan, Client, Inventory, GarmentOrder, GARMENT_FIELDS
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+    password = generate_password_hash(PASSWORD)
+    now = datetime.now(timezone.utc)
+    tailors = max(2, scale // 50)
+
+    with app.app_context():
+        db.create_all()
+        staff = [Staff(username='admin', national_id=1, phone='0700000001', email='admin@example.com',
+                       role='ADMIN', password=password, created_at=now),
+                 Staff(username='manager', national_id=2, phone='0700000002', email='manager@example.com',
+                       role='MANAGER', password=password, created_at=now)]
+        staff += [Staff(username=f'tailor{i}', national_id=100 + i, phone=f'07100{i:05d}',
+                        email=f'tailor{i}@example.com', role='TAILOR', salary=20000, password=password, created_at=now)
+                  for i in range(tailors + 1)]  # the last one is reserved for DELETE /staff/<id>
+        db.session.add_all(staff)
+        db.session.flush()
+        tailor_ids = [s.id for s in staff if s.role == 'TAILOR']
+
+        clients = [Client(username=f'client{i}', phone=f'07200{i:05d}', email=f'client{i}@example.com',
+                          password=password, buying_price=rng.randint(2000, 20000), balance_amount=rng.randint(0, 5000),
+                          pickup_date=now + timedelta(days=rng.randint(1, 30)), group_name=f'group{i % 20}',
+                          created_by=staff[1].id, date_created=now)
+                   for i in range(scale + 1)]
+        db.session.add_all(clients)
+        db.session.flush()
+        client_ids = [c.id for c in clients]
+
+        measurements = {}
+        for garment, fields in GARMENT_FIELDS.items():
+            rows = [GarmentOrder(garment_type=garment, number=number, fabric=rng.choice(['wool', 'linen', 'cotton']),
+                                 client=rng.choice(client_ids[:-1]), assigned_to=rng.choice(tailor_ids[:-1]),
+                                 status=rng.choice(STATUSES), created_by=staff[1].id, date_created=now,
+                                 measurements={f: round(rng.uniform(10, 45), 1) for f in fields})
+                    for number in range(1, scale * 2 + 2)]
+            db.session.add_all(rows)
+            db.session.flush()
+            measurements[garment] = [m.number for m in rows]
+
+        inventory = [Inventory(item_name=f'fabric roll {i}', quantity=rng.randint(1, 99), created_by=staff[0].id,
+                               date_created=now) for i in range(51)]
+        db.session.add_all(inventory)
+        loans = [AdvanceLoan(amount=rng.randint(500, 5000), type=rng.choice(['ADVANCE', 'LOAN']), taken_by=tid,
+                             date_taken=now) for tid in tailor_ids for _ in range(2)]
+        db.session.add_all(loans)
+        db.session.commit()
+
+        return {
+            'admin': staff[0].id,
+            'manager': staff[1].id,
+            'tailors': tailor_ids[:-1],
+            'clients': client_ids[:-1],
+            'measurements': {g: ids[:-1] for g, ids in measurements.items()},
+            'inventory': [i.id for i in inventory[:-1]],
+            'loans': [l.id for l in loans[:-1]],
+            'reserved': {
+                'staff': tailor_ids[-1],
+                'client': client_ids[-1],
+                'inventory': inventory[-1].id,
+                'loan': loans[-1].id,
+                **{g: ids[-1] for g, ids in measurements.items()},
+            },
+        }
+
+
+class User:
+    def __init__(self, port, role, email, user_id):
+        self.port = port
+        self.role = role
+        self.email = email
+        self.id = user_id
+        self.cookie = None
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+    def request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'}
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        payload = json.dumps(body) if body is not None else None
+        started = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            resp = self.conn.getresponse()
+            resp.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            return time.perf_counter() - started, 0
+        cookie = resp.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return time.perf_counter() - started, resp.status
+
+    def login(self):
+        return self.request('POST', '/login', {'email': self.email, 'password': PASSWORD})
+
+
+def measurement_body(garment, ids, rng):
+    body = {'fabric': rng.choice(['wool', 'linen', 'cotton']), 'client': rng.choice(ids['clients']),
+            'created_by': ids['manager'], 'status': 'booked'}
+    if garment == 'trouser':
+        body.update({f: round(rng.uniform(10, 45), 1) for f in ['waist', 'thigh', 'knee', 'bottom', 'fly', 'hips']})
+    else:
+        body.update({f: round(rng.uniform(10, 45), 1) for f in ['shoulder', 'sleeves', 'chest', 'waist', 'arm']})
+    return body
+
+
+# Weighted actions per role: (weight, route label, builder(user, ids, rng) -> (method, path, body))
+def actions(role):
+    lists = [(5, f'GET /{g}_measurements', lambda u, ids, rng, g=g: ('GET', f'/{g}_measurements', None))
+             for g in GARMENTS]
+    items = [(3, f'GET /{g}_measurement/<id>',
+              lambda u, ids, rng, g=g: ('GET', f"/{g}_measurement/{rng.choice(ids['measurements'][g])}", None))
+             for g in GARMENTS]
+    status_patches = [(3, f'PATCH /{g}_measurement/<id>',
+                       lambda u, ids, rng, g=g: ('PATCH', f"/{g}_measurement/{rng.choice(ids['measurements'][g])}",
+                                                 {'status': rng.choice(STATUSES)}))
+                      for g in GARMENTS]
+    login = [(2, 'POST /login', lambda u, ids, rng: ('POST', '/login', {'email': u.email, 'password': PASSWORD}))]
+
+    if role in ('ADMIN', 'MANAGER'):
+        return lists + items + status_patches + login + [
+            (5, 'GET /clients', lambda u, ids, rng: ('GET', '/clients', None)),
+            (3, 'GET /staffs', lambda u, ids, rng: ('GET', '/staffs', None)),
+            (4, 'GET /inventories', lambda u, ids, rng: ('GET', '/inventories', None)),
+            (2, 'GET /advance_loans', lambda u, ids, rng: ('GET', '/advance_loans', None)),
+            (2, 'GET /client/<id>', lambda u, ids, rng: ('GET', f"/client/{rng.choice(ids['clients'])}", None)),
+            (2, 'GET /staff/<id>', lambda u, ids, rng: ('GET', f"/staff/{rng.choice(ids['tailors'])}", None)),
+            (2, 'GET /inventory/<id>', lambda u, ids, rng: ('GET', f"/inventory/{rng.choice(ids['inventory'])}", None)),
+            (3, 'PATCH /inventory/<id>', lambda u, ids, rng: ('PATCH', f"/inventory/{rng.choice(ids['inventory'])}",
+                                                              {'quantity': rng.randint(1, 99)})),
+            (1, 'POST /inventories', lambda u, ids, rng: ('POST', '/inventories', {
+                'item_name': 'new roll', 'quantity': rng.randint(1, 99), 'created_by': u.id})),
+            (3, 'POST /senator_shirt_measurements', lambda u, ids, rng: (
+                'POST', '/senator_shirt_measurements', measurement_body('senator_shirt', ids, rng))),
+            (3, 'POST /trouser_measurements', lambda u, ids, rng: (
+                'POST', '/trouser_measurements', measurement_body('trouser', ids, rng))),
+            (1, 'PATCH /client/<id>', lambda u, ids, rng: ('PATCH', f"/client/{rng.choice(ids['clients'])}",
+                                                           {'balance_amount': rng.randint(0, 5000)})),
+            (1, 'GET /job_cards', lambda u, ids, rng: ('GET', '/job_cards?ids=' + ','.join(
+                f"{g}:{rng.choice(ids['measurements'][g])}" for g in GARMENTS), None)),
+        ]
+    if role == 'TAILOR':
+        return [(w * 2, label, build) for w, label, build in lists] + items + \
+            [(w * 2, label, build) for w, label, build in status_patches] + login + [
+            (2, 'GET /advance_loan/<id>', lambda u, ids, rng: (
+                'GET', f"/advance_loan/{u.id if u.role == 'TAILOR' else rng.choice(ids['tailors'])}", None)),
+            (1, 'GET /', lambda u, ids, rng: ('GET', '/', None)),
+        ]
+    return items + login + [
+        (10, 'GET /client/<id>', lambda u, ids, rng: ('GET', f'/client/{u.id}', None)),
+        (2, 'GET /', lambda u, ids, rng: ('GET', '/', None)),
+    ]
+
+
+# One request to every route, so nothing goes unmeasured; deletes use the reserved rows
+def coverage_pass(user, ids):
+    r = ids['reserved']
+    requests = [
+        ('GET /', 'GET', '/', None),
+        ('GET /metrics', 'GET', '/metrics', None),
+        ('GET /debug/queries', 'GET', '/debug/queries', None),
+        ('POST /create_staff', 'POST', '/create_staff', {
+            'username': 'new tailor', 'national_id': 999999, 'phone': '0799999999', 'email': 'new.tailor@example.com',
+            'role': 'TAILOR', 'salary': 15000, 'password': PASSWORD}),
+        ('POST /create_client', 'POST', '/create_client', {
+            'username': 'new client', 'phone': '0788888888', 'email': 'new.client@example.com',
+            'buying_price': 5000, 'balance_amount': 1000, 'pickup_date': '2030-01-01', 'group_name': 'none',
+            'created_by': ids['manager'], 'password': PASSWORD}),
+        ('POST /clients', 'POST', '/clients', {
+            'username': 'walk in', 'phone': '0777777777', 'email': 'walk.in@example.com', 'password': PASSWORD,
+            'balance_amount': 0, 'pickup_date': '2030-01-01'}),
+        ('PATCH /staff/<id>', 'PATCH', f"/staff/{ids['tailors'][0]}", {'salary': 21000}),
+        ('PATCH /advance_loan/<id>', 'PATCH', f"/advance_loan/{ids['loans'][0]}", {'status': 'Approved'}),
+        ('DELETE /advance_loan/<id>', 'DELETE', f"/advance_loan/{r['loan']}", None),
+        ('DELETE /inventory/<id>', 'DELETE', f"/inventory/{r['inventory']}", None),
+    ]
+    requests += [(f'DELETE /{g}_measurement/<id>', 'DELETE', f'/{g}_measurement/{r[g]}', None) for g in GARMENTS]
+    requests += [
+        ('DELETE /client/<id>', 'DELETE', f"/client/{r['client']}", None),
+        ('DELETE /staff/<id>', 'DELETE', f"/staff/{r['staff']}", None),
+    ]
+
+    rng = random.Random(0)
+    for role in ('ADMIN', 'TAILOR', 'client'):
+        for _, label, build in actions(role):
+            method, path, body = build(user, ids, rng)
+            requests.append((label, method, path, body))
+
+    records = {}
+    for label, method, path, body in requests:
+        latency, status = user.request(method, path, body)
+        records.setdefault(label, ([], [0]))
+        records[label][0].append(latency)
+        records[label][1][0] += status == 0 or status >= 400
+    latency, status = user.request('POST', '/logout')
+    records['POST /logout'] = ([latency], [status == 0 or status >= 400])
+    return records
+
+
+def run_users(port, ids, users, stop, seed):
+    records = {}
+    rng = random.Random(seed)
+    sessions = []
+    for role, email, user_id in users:
+        user = User(port, role, email, user_id)
+        user.login()
+        table = actions(role)
+        sessions.append((user, table, [w for w, _, _ in table]))
+
+    # Round-robin over this process's users so each keeps one open connection
+    while time.time() < stop:
+        for user, table, weights in sessions:
+            _, label, build = rng.choices(table, weights)[0]
+            method, path, body = build(user, ids, rng)
+            latency, status = user.request(method, path, body)
+            latencies, errors = records.setdefault(label, ([], [0]))
+            latencies.append(latency)
+            errors[0] += status == 0 or status >= 400
+    return records
+
+
+def _run_users_thread_pool(port, ids, users, stop, seed, threads):
+    # One thread per virtual user inside a client process
+    import threading
+    results = []
+    lock = threading.Lock()
+
+    def target(i, user):
+        records = run_users(port, ids, [user], stop, seed * 1000 + i)
+        with lock:
+            results.append(records)
+
+    pool = [threading.Thread(target=target, args=(i, u)) for i, u in enumerate(users)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return merge_records(results)
+
+
+def merge_records(parts):
+    merged = {}
+    for records in parts:
+        for label, (latencies, errors) in records.items():
+            m = merged.setdefault(label, ([], [0]))
+            m[0].extend(latencies)
+            m[1][0] += errors[0]
+    return merged
+
+
+def summarize(records, duration):
+    routes = {}
+    for label, (latencies, errors) in sorted(records.items()):
+        routes[label] = {
+            'requests': len(latencies),
+            'errors': errors[0],
+            'rps': round(len(latencies) / duration, 2) if duration else None,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        }
+    return routes
+
+
+def virtual_users(ids, concurrency):
+    roles = [role for role, weight in ROLE_WEIGHTS.items() for _ in range(weight)]
+    users = []
+    for i in range(concurrency):
+        role = roles[i % len(roles)]
+        if role == 'ADMIN':
+            users.append((role, 'admin@example.com', ids['admin']))
+        elif role == 'MANAGER':
+            users.append((role, 'manager@example.com', ids['manager']))
+        elif role == 'TAILOR':
+            n = i % len(ids['tailors'])
+            users.append((role, f'tailor{n}@example.com', ids['tailors'][n]))
+        else:
+            n = i % len(ids['clients'])
+            users.append((role, f'client{n}@example.com', ids['clients'][n]))
+    return users
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(current, baseline, threshold):
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for label, now in current['routes'].items():
+        before = baseline['routes'].get(label)
+        if not before or not now['requests'] or not before['requests']:
+            continue
+        change = (now['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+        flag = '  REGRESSION' if change > threshold else ''
+        print(f"  {label:45} p95 {before['p95_ms']:>8} -> {now['p95_ms']:>8} ms ({change:+.0f}%){flag}")
+        if flag:
+            regressions.append(label)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mixed-workload load test over every route')
+    parser.add_argument('--server', choices=list(SERVERS), default='wsgi')
+    parser.add_argument('--workers', type=int, default=1, help='server worker processes (gunicorn/asgi)')
+    parser.add_argument('--concurrency', type=int, default=16, help='virtual users')
+    parser.add_argument('--clients', type=int, default=1, help='load generator processes')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of mixed workload')
+    parser.add_argument('--scale', type=int, default=200, help='clients to seed (other tables scale with it)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--compare', help='earlier results JSON to compare p95 latency against')
+    parser.add_argument('--regression-threshold', type=float, default=20,
+                        help='p95 increase in percent that counts as a regression')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tmp = tempfile.mkdtemp(prefix='star_mis_bench_')
+    database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    ids = seed(database_url, args.scale, rng)
+
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database_url)
+    proc = start_server(SERVERS[args.server](port, args.workers), port, env)
+    try:
+        admin = User(port, 'ADMIN', 'admin@example.com', ids['admin'])
+        admin.login()
+        coverage = coverage_pass(admin, ids)
+
+        users = virtual_users(ids, args.concurrency)
+        stop = time.time() + args.duration
+        started = time.time()
+        if args.clients > 1:
+            shares = [users[i::args.clients] for i in range(args.clients)]
+            with multiprocessing.Pool(args.clients) as pool:
+                parts = pool.starmap(_run_users_thread_pool,
+                                     [(port, ids, share, stop, args.seed + i, len(share))
+                                      for i, share in enumerate(shares) if share])
+            records = merge_records(parts)
+        else:
+            records = _run_users_thread_pool(port, ids, users, stop, args.seed, len(users))
+        elapsed = time.time() - started
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    result = {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+        'coverage': {label: {'requests': len(l), 'errors': e[0]} for label, (l, e) in sorted(coverage.items())},
+        'routes': summarize(records, elapsed),
+    }
+    total = sum(r['requests'] for r in result['routes'].values())
+    result['total'] = {'requests': total, 'rps': round(total / elapsed, 1),
+                       'errors': sum(r['errors'] for r in result['routes'].values())}
+
+    print(f"{'route':45} {'req':>7} {'err':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for label, r in result['routes'].items():
+        print(f"{label:45} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8} "
+              f"{r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8}")
+    print(f"total {total} requests, {result['total']['rps']} req/s, {result['total']['errors']} errors")
+    failing = [label for label, r in result['coverage'].items() if r['errors']]
+    if failing:
+        print(f"routes that failed in the coverage pass: {', '.join(failing)}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(result, json.load(f), args.regression_threshold):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# Measure the cost of the /metrics instrumentation.
+#
+#   python benchmarks/metrics_overhead.py --requests 2000 --rounds 7
+#
+# Builds the app twice, with and without metrics, against the same temporary
+# SQLite file and times the same mix of GETs through the in-process test
+# client, alternating between the two so drift affects both equally. The best
+# round of each is compared; exits non-zero above --max-overhead percent.
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from common import READ_PATHS, seed
+
+
+def time_requests(client, n):
+    started = time.perf_counter()
+    for i in range(n):
+        client.get(READ_PATHS[i % len(READ_PATHS)])
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure metrics middleware overhead')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per round')
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--rows', type=int, default=50, help='coat measurement rows to seed')
+    parser.add_argument('--max-overhead', type=float, default=2.0, help='allowed overhead in percent')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    tmp = tempfile.mkdtemp(prefix='star_mis_bench_')
+    database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    cookie = seed(database_url, args.rows)
+
+    clients = {}
+    for enabled in (False, True):
+        app = create_app({'SQLALCHEMY_DATABASE_URI': database_url, 'METRICS_ENABLED': enabled})
+        clients[enabled] = app.test_client()
+        clients[enabled].set_cookie('session', cookie)
+        time_requests(clients[enabled], 100)  # warm up
+
+    best = {False: float('inf'), True: float('inf')}
+    for _ in range(args.rounds):
+        for enabled in (False, True):
+            best[enabled] = min(best[enabled], time_requests(clients[enabled], args.requests))
+
+    overhead = (best[True] - best[False]) / best[False] * 100
+    per_request_us = (best[True] - best[False]) / args.requests * 1e6
+    print(f"without metrics {args.requests / best[False]:.0f} req/s, with metrics {args.requests / best[True]:.0f} req/s, "
+          f"overhead {overhead:.2f}% ({per_request_us:.1f}us per request)")
+    if overhead > args.max_overhead:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
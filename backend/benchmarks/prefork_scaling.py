@@ -0,0 +1,65 @@
+# Check that throughput scales with gunicorn worker processes.
+#
+#   python benchmarks/prefork_scaling.py --workers 1 2 4 --duration 10
+#
+# Starts gunicorn with gunicorn.conf.py for each worker count against a
+# temporary SQLite file and drives read traffic from several client processes.
+# Exits non-zero when the throughput gained at the highest worker count is
+# below --min-efficiency of the ideal (linear up to the number of cores).
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+
+from common import free_port, peak_rss, run_load, seed, start_server
+
+
+def main():
+    cores = multiprocessing.cpu_count()
+    parser = argparse.ArgumentParser(description='Measure throughput scaling across gunicorn workers')
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, 2, max(1, cores // 2), cores}))
+    parser.add_argument('--rows', type=int, default=500, help='coat measurement rows to seed')
+    parser.add_argument('--concurrency', type=int, default=32, help='concurrent client connections')
+    parser.add_argument('--clients', type=int, default=max(1, cores // 2), help='load generator processes')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per run')
+    parser.add_argument('--min-efficiency', type=float, default=0.5,
+                        help='required fraction of linear speedup at the highest worker count')
+    parser.add_argument('--json', dest='json_path', help='also write results to this file')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='star_mis_bench_')
+    database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    cookie = seed(database_url, args.rows)
+
+    results = []
+    for workers in args.workers:
+        port = free_port()
+        env = dict(os.environ, DATABASE_URL=database_url, WEB_CONCURRENCY=str(workers), BIND=f'127.0.0.1:{port}')
+        proc = start_server([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], port, env)
+        try:
+            result = run_load(port, cookie, args.concurrency, args.duration, processes=args.clients)
+            result.update(workers=workers, peak_rss_mib=peak_rss(proc.pid))
+        finally:
+            proc.terminate()
+            proc.wait()
+        results.append(result)
+        print(f"workers={workers:<3} {result['rps']:>9} req/s  p50={result['p50_ms']}ms  "
+              f"p99={result['p99_ms']}ms  errors={result['errors']}  rss={result['peak_rss_mib']}MiB")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    base, top = results[0], results[-1]
+    if base['rps'] and top['workers'] > base['workers']:
+        ideal = min(top['workers'], cores) / min(base['workers'], cores)
+        speedup = top['rps'] / base['rps']
+        print(f"speedup {speedup:.2f}x of ideal {ideal:.2f}x")
+        if speedup < ideal * args.min_efficiency:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
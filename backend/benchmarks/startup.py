@@ -0,0 +1,108 @@
+# Cold-start profiler and budget check.
+#
+#   python benchmarks/startup.py                       # median of 5 cold starts vs the budget
+#   python benchmarks/startup.py --importtime --top 20 # plus an import-time breakdown
+#
+# Each run is a fresh interpreter that imports the app, builds it with
+# create_app() and serves its first request (a logged-in list GET against a
+# temporary SQLite file). Exits non-zero when the median time to first
+# request exceeds --budget-ms (or STARTUP_BUDGET_MS), so CI can fail on
+# cold-start regressions.
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import BACKEND_DIR, seed
+
+DEFAULT_BUDGET_MS = 1500
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+client = app.test_client()
+client.set_cookie('session', sys.argv[1])
+response = client.get('/coat_measurements')
+assert response.status_code == 200, response.status_code
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+}))
+"""
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)')
+
+
+def cold_start(cookie, env, importtime=False):
+    cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD, cookie]
+    started = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    total_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr)
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['total_ms'] = total_ms
+    return result, proc.stderr
+
+
+# Cumulative import time of the modules the app imports directly, largest first
+def import_breakdown(stderr, top):
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match and len(match.group(3)) <= 3:
+            rows.append((int(match.group(2)) / 1000, match.group(4)))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure worker cold start and enforce a budget')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float,
+                        default=float(os.environ.get('STARTUP_BUDGET_MS', DEFAULT_BUDGET_MS)),
+                        help='maximum median time from interpreter start to first response')
+    parser.add_argument('--importtime', action='store_true', help='print an import-time breakdown')
+    parser.add_argument('--top', type=int, default=15, help='modules to show in the breakdown')
+    parser.add_argument('--json', dest='json_path', help='also write results to this file')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='star_mis_bench_')
+    database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    env = dict(os.environ, DATABASE_URL=database_url)
+    cookie = seed(database_url, 100)
+
+    runs = [cold_start(cookie, env)[0] for _ in range(args.runs)]
+    summary = {key: round(statistics.median(r[key] for r in runs), 1) for key in runs[0]}
+    summary['budget_ms'] = args.budget_ms
+    print(f"import {summary['import_ms']}ms  create_app {summary['create_app_ms']}ms  "
+          f"first request {summary['first_request_ms']}ms  total {summary['total_ms']}ms "
+          f"(median of {args.runs}, budget {args.budget_ms}ms)")
+
+    if args.importtime:
+        _, stderr = cold_start(cookie, env, importtime=True)
+        summary['imports'] = import_breakdown(stderr, args.top)
+        for ms, module in summary['imports']:
+            print(f"{ms:9.1f}ms  {module}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    if summary['total_ms'] > args.budget_ms:
+        print(f"Cold start {summary['total_ms']}ms is over the {args.budget_ms}ms budget")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+# Change-data capture for incremental sync.
+#
+#   GET /changes                       the current version, for a client that just did a full fetch
+#   GET /changes?since=1200&limit=500  what changed after version 1200
+#
+# Every ORM flush appends one change_log row per inserted, updated or deleted
+# row on the flush's own connection, so the log commits or rolls back together
+# with the write. A change's version is its change_log id; SQLite serialises
+# writers, so versions are handed out in commit order. /changes compacts the
+# log: a row changed many times since the client's version is sent once with
+# its current values, and a row both created and deleted since then is not sent
+# at all. Core bulk writes bypass flush events and call track() themselves.
+# Functions registered with on_commit() get the committed changes with their
+# versions once the transaction has committed.
+from datetime import datetime
+
+from flask import jsonify, request, session
+from flask_restful import Resource
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Change, HIDDEN_COLUMNS
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+# Tables that are not synced
+UNTRACKED = {'change_log'}
+
+# Tables other staff only see their own rows of: table -> column holding the staff id
+PRIVATE = {'staff': 'id', 'advance_loan': 'taken_by'}
+
+_commit_listeners = []
+
+
+def on_commit(listener):
+    _commit_listeners.append(listener)
+    return listener
+
+
+# Append changes for (table name, row id, operation) triples on `connection`,
+# returning the recorded changes with their versions. A row is recorded once per
+# call, so versions can be matched back by (table, row id) and the insert goes
+# out as multi-row batches rather than one statement per row.
+def record(connection, changes):
+    now = datetime.now()
+    operations = {(table, row_id): operation for table, row_id, operation in changes if table not in UNTRACKED}
+    if not operations:
+        return []
+    rows = [
+        {'table_name': table, 'row_id': row_id, 'operation': operation, 'changed_at': now}
+        for (table, row_id), operation in operations.items()
+    ]
+    versions = {
+        (table, row_id): version
+        for version, table, row_id in connection.execute(
+            insert(Change.__table__).returning(Change.id, Change.table_name, Change.row_id), rows
+        )
+    }
+    return [(table, row_id, operation, versions[(table, row_id)]) for (table, row_id), operation in operations.items()]
+
+
+# Hand changes recorded outside a session flush to the commit listeners
+def committed(changes, session=None):
+    for listener in _commit_listeners:
+        listener(changes, session)
+
+
+# Record changes made on the session's connection, to be announced when it commits
+def track(session, changes):
+    session.info.setdefault('changes', []).extend(record(session.connection(), changes))
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_flush(session, flush_context):
+    changes = []
+    for operation, objects in (('insert', session.new), ('update', session.dirty), ('delete', session.deleted)):
+        for obj in objects:
+            table = getattr(obj, '__table__', None)
+            if table is None:
+                continue
+            if operation == 'update' and not session.is_modified(obj, include_collections=False):
+                continue
+            changes.append((table.name, obj.id, operation))
+    track(session, changes)
+
+
+@event.listens_for(Session, 'after_commit')
+def _notify(session):
+    changes = session.info.pop('changes', None)
+    if changes:
+        committed(changes, session)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('changes', None)
+
+
+def models_by_table():
+    return {m.class_.__table__.name: m.class_ for m in db.Model.registry.mappers}
+
+
+def serialize(obj):
+    return {c.name: getattr(obj, c.name) for c in obj.__table__.columns if c.name not in HIDDEN_COLUMNS}
+
+
+# Compacted changes after `since`: (changes, version reached, whether more remain)
+def changes_since(since, limit, staff_id=None):
+    entries = db.session.execute(
+        select(Change).where(Change.id > since).order_by(Change.id).limit(limit + 1)
+    ).scalars().all()
+    more = len(entries) > limit
+    entries = entries[:limit]
+    version = entries[-1].id if entries else since
+
+    # (table, row id) -> [first operation, last operation, last version]
+    latest = {}
+    for entry in entries:
+        key = (entry.table_name, entry.row_id)
+        if key in latest:
+            latest[key][1:] = [entry.operation, entry.id]
+        else:
+            latest[key] = [entry.operation, entry.operation, entry.id]
+
+    changes = []
+    upserts = {}  # table -> {row id: version}
+    for (table, row_id), (first, last, row_version) in latest.items():
+        if last != 'delete':
+            upserts.setdefault(table, {})[row_id] = row_version
+        elif first != 'insert':
+            changes.append({'table': table, 'id': row_id, 'operation': 'delete', 'version': row_version})
+
+    models = models_by_table()
+    for table, versions in upserts.items():
+        model = models.get(table)
+        if model is None:
+            continue
+        query = select(model).where(model.id.in_(versions))
+        if staff_id is not None and table in PRIVATE:
+            query = query.where(getattr(model, PRIVATE[table]) == staff_id)
+        # A row missing here was deleted after this page; its delete comes on a later page
+        for obj in db.session.execute(query).scalars():
+            changes.append({'table': table, 'id': obj.id, 'operation': 'upsert',
+                            'version': versions[obj.id], 'row': serialize(obj)})
+
+    changes.sort(key=lambda change: change['version'])
+    return changes, version, more
+
+
+class Changes(Resource):
+    def get(self):
+        if 'user_id' not in session or session.get('role') is None:
+            return {"message": "Unauthorized"}, 401
+
+        since = request.args.get('since', type=int)
+        if since is None:
+            return {'version': db.session.scalar(select(db.func.max(Change.id))) or 0, 'changes': [], 'more': False}
+
+        limit = min(max(request.args.get('limit', DEFAULT_LIMIT, type=int), 1), MAX_LIMIT)
+        staff_id = None if session['role'] in ['ADMIN', 'CEO', 'MANAGER'] else session['user_id']
+        changes, version, more = changes_since(since, limit, staff_id)
+        return jsonify({'version': version, 'changes': changes, 'more': more})
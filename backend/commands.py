@@ -0,0 +1,173 @@
+# Flask CLI commands. Their implementations are imported inside each command so
+# that building the app for a web worker never loads them.
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+
+
+@click.command('job-cards')
+@click.option('--date', 'day', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Booking day to print (defaults to today).')
+@click.option('--output', default=None, help='File to write (defaults to job_cards_<date>.html).')
+@click.option('--workers', type=int, default=None, help='Render processes (defaults to CPU count).')
+@with_appcontext
+def job_cards_command(day, output, workers):
+    """Render job cards for every order booked on a day into one printable HTML document."""
+    from job_cards import cards_booked_on, load_cards, render_cards, render_document
+
+    day = day or datetime.now()
+    keys = cards_booked_on(day)
+    if not keys:
+        click.echo(f"No orders booked on {day:%Y-%m-%d}")
+        return
+
+    cards = load_cards(keys)
+    document = render_document(render_cards(cards, workers=workers), f"Job cards {day:%Y-%m-%d}")
+    output = output or f"job_cards_{day:%Y-%m-%d}.html"
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(document)
+    click.echo(f"Wrote {len(cards)} job cards to {output}")
+
+
+@click.command('seed')
+@click.option('--clients', type=int, default=10000, help='Clients to create.')
+@click.option('--measurements', type=int, default=100000, help='Garment orders to create, across all four types.')
+@click.option('--tailors', type=int, default=20, help='Tailors to create.')
+@click.option('--seed', 'seed_value', type=int, default=1, help='Random seed; the same seed gives the same data.')
+@click.option('--batch-size', type=int, default=50000, help='Rows per bulk insert.')
+@with_appcontext
+def seed_command(clients, measurements, tailors, seed_value, batch_size):
+    """Fill the database with synthetic staff, clients, orders, loans and inventory for scale testing."""
+    from flask import current_app
+    from extensions import db
+    from seed_data import seed
+
+    # Every batch would otherwise be reported as a slow query
+    current_app.config['QUERY_LOG_ENABLED'] = False
+    db.create_all()
+    seed(clients=clients, measurements=measurements, tailors=tailors, seed=seed_value,
+         batch_size=batch_size, log=click.echo)
+
+
+@click.command('migrate-garment-orders')
+@with_appcontext
+def migrate_garment_orders_command():
+    """Move the four per-garment measurement tables into the garment_order table."""
+    from extensions import db
+    from migrations import consolidate_garment_orders
+
+    with db.engine.begin() as conn:
+        moved = consolidate_garment_orders(conn, log=click.echo)
+    click.echo(f"Moved {moved} orders into garment_order")
+
+
+@click.command('migrate-version-columns')
+@with_appcontext
+def migrate_version_columns_command():
+    """Add the row version column used for ETags and If-Match to an older database."""
+    from extensions import db
+    from migrations import add_version_columns
+
+    with db.engine.begin() as conn:
+        altered = add_version_columns(conn, log=click.echo)
+    click.echo(f"Added version to {len(altered)} tables")
+
+
+@click.command('migrate-indexes')
+@with_appcontext
+def migrate_indexes_command():
+    """Create indexes the models declare that an older database is missing."""
+    from extensions import db
+    from migrations import create_missing_indexes
+
+    with db.engine.begin() as conn:
+        created = create_missing_indexes(conn, db.metadata, log=click.echo)
+    click.echo(f"Created {len(created)} indexes")
+
+
+@click.command('archive')
+@click.option('--days', type=int, default=None,
+              help='Archive orders and loans finished longer ago than this (defaults to ARCHIVE_AFTER_DAYS).')
+@click.option('--batch-size', type=int, default=5000, help='Rows moved per transaction.')
+@with_appcontext
+def archive_command(days, batch_size):
+    """Move long-finished orders and paid loans into the archive database."""
+    from flask import current_app
+    from archive import archive_finished
+    from extensions import db
+
+    days = current_app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+    click.echo(f"Archiving orders and loans finished more than {days} days ago")
+    moved = archive_finished(db.engine, days, batch_size=batch_size, log=click.echo)
+    click.echo(', '.join(f"{count} from {table}" for table, count in moved.items()) + " moved to the archive")
+
+
+@click.command('backfill-revenue')
+@with_appcontext
+def backfill_revenue_command():
+    """Rebuild the daily revenue rollup from the clients table."""
+    from extensions import db
+    from revenue import rebuild_revenue
+
+    with db.engine.begin() as conn:
+        rows = rebuild_revenue(conn)
+    click.echo(f"Rebuilt revenue_daily: {rows} rows")
+
+
+@click.command('size-templates')
+@click.option('--garments', default='coat,trouser', help='Comma-separated garment types to size.')
+@click.option('--sizes', type=int, default=8, help='Standard sizes per garment type.')
+@click.option('--full', is_flag=True, help='Cluster again from scratch instead of adding new orders.')
+@click.option('--seed', 'seed_value', type=int, default=1, help='Random seed for choosing the starting centres.')
+@with_appcontext
+def size_templates_command(garments, sizes, full, seed_value):
+    """Find standard sizes by k-means over order measurements and map every order to its nearest one."""
+    from flask import current_app
+    from models import GARMENT_FIELDS
+    from size_templates import build_size_templates
+
+    # Loading every profile and writing every order's size would otherwise be reported as slow
+    current_app.config['QUERY_LOG_ENABLED'] = False
+    garments = [g.strip() for g in garments.split(',') if g.strip()]
+    unknown = [g for g in garments if g not in GARMENT_FIELDS]
+    if unknown:
+        raise click.BadParameter(f"unknown garment type(s): {', '.join(unknown)}", param_hint='--garments')
+    mapped = build_size_templates(garments, sizes=sizes, full=full, seed=seed_value, log=click.echo)
+    click.echo(f"Mapped {sum(mapped.values())} orders to size templates")
+
+
+@click.command('schedule-orders')
+@click.option('--dry-run', is_flag=True, help='Show the assignments without writing them.')
+@click.option('--max-load', type=int, default=None,
+              help='Open orders a tailor may hold (defaults to SCHEDULER_MAX_LOAD, 0 for no limit).')
+@click.option('--every', type=int, default=None, help='Keep running, scheduling again every this many seconds.')
+@with_appcontext
+def schedule_orders_command(dry_run, max_load, every):
+    """Assign booked, unassigned orders to tailors, soonest pickup first."""
+    import time
+    from flask import current_app
+    from extensions import db
+    from scheduler import schedule
+
+    if max_load is None:
+        max_load = current_app.config['SCHEDULER_MAX_LOAD']
+    max_load = max_load or None
+    while True:
+        report = schedule(dry_run=dry_run, max_load=max_load)
+        db.session.remove()
+        verb = 'Would assign' if dry_run else 'Assigned'
+        click.echo(f"{verb} {report['assigned']} of {report['pending']} pending orders, "
+                   f"{report['waiting']} waiting for a free tailor")
+        for tailor in report['tailors']:
+            if tailor['orders']:
+                click.echo(f"  {tailor['username']} ({tailor['id']}): {tailor['load_before']} open "
+                           f"+ {len(tailor['orders'])}")
+        if every is None:
+            return
+        time.sleep(every)
+
+
+COMMANDS = [job_cards_command, seed_command, migrate_garment_orders_command, migrate_version_columns_command,
+            migrate_indexes_command, archive_command, backfill_revenue_command, size_templates_command,
+            schedule_orders_command]
@@ -0,0 +1,175 @@
+# Negotiated compression of response bodies.
+#
+# JSON, HTML, CSV and other text responses are compressed with the best coding
+# the client accepts: brotli or zstd when the brotli or zstandard package is
+# installed, and gzip always. Bodies under COMPRESSION_MIN_SIZE go out as they
+# are, as compressing them saves less than it costs. Streamed responses are
+# compressed as they go, flushed after every chunk so that each one still
+# reaches the client straight away (the /events stream stays live).
+#
+# List routes that return cached_json() skip serialising as well. A worker keeps
+# each list's JSON, and every coding of it a client has asked for, while the
+# version of the tables the list is read from stays the same: the newest
+# change_log entry for them, one index seek per table. Entries are also rebuilt
+# after RESPONSE_CACHE_SECONDS. These responses carry that version as a weak
+# ETag, the same from every worker and from the async reads in asgi.py, so a
+# dashboard polling with If-None-Match gets a bare 304.
+#
+# The item routes' ETags are left as they are: they are the row versions that
+# If-Match is compared against, whatever the coding.
+import gzip
+import threading
+import time
+import zlib
+
+from flask import Response, current_app, request
+from sqlalchemy import func, select
+from werkzeug.http import parse_accept_header
+
+from extensions import db
+from models import Change
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Codings this worker can produce, preferred first when the client accepts several equally
+CODINGS = [coding for coding, module in (('br', brotli), ('zstd', zstandard), ('gzip', zlib)) if module is not None]
+
+# Levels for bodies compressed on every request, and for cached ones compressed once per version
+LEVELS = {'br': 4, 'zstd': 3, 'gzip': 6}
+CACHED_LEVELS = {'br': 6, 'zstd': 9, 'gzip': 9}
+
+# Compressed when text/* or one of these
+COMPRESSIBLE = {'application/json', 'application/javascript', 'application/xml', 'image/svg+xml'}
+
+RESPONSE_CACHE_SIZE = 32
+
+# Request path -> [tables' version, built at, JSON, {coding: compressed JSON}]; most recently used last
+_cache = {}
+_lock = threading.Lock()
+
+
+# The coding to send for an Accept-Encoding value, None to send the body as it is
+def negotiate(accept_encoding):
+    if not accept_encoding:
+        return None
+    return parse_accept_header(accept_encoding).best_match(CODINGS)
+
+
+def compress(data, coding, level):
+    if coding == 'br':
+        return brotli.compress(data, quality=level)
+    if coding == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return gzip.compress(data, level, mtime=0)
+
+
+# (compress and flush a chunk, finish) for a body compressed as it is sent
+def compressor(coding, level):
+    if coding == 'br':
+        c = brotli.Compressor(quality=level)
+        return lambda chunk: c.process(chunk) + c.flush(), c.finish
+    if coding == 'zstd':
+        c = zstandard.ZstdCompressor(level=level).compressobj()
+        return lambda chunk: c.compress(chunk) + c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK), c.flush
+    c = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip framing
+    return lambda chunk: c.compress(chunk) + c.flush(zlib.Z_SYNC_FLUSH), c.flush
+
+
+def stream(chunks, source, coding):
+    write, finish = compressor(coding, LEVELS[coding])
+    try:
+        for chunk in chunks:
+            if chunk:
+                yield write(chunk)
+        yield finish()
+    finally:
+        if hasattr(source, 'close'):
+            source.close()
+
+
+def compressible(response):
+    if request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206, 304):
+        return False
+    if 'Content-Encoding' in response.headers or response.direct_passthrough:
+        return False
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE
+
+
+def compress_response(response):
+    if not compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    coding = negotiate(request.headers.get('Accept-Encoding'))
+    if coding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = stream(response.iter_encoded(), response.response, coding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config['COMPRESSION_MIN_SIZE']:
+            return response
+        response.set_data(compress(data, coding, LEVELS[coding]))
+    response.headers['Content-Encoding'] = coding
+    return response
+
+
+# Query for the version of `tables`: their newest change_log id, 0 before any change
+def version_query(tables):
+    latest = [
+        func.coalesce(select(Change.id).where(Change.table_name == table)
+                      .order_by(Change.id.desc()).limit(1).scalar_subquery(), 0)
+        for table in tables
+    ]
+    return select(func.max(*latest) if len(latest) > 1 else latest[0])
+
+
+# A response with the JSON of build(), a list read from `tables`, serialised and
+# compressed once per version of those tables rather than on every request
+def cached_json(tables, build):
+    config = current_app.config
+    version = db.session.scalar(version_query(tables))
+    response = Response(mimetype='application/json')
+    response.set_etag(str(version), weak=True)
+    response.vary.add('Accept-Encoding')
+    # A poll that already has this version needs no body, cached or not
+    if request.if_none_match.contains_weak(str(version)):
+        response.status_code = 304
+        return response
+
+    # Request threads share the cache; the lock is held for the dict updates, never for a build
+    key = request.full_path
+    with _lock:
+        entry = _cache.get(key)
+    if entry is None or entry[0] != version or time.monotonic() - entry[1] > config['RESPONSE_CACHE_SECONDS']:
+        entry = [version, time.monotonic(), current_app.json.response(build()).get_data(), {}]
+    with _lock:
+        _cache.pop(key, None)
+        _cache[key] = entry
+        while len(_cache) > RESPONSE_CACHE_SIZE:
+            _cache.pop(next(iter(_cache)))
+
+    response.set_data(entry[2])
+    coding = negotiate(request.headers.get('Accept-Encoding')) if config['COMPRESSION_ENABLED'] else None
+    if coding is not None and len(entry[2]) >= config['COMPRESSION_MIN_SIZE']:
+        encoded = entry[3].get(coding)
+        if encoded is None:
+            encoded = entry[3][coding] = compress(entry[2], coding, CACHED_LEVELS[coding])
+        response.set_data(encoded)
+        response.headers['Content-Encoding'] = coding
+    return response
+
+
+def init_compression(app):
+    if app.config['COMPRESSION_ENABLED']:
+        app.after_request(compress_response)
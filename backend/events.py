@@ -0,0 +1,248 @@
+# Server-sent events for order status changes.
+#
+#   GET /events        text/event-stream of "order" events
+#
+# When a garment order is created, or its status or tailor changes, an event is
+# published to an in-process bus after the transaction commits. Status changes
+# are also written to order_status_history within the transaction. Each event's id
+# is the version of its change_log entry, so a client that reconnects with
+# Last-Event-ID is first sent the current state of every order changed since,
+# read from the change log, and then the live events. Managers and up see every
+# order, tailors the orders assigned to them (or taken away from them), clients
+# their own orders.
+#
+# Under uvicorn, asgi.py serves /events natively: an idle subscriber is one
+# coroutine and one small queue, so a worker holds thousands. The Flask route
+# below keeps a thread per subscriber, which suits the dev server and the
+# threaded gunicorn workers of gunicorn.conf.py, up to GUNICORN_THREADS streams
+# and requests at once per worker. The bus is per process: with several
+# workers, a subscriber only sees writes made in its own worker live and
+# catches up on the rest when it reconnects.
+import json
+import queue
+import threading
+from datetime import datetime
+
+from flask import Response, request, session
+from flask_restful import Resource
+from sqlalchemy import event, func, insert, select
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session
+
+from changes import on_commit
+from extensions import db
+from models import Change, GarmentOrder, OrderStatusHistory
+
+# Seconds between keepalive comments on an idle stream
+HEARTBEAT = 15
+# Events a slow subscriber may fall behind before its stream is closed
+QUEUE_SIZE = 256
+# Orders replayed on resume; further behind than this and the client is told to refetch
+REPLAY_LIMIT = 1000
+
+MANAGERS = ['ADMIN', 'CEO', 'MANAGER']
+
+
+class Bus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+
+    def subscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if visible(event, subscriber.role, subscriber.user_id):
+                subscriber.deliver(event)
+
+    def __len__(self):
+        return len(self._subscribers)
+
+
+bus = Bus()
+
+
+def visible(event, role, user_id):
+    if role in MANAGERS:
+        return True
+    if role is None:
+        return event['client'] == user_id
+    return user_id in (event['assigned_to'], event.get('previous_assigned_to'))
+
+
+# One subscriber per stream served by a thread (or greenlet)
+class ThreadSubscriber:
+    def __init__(self, role, user_id):
+        self.role = role
+        self.user_id = user_id
+        self.overflowed = False
+        self.queue = queue.Queue(QUEUE_SIZE)
+
+    def deliver(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+def format_event(event):
+    return f"id: {event['version']}\nevent: order\ndata: {json.dumps(event)}\n\n".encode('utf-8')
+
+
+RESET = b'event: reset\ndata: {}\n\n'
+KEEPALIVE = b': keepalive\n\n'
+RETRY = b'retry: 3000\n\n'
+
+
+def last_event_id(headers, args):
+    value = headers.get('Last-Event-ID') or args.get('last_event_id')
+    return int(value) if value and value.isdigit() else None
+
+
+def order_event(obj):
+    return {
+        'garment': obj.garment_type,
+        'id': obj.id,
+        'number': obj.number,
+        'status': obj.status,
+        'assigned_to': obj.assigned_to,
+        'client': obj.client,
+    }
+
+
+# Queue an event for the order, published once the session commits
+def stage(session, event):
+    session.info.setdefault('order_events', {})[(GarmentOrder.__tablename__, event['id'])] = event
+
+
+@event.listens_for(Session, 'after_flush')
+def _capture(session, flush_context):
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, GarmentOrder):
+            continue
+        state = sa_inspect(obj)
+        status = state.attrs.status.history
+        assigned = state.attrs.assigned_to.history
+        if obj not in session.new and not status.has_changes() and not assigned.has_changes():
+            continue
+        event = order_event(obj)
+        staged = session.info.get('order_events', {}).get((obj.__tablename__, obj.id))
+        # Keep the state from before the transaction's first flush
+        event['previous_status'] = staged['previous_status'] if staged else (status.deleted or [None])[0]
+        event['previous_assigned_to'] = staged['previous_assigned_to'] if staged else (assigned.deleted or [None])[0]
+        stage(session, event)
+
+
+# Write the transaction's status changes to order_status_history before it commits
+@event.listens_for(Session, 'before_commit')
+def _history(session):
+    session.flush()
+    staged = session.info.get('order_events')
+    if not staged:
+        return
+    now = datetime.now()
+    rows = [
+        {'order_id': event['id'], 'garment_type': event['garment'], 'from_status': event['previous_status'],
+         'to_status': event['status'], 'tailor': event['assigned_to'], 'changed_at': now}
+        for event in staged.values() if event['status'] != event['previous_status']
+    ]
+    if rows:
+        session.connection().execute(insert(OrderStatusHistory.__table__), rows)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('order_events', None)
+
+
+@on_commit
+def _publish(changes, session):
+    staged = session.info.pop('order_events', None) if session is not None else None
+    if not staged:
+        return
+    versions = {}
+    for table, row_id, operation, version in changes:
+        versions[(table, row_id)] = version
+    for key, event in staged.items():
+        if key in versions:
+            event['version'] = versions[key]
+            bus.publish(event)
+
+
+# Current state of the orders changed after `since`, as events. Returns None when
+# more than `limit` orders changed and the client should refetch instead.
+def replay(since, role, user_id, limit=REPLAY_LIMIT):
+    rows = db.session.execute(
+        select(Change.row_id, func.max(Change.id))
+        .where(Change.id > since, Change.table_name == GarmentOrder.__tablename__, Change.operation != 'delete')
+        .group_by(Change.row_id)
+        .limit(limit + 1)
+    ).all()
+    if len(rows) > limit:
+        return None
+
+    versions = dict(rows)
+    events = []
+    for obj in db.session.execute(select(GarmentOrder).where(GarmentOrder.id.in_(versions))).scalars():
+        event = order_event(obj)
+        event['version'] = versions[obj.id]
+        if visible(event, role, user_id):
+            events.append(event)
+    events.sort(key=lambda event: event['version'])
+    return events
+
+
+def stream(subscriber, replayed):
+    try:
+        yield RETRY
+        if replayed is None:
+            yield RESET
+            replayed = []
+        seen = 0
+        for event in replayed:
+            seen = event['version']
+            yield format_event(event)
+        while not subscriber.overflowed:
+            event = subscriber.get(HEARTBEAT)
+            if event is None:
+                yield KEEPALIVE
+            elif event['version'] > seen:
+                yield format_event(event)
+    finally:
+        bus.unsubscribe(subscriber)
+
+
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+class Events(Resource):
+    def get(self):
+        if 'user_id' not in session:
+            return {"message": "Unauthorized"}, 401
+
+        role, user_id = session.get('role'), session['user_id']
+        since = last_event_id(request.headers, request.args)
+        # Subscribe before replaying so nothing committed in between is lost
+        subscriber = bus.subscribe(ThreadSubscriber(role, user_id))
+        try:
+            replayed = replay(since, role, user_id) if since is not None else []
+        except Exception:
+            # No stream will be returned to unsubscribe it when it closes
+            bus.unsubscribe(subscriber)
+            raise
+        return Response(stream(subscriber, replayed), mimetype='text/event-stream', headers=STREAM_HEADERS)
@@ -0,0 +1,37 @@
+import os
+import weakref
+
+from flask import current_app
+from flask_sqlalchemy import SQLAlchemy
+
+# Extensions are created unbound and attached to each app in create_app
+db = SQLAlchemy()
+
+
+# bcrypt is only needed when a password is hashed, so it is loaded on first use
+def get_bcrypt():
+    app = current_app._get_current_object()
+    if 'bcrypt' not in app.extensions:
+        from flask_bcrypt import Bcrypt
+        app.extensions['bcrypt'] = Bcrypt(app)
+    return app.extensions['bcrypt']
+
+# Apps whose database engines must not be shared with forked worker processes
+_apps = weakref.WeakSet()
+
+
+def track_app(app):
+    _apps.add(app)
+
+
+# Drop pooled connections inherited from the parent process. close=False leaves the
+# parent's sockets/file handles alone and just makes the child open its own.
+def dispose_engines():
+    for app in list(_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=dispose_engines)
@@ -0,0 +1,160 @@
+# Fabric needed by open orders, set against the rolls in stock.
+#
+#   GET /fabric/plan                every fabric
+#   GET /fabric/plan?fabric=wool    one fabric
+#
+# Metres per order are estimated from its measurements with a simple cutting
+# model per garment type: the lengths of the main pieces plus seam allowance,
+# widened when the body is too broad to lay two pieces side by side on the bolt.
+# It is computed over all open orders of a type at once with NumPy, and fields
+# that were not taken fall back to an average body. Demand is summed per fabric
+# against the Inventory rolls of that fabric (matched by the fabric's name in
+# item_name, e.g. "wool roll 12", with quantity in metres). Open orders are then
+# given rolls best-fit decreasing: the largest order first, each into the roll
+# it leaves the shortest remnant on, which keeps rolls whole for as long as
+# possible. Remnants shorter than OFFCUT_M count as waste.
+import re
+from bisect import bisect_left
+
+import numpy as np
+from flask import jsonify, request, session
+from flask_restful import Resource
+from sqlalchemy import func, select
+
+from extensions import db
+from measurement_search import ProfileMatrix
+from models import GarmentOrder, GARMENT_FIELDS, Inventory
+from work_orders import CLOSED
+
+INCH = 0.0254  # metres
+BOLT_WIDTH = 59  # usable inches across a 150 cm bolt
+OFFCUT_M = 0.5  # remnants shorter than this are waste
+TROUSER_LENGTH = 41  # outseam in inches; trouser orders carry no length
+DEFAULT_METRES = 2.5  # for a garment type with no cutting model
+
+# Stand-in for a measurement that was not taken, in inches
+AVERAGE_BODY = {
+    'shoulder': 17.5, 'sleeves': 24.5, 'chest': 40, 'waist': 34, 'arm': 13, 'full_length': 30,
+    'bottom_length': 21, 'neck': 15.5, 'wrist': 7, 'thigh': 24, 'knee': 17, 'bottom': 15, 'fly': 11, 'hips': 41,
+}
+
+
+# How many bolt widths two side-by-side pieces of this girth need (at least one)
+def breadth(girth, ease):
+    return np.maximum(1.0, (girth / 2 + ease) * 2 / BOLT_WIDTH)
+
+
+# Inches of fabric per order: garment type -> f({field: array of inches})
+CUTTING = {
+    'coat': lambda m: (2 * m['full_length'] + m['sleeves'] + 12) * breadth(m['chest'], 6),
+    'regular_shirt': lambda m: (2 * m['full_length'] + m['sleeves'] + 8) * breadth(m['chest'], 4),
+    'senator_shirt': lambda m: (2 * m['full_length'] + m['sleeves'] + 10) * breadth(m['chest'], 5),
+    'trouser': lambda m: (TROUSER_LENGTH + 8) * breadth(m['hips'], 4),
+}
+
+
+# Metres needed by every open order: [(order id, garment type, number, fabric, metres)]
+def open_order_demand(fabric=None):
+    # Lowercased, as in work_orders.py, so legacy "Done" orders are not demand
+    condition = [func.lower(GarmentOrder.status).not_in(CLOSED)]
+    if fabric is not None:
+        condition.append(GarmentOrder.fabric == fabric)
+    details = {row.id: row for row in db.session.execute(
+        select(GarmentOrder.id, GarmentOrder.garment_type, GarmentOrder.number, GarmentOrder.fabric).where(*condition)
+    )}
+
+    demand = []
+    for garment, fields in GARMENT_FIELDS.items():
+        ids, columns = ProfileMatrix(garment).load(*condition)
+        if not len(ids):
+            continue
+        if garment in CUTTING:
+            columns = columns.astype(np.float64)
+            body = {f: np.where(np.isnan(values), AVERAGE_BODY.get(f, 0), values) for f, values in zip(fields, columns)}
+            metres = np.round(CUTTING[garment](body) * INCH, 2)
+        else:
+            metres = np.full(len(ids), DEFAULT_METRES)
+        demand.extend((id, garment, details[id].number, details[id].fabric, m)
+                      for id, m in zip(ids.tolist(), metres.tolist()) if id in details)
+    return demand
+
+
+# The fabric an Inventory roll is of: the longest known fabric named in its item_name
+def roll_fabric(item_name, fabrics):
+    name = (item_name or '').lower()
+    for fabric in sorted(filter(None, fabrics), key=len, reverse=True):
+        if re.search(rf'\b{re.escape(fabric.lower())}\b', name):
+            return fabric
+    return None
+
+
+# Best-fit decreasing: orders [(metres, order)] into rolls [(metres, roll id)].
+# Returns ({roll id: [order, ...]}, {roll id: metres left}, [orders that fit nowhere]).
+def best_fit_decreasing(orders, rolls):
+    free = sorted(rolls)
+    remaining = [metres for metres, _ in free]
+    placed = {roll: [] for _, roll in rolls}
+    unplaced = []
+    for metres, order in sorted(orders, key=lambda item: item[0], reverse=True):
+        i = bisect_left(remaining, metres)
+        if i == len(remaining):
+            unplaced.append(order)
+            continue
+        left = remaining.pop(i) - metres
+        _, roll = free.pop(i)
+        placed[roll].append(order)
+        j = bisect_left(remaining, left)
+        remaining.insert(j, left)
+        free.insert(j, (left, roll))
+    return placed, {roll: left for left, roll in free}, unplaced
+
+
+def fabric_plan(fabric=None):
+    demand = open_order_demand(fabric)
+    fabrics = {d[3] for d in demand} | ({fabric} if fabric else set())
+
+    rolls = {}
+    for item in db.session.execute(select(Inventory.id, Inventory.item_name, Inventory.quantity)):
+        name = roll_fabric(item.item_name, fabrics)
+        if name is not None:
+            rolls.setdefault(name, []).append(item)
+
+    orders_by_fabric = {}
+    for id, garment, number, name, metres in demand:
+        orders_by_fabric.setdefault(name, []).append(
+            (metres, {'id': id, 'garment': garment, 'number': number, 'metres': metres}))
+
+    summary, plan = [], []
+    for name in sorted(fabrics):
+        orders = orders_by_fabric.get(name, [])
+        stock = rolls.get(name, [])
+        placed, left, unplaced = best_fit_decreasing(orders, [(float(r.quantity or 0), r.id) for r in stock])
+        needed = sum(metres for metres, _ in orders)
+        waste = sum(metres for roll, metres in left.items() if placed[roll] and metres < OFFCUT_M)
+        summary.append({
+            'fabric': name,
+            'orders': len(orders),
+            'demand_m': round(needed, 2),
+            'stock_m': round(sum(float(r.quantity or 0) for r in stock), 2),
+            'rolls': len(stock),
+            'rolls_used': sum(1 for roll in placed if placed[roll]),
+            'planned_orders': len(orders) - len(unplaced),
+            'unplanned_orders': len(unplaced),
+            'shortfall_m': round(sum(o['metres'] for o in unplaced), 2),
+            'waste_m': round(waste, 2),
+        })
+        for r in stock:
+            if placed[r.id]:
+                plan.append({'roll': r.id, 'item_name': r.item_name, 'fabric': name,
+                             'quantity': float(r.quantity or 0), 'left_m': round(left[r.id], 2),
+                             'orders': placed[r.id]})
+    return summary, plan
+
+
+class FabricPlan(Resource):
+    def get(self):
+        if 'user_id' not in session or session.get('role') is None:
+            return {"message": "Unauthorized"}, 401
+
+        summary, plan = fabric_plan(request.args.get('fabric') or None)
+        return jsonify({'fabrics': summary, 'rolls': plan})
@@ -0,0 +1,240 @@
+# Whether open orders can be finished by their clients' pickup dates.
+#
+#   GET /reports/capacity?days=14
+#
+# Demand is every open order's remaining work, in orders: a booked order is a
+# whole one, later statuses less (REMAINING), due on its client's pickup date.
+# Capacity is what the tailors finish per working day. Each tailor's rate is the
+# orders they moved to done per working day over the last THROUGHPUT_DAYS, read
+# from order_status_history. A tailor who finished nothing in that time takes the
+# median rate of those who did. Until the history covers MIN_HISTORY_WORKDAYS
+# every tailor is taken to manage DEFAULT_THROUGHPUT.
+#
+# The projection is built from arrays with one slot per day. Orders are worked
+# earliest pickup first, so an order is finished on the first day on which the
+# cumulative capacity covers the cumulative work up to and including it (one
+# searchsorted over both running sums). An order is at risk when that day falls
+# after its pickup date. The check is made for the whole shop and again for each
+# tailor's own orders at that tailor's rate, and an order late on either counts.
+#
+# Statuses are compared lowercased, as in work_orders.py, so orders saved as
+# "Booked" or "On progress" count as open work.
+#
+# A forecast is cached per worker and reused until change_log shows a write to
+# an order, a client or a staff member, or until the day turns over.
+import math
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+from flask import jsonify, request, session
+from flask_restful import Resource
+from sqlalchemy import case, func, select
+
+from extensions import db
+from models import Change, Client, GarmentOrder, OrderStatusHistory, Staff
+
+# Share of an order's work still to do at each open status
+REMAINING = {'booked': 1.0, 'on progress': 0.6, 'final touches': 0.2}
+WORKDAYS = (0, 1, 2, 3, 4, 5)  # Monday to Saturday
+THROUGHPUT_DAYS = 28
+DEFAULT_THROUGHPUT = 3.0  # orders a tailor finishes per working day, before any history
+MIN_HISTORY_WORKDAYS = 6  # history needed before rates are read from it
+DEFAULT_DAYS = 14
+MAX_DAYS = 90
+AT_RISK_LIMIT = 500  # at-risk orders listed; all are counted
+FORECAST_CACHE_SIZE = 16
+
+# Pickup day offset for orders whose client has no pickup date
+UNDATED = 1e9
+
+# Tables whose writes can change a forecast
+SOURCES = ('garment_order', 'client', 'staff')
+
+# (day, days) -> (version, forecast); most recently used last
+_cache = {}
+_lock = threading.Lock()
+
+
+def current_version():
+    return db.session.scalar(select(func.max(Change.id))) or 0
+
+
+def changed_since(version):
+    return db.session.scalar(
+        select(Change.id).where(Change.id > version, Change.table_name.in_(SOURCES)).limit(1)
+    ) is not None
+
+
+# 1.0 on each working day of the `length` days from `start`, else 0.0
+def workday_mask(start, length):
+    weekdays = (start.weekday() + np.arange(length)) % 7
+    return np.isin(weekdays, WORKDAYS).astype(np.float64)
+
+
+# Orders finished per working day by each tailor: ({tailor: rate}, whether they come from history)
+def throughput(today, tailors):
+    since = today - timedelta(days=THROUGHPUT_DAYS)
+    # Only the part of the window that history has been recorded for
+    first = db.session.scalar(select(func.min(OrderStatusHistory.changed_at))
+                              .where(func.lower(OrderStatusHistory.to_status) == 'done'))
+    if first is not None:
+        since = max(since, first.date())
+    workdays = workday_mask(since, (today - since).days + 1).sum()
+    if first is None or workdays < MIN_HISTORY_WORKDAYS:
+        return dict.fromkeys(tailors, DEFAULT_THROUGHPUT), False
+
+    done = dict(db.session.execute(
+        select(OrderStatusHistory.tailor, func.count())
+        .where(func.lower(OrderStatusHistory.to_status) == 'done', OrderStatusHistory.changed_at >= since,
+               OrderStatusHistory.tailor.in_(tailors))
+        .group_by(OrderStatusHistory.tailor)
+    ).all())
+    measured = {tailor: count / workdays for tailor, count in done.items()}
+    fallback = float(np.median(list(measured.values()))) if measured else DEFAULT_THROUGHPUT
+    return {tailor: measured.get(tailor, fallback) for tailor in tailors}, True
+
+
+# Open orders as arrays, earliest pickup first: ids, tailors (-1 when unassigned),
+# days from `today` to pickup (UNDATED when there is none) and remaining work
+def open_orders(today):
+    status = func.lower(GarmentOrder.status)
+    due = func.julianday(Client.pickup_date) - func.julianday(today.isoformat())
+    rows = db.session.execute(
+        select(GarmentOrder.id, func.coalesce(GarmentOrder.assigned_to, -1), func.coalesce(due, UNDATED),
+               case(*((status == name, share) for name, share in REMAINING.items())))
+        .join(Client, Client.id == GarmentOrder.client)
+        .where(status.in_(list(REMAINING)))
+    ).all()
+    matrix = np.fromiter((value for row in rows for value in row), dtype=np.float64, count=len(rows) * 4)
+    ids, tailors, due, work = matrix.reshape(len(rows), 4).T
+    due = np.floor(due)
+    order = np.argsort(due, kind='stable')
+    return ids[order].astype(np.int64), tailors[order].astype(np.int64), due[order], work[order]
+
+
+# Day (counted from today) on which each order is finished when `work` is done in
+# order at `rate` orders per working day; inf when it never is (rate 0)
+def finish_days(work, rate, today):
+    if rate <= 0:
+        return np.full(len(work), np.inf)
+    # Enough days for all of the work, however the working days fall
+    length = math.ceil(work.sum() / rate * 7 / len(WORKDAYS)) + 8
+    capacity = np.cumsum(workday_mask(today, length) * rate)
+    return np.searchsorted(capacity, np.cumsum(work) - 1e-9).astype(np.float64)
+
+
+def build_forecast(today, days):
+    tailors = db.session.execute(select(Staff.id, Staff.username).where(Staff.role == 'TAILOR')).all()
+    rates, from_history = throughput(today, [t.id for t in tailors])
+    shop_rate = sum(rates.values())
+    ids, assigned, due, work = open_orders(today)
+
+    # Late for the shop as a whole, or for the tailor who has the order
+    finish = finish_days(work, shop_rate, today)
+    for tailor, rate in rates.items():
+        mine = assigned == tailor
+        if mine.any():
+            finish[mine] = np.maximum(finish[mine], finish_days(work[mine], rate, today))
+    dated = due < UNDATED
+    overdue = dated & (due < 0)
+    late = dated & (finish > due)
+
+    # One slot per day of the forecast; overdue orders are due today
+    slot = np.clip(due, 0, None)
+    within = dated & (slot < days)
+    slot = slot[within].astype(np.int64)
+    due_orders = np.bincount(slot, minlength=days)
+    demand = np.bincount(slot, weights=work[within], minlength=days)
+    at_risk = np.bincount(slot, weights=late[within], minlength=days).astype(np.int64)
+    capacity = workday_mask(today, days) * shop_rate
+    cumulative_capacity = np.cumsum(capacity)
+    cumulative_demand = np.cumsum(demand)
+    shortfall = np.maximum(cumulative_demand - cumulative_capacity, 0)
+
+    daily = [
+        {'date': (today + timedelta(days=d)).isoformat(), 'due_orders': int(due_orders[d]),
+         'demand': round(float(demand[d]), 2), 'capacity': round(float(capacity[d]), 2),
+         'cumulative_demand': round(float(cumulative_demand[d]), 2),
+         'cumulative_capacity': round(float(cumulative_capacity[d]), 2),
+         'shortfall': round(float(shortfall[d]), 2), 'at_risk': int(at_risk[d])}
+        for d in range(days)
+    ]
+
+    flagged = np.flatnonzero(late)[:AT_RISK_LIMIT]
+    details = {row.id: row for row in db.session.execute(
+        select(GarmentOrder.id, GarmentOrder.garment_type, GarmentOrder.number, GarmentOrder.status,
+               GarmentOrder.assigned_to, GarmentOrder.client, Client.username, Client.pickup_date)
+        .join(Client, Client.id == GarmentOrder.client)
+        .where(GarmentOrder.id.in_(ids[flagged].tolist()))
+    )}
+    orders = []
+    for i in flagged.tolist():
+        row = details.get(int(ids[i]))
+        if row is None:
+            continue
+        finished = today + timedelta(days=finish[i]) if math.isfinite(finish[i]) else None
+        orders.append({
+            'id': row.id, 'garment': row.garment_type, 'number': row.number, 'status': row.status,
+            'assigned_to': row.assigned_to, 'client': row.client, 'client_name': row.username,
+            'pickup_date': row.pickup_date.date().isoformat(),
+            'projected_finish': finished.isoformat() if finished else None,
+            'overdue': bool(overdue[i]),
+        })
+
+    open_by_tailor = np.bincount(assigned[assigned >= 0], minlength=max(rates, default=0) + 1)
+    return {
+        'from': today.isoformat(),
+        'days': days,
+        'tailors': len(tailors),
+        'throughput_from_history': from_history,
+        'capacity_per_workday': round(float(shop_rate), 2),
+        'open_orders': len(ids),
+        'unassigned': int((assigned < 0).sum()),
+        'undated': int((~dated).sum()),
+        'overdue': int(overdue.sum()),
+        'at_risk': int(late.sum()),
+        'daily': daily,
+        'by_tailor': [
+            {'id': t.id, 'username': t.username, 'open_orders': int(open_by_tailor[t.id]),
+             'throughput': round(rates[t.id], 2),
+             'days_of_work': round(open_by_tailor[t.id] / rates[t.id], 1) if rates[t.id] else None}
+            for t in tailors
+        ],
+        'at_risk_orders': orders,
+    }
+
+
+# Cache a forecast, dropping the least recently used past FORECAST_CACHE_SIZE. Request
+# threads share the cache; the lock is held for the dict updates, never for a build.
+def remember(key, entry):
+    with _lock:
+        _cache.pop(key, None)
+        _cache[key] = entry
+        while len(_cache) > FORECAST_CACHE_SIZE:
+            _cache.pop(next(iter(_cache)))
+
+
+# The forecast for `days` from `today`, from the cache unless an order, client or staff member changed
+def forecast(today, days):
+    version = current_version()
+    with _lock:
+        entry = _cache.get((today, days))
+    if entry is not None and (entry[0] == version or not changed_since(entry[0])):
+        remember((today, days), (version, entry[1]))
+        return entry[1]
+
+    view = build_forecast(today, days)
+    remember((today, days), (version, view))
+    return view
+
+
+class CapacityForecast(Resource):
+    def get(self):
+        if 'user_id' not in session or session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
+            return {"message": "Unauthorized"}, 401
+
+        days = request.args.get('days', DEFAULT_DAYS, type=int)
+        if not 1 <= days <= MAX_DAYS:
+            return {"message": f"'days' must be between 1 and {MAX_DAYS}"}, 400
+        return jsonify(forecast(date.today(), days))
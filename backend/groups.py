@@ -0,0 +1,161 @@
+# Group orders (weddings, choirs): the clients sharing a group_name and their orders.
+#
+#   GET /groups           every group with its member count, money and order counts by status
+#   GET /groups/<name>    members, every garment order with status and tailor, fabric totals, money
+#
+# Each view is built from a handful of grouped queries and cached per worker with
+# the change_log version it was built at. A cached view is served only after
+# change_log shows nothing newer touching it: a member edited, added or removed,
+# or one of their orders booked, edited or deleted. That check is skipped when
+# the log has not moved at all, and since it reads the shared log it also picks
+# up writes made by other worker processes.
+import threading
+
+from flask import jsonify, session
+from flask_restful import Resource
+from sqlalchemy import and_, func, or_, select
+
+from extensions import db
+from models import Change, Client, GarmentOrder, Staff
+
+NO_GROUP = 'none'
+GROUP_CACHE_SIZE = 256
+
+# Group name (None for the list of groups) -> (version, member ids, order ids, view); most recently used last
+_cache = {}
+_lock = threading.Lock()
+
+
+def current_version():
+    return db.session.scalar(select(func.max(Change.id))) or 0
+
+
+# Whether anything a cached view was built from changed after `version`
+def changed_since(version, name=None, clients=(), orders=()):
+    query = select(Change.id).where(Change.id > version)
+    if name is None:
+        query = query.where(Change.table_name.in_(('client', 'garment_order')))
+    else:
+        joined = select(Client.id).where(Client.id == Change.row_id, Client.group_name == name).exists()
+        booked = select(GarmentOrder.id).where(GarmentOrder.id == Change.row_id,
+                                               GarmentOrder.client.in_(clients)).exists()
+        query = query.where(or_(
+            and_(Change.table_name == 'client', or_(Change.row_id.in_(clients), joined)),
+            and_(Change.table_name == 'garment_order', or_(Change.row_id.in_(orders), booked)),
+        ))
+    return db.session.scalar(query.limit(1)) is not None
+
+
+# Cache a view, dropping the least recently used past GROUP_CACHE_SIZE. Request threads
+# share the cache; the lock is held for the dict updates, never for a build.
+def remember(name, entry):
+    with _lock:
+        _cache.pop(name, None)
+        _cache[name] = entry
+        while len(_cache) > GROUP_CACHE_SIZE:
+            _cache.pop(next(iter(_cache)))
+
+
+# The view for `name` from the cache, or from `build(name)` when missing or stale
+def cached(name, build):
+    version = current_version()
+    with _lock:
+        entry = _cache.get(name)
+    if entry is not None:
+        built_at, clients, orders, view = entry
+        if built_at == version or not changed_since(built_at, name, clients, orders):
+            remember(name, (version, clients, orders, view))
+            return view
+
+    clients, orders, view = build(name)
+    remember(name, (version, clients, orders, view))
+    return view
+
+
+def build_groups(_):
+    grouped = and_(Client.group_name.is_not(None), Client.group_name != NO_GROUP)
+    groups = {
+        row.group_name: {
+            'name': row.group_name,
+            'members': row.members,
+            'total_price': row.total_price or 0,
+            'balance_outstanding': row.balance_outstanding or 0,
+            'orders': 0,
+            'statuses': {},
+        }
+        for row in db.session.execute(
+            select(Client.group_name, func.count().label('members'),
+                   func.sum(Client.buying_price).label('total_price'),
+                   func.sum(Client.balance_amount).label('balance_outstanding'))
+            .where(grouped).group_by(Client.group_name)
+        )
+    }
+    for name, status, count in db.session.execute(
+        select(Client.group_name, GarmentOrder.status, func.count())
+        .join(Client, Client.id == GarmentOrder.client)
+        .where(grouped).group_by(Client.group_name, GarmentOrder.status)
+    ):
+        groups[name]['orders'] += count
+        groups[name]['statuses'][status] = count
+    return (), (), [groups[name] for name in sorted(groups)]
+
+
+def build_group(name):
+    members = db.session.execute(
+        select(Client.id, Client.username, Client.phone, Client.buying_price, Client.balance_amount,
+               Client.pickup_date)
+        .where(Client.group_name == name).order_by(Client.id)
+    ).all()
+    if not members:
+        return (), (), None
+
+    in_group = GarmentOrder.client.in_(select(Client.id).where(Client.group_name == name))
+    orders = db.session.execute(
+        select(GarmentOrder.id, GarmentOrder.garment_type, GarmentOrder.number, GarmentOrder.fabric,
+               GarmentOrder.status, GarmentOrder.client, GarmentOrder.assigned_to,
+               Staff.username.label('tailor'), GarmentOrder.date_created)
+        .outerjoin(Staff, Staff.id == GarmentOrder.assigned_to)
+        .where(in_group).order_by(GarmentOrder.client, GarmentOrder.id)
+    ).all()
+
+    fabrics = {}
+    for fabric, garment, count in db.session.execute(
+        select(GarmentOrder.fabric, GarmentOrder.garment_type, func.count())
+        .where(in_group).group_by(GarmentOrder.fabric, GarmentOrder.garment_type)
+    ):
+        totals = fabrics.setdefault(fabric, {'orders': 0, 'garments': {}})
+        totals['orders'] += count
+        totals['garments'][garment] = count
+    statuses = dict(db.session.execute(
+        select(GarmentOrder.status, func.count()).where(in_group).group_by(GarmentOrder.status)
+    ).all())
+
+    view = {
+        'name': name,
+        'members': [dict(row._mapping) for row in members],
+        'orders': [dict(row._mapping) for row in orders],
+        'fabrics': fabrics,
+        'statuses': statuses,
+        'total_price': sum(m.buying_price or 0 for m in members),
+        'balance_outstanding': sum(m.balance_amount or 0 for m in members),
+    }
+    return tuple(m.id for m in members), tuple(o.id for o in orders), view
+
+
+class Groups(Resource):
+    def get(self):
+        if 'user_id' not in session or session.get('role') is None:
+            return {"message": "Unauthorized"}, 401
+
+        return jsonify(cached(None, build_groups))
+
+
+class Group(Resource):
+    def get(self, name):
+        if 'user_id' not in session or session.get('role') is None:
+            return {"message": "Unauthorized"}, 401
+
+        view = cached(name, build_group) if name != NO_GROUP else None
+        if view is None:
+            return {"message": "Group not found"}, 404
+        return jsonify(view)
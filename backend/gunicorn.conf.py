@@ -0,0 +1,43 @@
+# Prefork deployment with gunicorn:
+#
+#   gunicorn -c gunicorn.conf.py
+#
+# The app is built once in the master (preload_app) and the workers are forked
+# from it, so they share the imported code and warm state copy-on-write. Pooled
+# database connections are never shared across the fork: extensions.py registers
+# an after-fork hook that disposes the inherited engines, and each worker opens
+# its own SQLite connections on first use.
+#
+# Workers are threaded (gthread): an /events subscriber holds a thread for as long
+# as it stays connected and /debug/profile samples for up to a minute, which
+# would each tie up a whole sync worker and get it killed at the timeout.
+# GUNICORN_THREADS bounds the streams and requests a worker serves at once.
+import multiprocessing
+import os
+
+wsgi_app = 'app:create_app()'
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+
+# SQLite serialises writers, so past a couple of workers per core the extra
+# processes only queue on the database lock
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 32))
+preload_app = True
+
+# Recycle workers now and then so slow leaks cannot build up
+max_requests = 10000
+max_requests_jitter = 1000
+# A silent worker is restarted after this long. gthread workers check in from their
+# main loop while requests run on the pool threads, so this does not cut long
+# streams short; it still stays above profiler.MAX_SECONDS.
+timeout = 90
+graceful_timeout = 30
+keepalive = 5
+
+
+def post_fork(server, worker):
+    # Already done by the os.register_at_fork hook; kept here so the guarantee
+    # holds even on platforms without it
+    from extensions import dispose_engines
+    dispose_engines()
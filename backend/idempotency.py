@@ -0,0 +1,174 @@
+# Idempotency-Key support for create endpoints, so a retried POST does not book twice.
+#
+#   POST /create_client   Idempotency-Key: 7f6c2a9e-...
+#
+# The first request with a key claims it with a pending idempotency_key row, runs,
+# and stores its response there; responses are also kept in a per-worker LRU. A
+# retry within IDEMPOTENCY_TTL gets the stored response back (marked with
+# Idempotent-Replayed) without the handler running again, so nothing is
+# re-inserted or re-hashed. Reusing a key for a different request (another user,
+# path or body) is a 422. Duplicates that arrive while the first is still running
+# wait for it and replay its response: threads of one worker wait on an event,
+# other workers poll the pending row. After WAIT_SECONDS they get a 409 instead.
+# Only successful (2xx) responses are kept: after an error the key is released,
+# so the request can be corrected or retried (say after logging in) with the
+# same key rather than getting the error back or a 422.
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Response, current_app, request, session
+from flask_restful import unpack
+from flask_restful.representations.json import output_json
+from sqlalchemy import delete, insert, select, update
+
+from extensions import db
+from models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+CACHE_SIZE = 1024
+WAIT_SECONDS = 10  # how long a duplicate waits for the first request to finish
+POLL_SECONDS = 0.05
+PURGE_INTERVAL = 3600  # seconds between deletes of expired keys, per worker
+
+# Key -> (fingerprint, status, body, mimetype, expires at); most recently used last
+_cache = OrderedDict()
+# Key -> event set when this worker's request with that key finishes
+_running = {}
+_lock = threading.Lock()
+_purged = 0.0
+
+
+def fingerprint():
+    digest = hashlib.sha256()
+    for part in (str(session.get('user_id')), request.method, request.full_path):
+        digest.update(part.encode())
+        digest.update(b'\0')
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def remember(key, entry):
+    with _lock:
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def cached(key):
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[4] > time.time():
+            _cache.move_to_end(key)
+            return entry
+    return None
+
+
+def replay(entry, request_fingerprint):
+    if entry[0] != request_fingerprint:
+        return {"message": f"This {HEADER} was already used for a different request"}, 422
+    response = Response(entry[2], status=entry[1], mimetype=entry[3])
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+# Claim `key` for this request; returns the stored row instead when someone else holds it
+def claim(key, request_fingerprint, ttl):
+    global _purged
+    now = datetime.now()
+    table = IdempotencyKey.__table__
+    with db.engine.begin() as conn:
+        if time.monotonic() - _purged > PURGE_INTERVAL:
+            conn.execute(delete(table).where(table.c.created_at < now - timedelta(seconds=ttl)))
+            _purged = time.monotonic()
+        row = conn.execute(select(table).where(table.c.key == key)).first()
+        if row is not None and row.created_at >= now - timedelta(seconds=ttl):
+            return row
+        if row is not None:
+            conn.execute(delete(table).where(table.c.key == key))
+        # INSERT OR IGNORE is SQLite's; another database would need its own ON CONFLICT DO NOTHING
+        inserted = conn.execute(insert(table).prefix_with('OR IGNORE').values(
+            key=key, fingerprint=request_fingerprint, created_at=now)).rowcount
+        if not inserted:
+            # Another worker claimed it between the select and the insert
+            return conn.execute(select(table).where(table.c.key == key)).first()
+    return None
+
+
+def run(key, request_fingerprint, method, args, kwargs):
+    ttl = current_app.config['IDEMPOTENCY_TTL']
+    deadline = time.monotonic() + WAIT_SECONDS
+    while True:
+        entry = cached(key)
+        if entry is not None:
+            return replay(entry, request_fingerprint)
+        row = claim(key, request_fingerprint, ttl)
+        if row is None:
+            break
+        if row.status is not None:
+            expires = row.created_at.timestamp() + ttl
+            entry = (row.fingerprint, row.status, row.body, row.mimetype, expires)
+            remember(key, entry)
+            return replay(entry, request_fingerprint)
+        # Still running in another worker
+        if time.monotonic() >= deadline:
+            return {"message": f"A request with this {HEADER} is still being processed"}, 409
+        time.sleep(POLL_SECONDS)
+
+    table = IdempotencyKey.__table__
+    try:
+        result = method(*args, **kwargs)
+    except Exception:
+        with db.engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.key == key))
+        raise
+    if isinstance(result, Response):
+        response = result
+    else:
+        response = output_json(*unpack(result))
+        response.mimetype = 'application/json'
+    with db.engine.begin() as conn:
+        if not 200 <= response.status_code < 300:
+            conn.execute(delete(table).where(table.c.key == key))
+        else:
+            body = response.get_data(as_text=True)
+            conn.execute(update(table).where(table.c.key == key).values(
+                status=response.status_code, body=body, mimetype=response.mimetype))
+            remember(key, (request_fingerprint, response.status_code, body, response.mimetype, time.time() + ttl))
+    return response
+
+
+# Decorator for a Resource's post() honouring the Idempotency-Key header
+def idempotent(method):
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return method(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return {"message": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"}, 400
+        request_fingerprint = fingerprint()
+
+        # One request per key at a time in this worker; the others wait and then replay its response
+        deadline = time.monotonic() + WAIT_SECONDS
+        while True:
+            with _lock:
+                running = _running.get(key)
+                if running is None:
+                    running = _running[key] = threading.Event()
+                    break
+            if not running.wait(max(deadline - time.monotonic(), 0)):
+                return {"message": f"A request with this {HEADER} is still being processed"}, 409
+        try:
+            return run(key, request_fingerprint, method, args, kwargs)
+        finally:
+            with _lock:
+                _running.pop(key, None)
+            running.set()
+
+    return wrapper
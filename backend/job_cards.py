@@ -0,0 +1,170 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from html import escape
+
+from flask import Response, request, session
+from flask_restful import Resource
+from sqlalchemy import and_, or_
+
+from models import Staff, Client, GarmentOrder, GARMENT_FIELDS
+
+# Rendered cards keyed by (garment type, order number, versions of the order, client and tailor)
+_card_cache = {}
+_lock = threading.Lock()
+CARD_CACHE_SIZE = 5000
+
+# Below this many uncached cards it is cheaper for the CLI to render in-process than to start a worker pool
+POOL_THRESHOLD = 64
+
+CARD_STYLE = """
+body { font-family: sans-serif; margin: 0; }
+.card { border: 1px solid #000; padding: 12px; margin: 12px; page-break-inside: avoid; }
+.card h2 { margin: 0 0 8px 0; font-size: 18px; }
+.card table { border-collapse: collapse; width: 100%; }
+.card td { border: 1px solid #999; padding: 4px 6px; }
+@media print { .card { page-break-after: always; } }
+"""
+
+
+# Parse "coat:1,trouser:4" into [('coat', 1), ('trouser', 4)]
+def parse_card_ids(raw):
+    keys = []
+    for part in raw.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        garment, _, id = part.partition(':')
+        if garment not in GARMENT_FIELDS or not id.isdigit():
+            raise ValueError(f"Invalid job card id '{part}', expected <garment>:<id>")
+        keys.append((garment, int(id)))
+    return keys
+
+
+# Load plain card data for the given (garment, id) keys, keeping the requested order
+def load_cards(keys):
+    ids_by_garment = {}
+    for garment, id in keys:
+        ids_by_garment.setdefault(garment, set()).add(id)
+
+    # One query for the orders, then one each for the clients and tailors involved
+    rows = {}
+    matches = [and_(GarmentOrder.garment_type == garment, GarmentOrder.number.in_(ids))
+               for garment, ids in ids_by_garment.items()]
+    for m in GarmentOrder.query.filter(or_(*matches)).all():
+        rows[(m.garment_type, m.number)] = m
+
+    client_ids = {m.client for m in rows.values()}
+    staff_ids = {m.assigned_to for m in rows.values() if m.assigned_to}
+    clients = {c.id: c for c in Client.query.filter(Client.id.in_(client_ids)).all()} if client_ids else {}
+    staff = {s.id: s for s in Staff.query.filter(Staff.id.in_(staff_ids)).all()} if staff_ids else {}
+
+    cards = []
+    for key in keys:
+        m = rows.get(key)
+        if m is None:
+            continue
+        garment = key[0]
+        client = clients.get(m.client)
+        tailor = staff.get(m.assigned_to)
+        card = {
+            'garment': garment,
+            'id': m.number,
+            'client': client.username if client else None,
+            'phone': client.phone if client else None,
+            'pickup_date': client.pickup_date.strftime('%Y-%m-%d') if client and client.pickup_date else None,
+            'fabric': m.fabric,
+            'measurements': [(f, (m.measurements or {}).get(f)) for f in GARMENT_FIELDS[garment]],
+            'description': m.description,
+            'status': m.status,
+            'assigned_to': tailor.username if tailor else None,
+            'date_created': m.date_created.strftime('%Y-%m-%d') if m.date_created else None,
+        }
+        # Everything printed comes from the order, its client and its tailor
+        card['version'] = (m.version, client.version if client else 0, tailor.version if tailor else 0)
+        cards.append(card)
+    return cards
+
+
+# Render a single job card as an HTML fragment
+def render_card(card):
+    title = card['garment'].replace('_', ' ').title()
+    rows = ''.join(
+        f"<tr><td>{escape(name.replace('_', ' '))}</td><td>{'' if value is None else escape(str(value))}</td></tr>"
+        for name, value in card['measurements']
+    )
+    return (
+        f"<div class=\"card\">"
+        f"<h2>{escape(title)} #{card['id']}</h2>"
+        f"<p><b>Client:</b> {escape(card['client'] or '')} ({escape(card['phone'] or '')})<br>"
+        f"<b>Due:</b> {escape(card['pickup_date'] or '-')} &nbsp; <b>Booked:</b> {escape(card['date_created'] or '-')}<br>"
+        f"<b>Fabric:</b> {escape(card['fabric'] or '')} &nbsp; <b>Status:</b> {escape(card['status'] or '')}<br>"
+        f"<b>Tailor:</b> {escape(card['assigned_to'] or 'unassigned')}</p>"
+        f"<table>{rows}</table>"
+        f"<p>{escape(card['description'] or '')}</p>"
+        f"</div>"
+    )
+
+
+# Render cards, reusing cached output. Web requests render in their own thread; the CLI
+# passes workers (None for one per CPU) to spread many misses over a process pool, which
+# would otherwise fork a copy of the web worker on every large request. Request threads
+# share the cache; the lock is held for the dict reads and updates, never for rendering.
+def render_cards(cards, workers=1):
+    keys = [(c['garment'], c['id'], c['version']) for c in cards]
+    with _lock:
+        hits = {key: _card_cache[key] for key in keys if key in _card_cache}
+    misses = [c for c, key in zip(cards, keys) if key not in hits]
+
+    if len(misses) >= POOL_THRESHOLD and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rendered = list(pool.map(render_card, misses, chunksize=16))
+    else:
+        rendered = [render_card(c) for c in misses]
+
+    fresh = {(c['garment'], c['id'], c['version']): html for c, html in zip(misses, rendered)}
+    result = [fresh.get(key) or hits[key] for key in keys]
+
+    with _lock:
+        _card_cache.update(fresh)
+        while len(_card_cache) > CARD_CACHE_SIZE:
+            _card_cache.pop(next(iter(_card_cache)))
+    return result
+
+
+# Wrap rendered cards in one printable document
+def render_document(fragments, title):
+    return (
+        f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{escape(title)}</title>"
+        f"<style>{CARD_STYLE}</style></head><body>{''.join(fragments)}</body></html>"
+    )
+
+
+# Keys of every garment order booked on the given day
+def cards_booked_on(day):
+    start = datetime(day.year, day.month, day.day)
+    end = start + timedelta(days=1)
+    rows = GarmentOrder.query.with_entities(GarmentOrder.garment_type, GarmentOrder.number) \
+        .filter(GarmentOrder.date_created >= start, GarmentOrder.date_created < end) \
+        .order_by(GarmentOrder.id).all()
+    return [(row.garment_type, row.number) for row in rows]
+
+
+class JobCards(Resource):
+    def get(self):
+        if 'user_id' not in session:
+            return {"message": "Unauthorized"}, 401
+
+        try:
+            keys = parse_card_ids(request.args.get('ids', ''))
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        if not keys:
+            return {"message": "Provide ids as ?ids=<garment>:<id>,..."}, 400
+
+        cards = load_cards(keys)
+        if not cards:
+            return {"message": "No job cards found"}, 404
+
+        return Response(render_document(render_cards(cards), 'Job cards'), mimetype='text/html')
+
@@ -0,0 +1,21 @@
+import importlib
+
+from flask_restful import Resource
+
+
+# A Resource standing in for one that lives in a rarely used module. The route is
+# registered at startup, but the module is only imported by the first request it
+# serves, so reports, exports and the like add nothing to worker cold start.
+def lazy_resource(module_name, class_name, methods=('GET',)):
+    class LazyResource(Resource):
+        target = None
+
+        def dispatch_request(self, *args, **kwargs):
+            cls = type(self)
+            if cls.target is None:
+                cls.target = getattr(importlib.import_module(module_name), class_name)
+            return cls.target().dispatch_request(*args, **kwargs)
+
+    LazyResource.__name__ = LazyResource.__qualname__ = class_name
+    LazyResource.methods = {m.upper() for m in methods}
+    return LazyResource
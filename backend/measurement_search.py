@@ -0,0 +1,187 @@
+# Nearest previous profiles by body measurements, for sizing a walk-in off the rack.
+#
+#   GET /measurements/similar?garment=coat&chest=40&waist=34&shoulder=17.5&k=10&weights=chest:2,waist:1.5
+#
+# Each garment type's profiles are held in memory as one float32 column per
+# measurement field (NaN where a field was not taken) plus a sorted column of
+# order ids. A query is a weighted Euclidean distance over the fields it gives,
+# accumulated column by column over every profile with NumPy, and the k nearest
+# come from argpartition; profiles missing a queried field are skipped. A type's
+# matrix is built on its first query and then kept current from change_log:
+# orders booked, edited or deleted since the last query are re-read and patched
+# in place, new ones appended into spare capacity.
+import threading
+from itertools import chain
+
+import numpy as np
+from flask import jsonify, request, session
+from flask_restful import Resource
+from sqlalchemy import func, select
+
+from extensions import db
+from models import Change, Client, GarmentOrder, GARMENT_FIELDS
+
+DEFAULT_K = 10
+MAX_K = 100
+
+# Stands in for a measurement that was not taken while loading (all real ones are positive)
+MISSING = -1.0
+
+
+def current_version():
+    return db.session.scalar(select(func.max(Change.id))) or 0
+
+
+class ProfileMatrix:
+    def __init__(self, garment):
+        self.garment = garment
+        self.fields = GARMENT_FIELDS[garment]
+        self.lock = threading.Lock()
+        self.version = None
+        self.size = 0
+        self.ids = np.empty(0, dtype=np.int64)
+        self.columns = np.empty((len(self.fields), 0), dtype=np.float32)
+
+    # (ids, columns) of this type's orders matching `condition`, in id order. Missing
+    # fields come back as MISSING rather than NULL so the rows can go straight into
+    # np.fromiter, which is far quicker than converting row objects.
+    def load(self, *condition):
+        table = GarmentOrder.__table__
+        values = [func.coalesce(func.json_extract(table.c.measurements, f'$.{field}'), MISSING)
+                  for field in self.fields]
+        rows = db.session.execute(
+            select(table.c.id, *values).where(table.c.garment_type == self.garment, *condition).order_by(table.c.id)
+        ).all()
+        width = len(self.fields) + 1
+        matrix = np.fromiter(chain.from_iterable(rows), dtype=np.float64, count=len(rows) * width)
+        matrix = matrix.reshape(len(rows), width)
+        columns = np.ascontiguousarray(matrix[:, 1:].T, dtype=np.float32)
+        columns[columns == MISSING] = np.nan
+        return matrix[:, 0].astype(np.int64), columns
+
+    def refresh(self):
+        version = current_version()
+        if self.version is None:
+            self.ids, self.columns = self.load()
+            self.size = len(self.ids)
+        elif version != self.version:
+            changed = db.session.scalars(
+                select(Change.row_id).distinct()
+                .where(Change.id > self.version, Change.id <= version, Change.table_name == GarmentOrder.__tablename__)
+            ).all()
+            if changed:
+                self.patch(np.array(sorted(changed), dtype=np.int64))
+        self.version = version
+
+    def patch(self, changed):
+        ids = self.ids[:self.size]
+        # Blank every changed profile; the ones still of this type are written back below
+        positions = np.searchsorted(ids, changed)
+        held = positions < self.size
+        held[held] = ids[positions[held]] == changed[held]
+        self.columns[:, positions[held]] = np.nan
+
+        new_ids, new_columns = self.load(GarmentOrder.id.in_(changed.tolist()))
+        positions = np.searchsorted(ids, new_ids)
+        held = positions < self.size
+        held[held] = ids[positions[held]] == new_ids[held]
+        self.columns[:, positions[held]] = new_columns[:, held]
+        self.append(new_ids[~held], new_columns[:, ~held])
+
+    def append(self, ids, columns):
+        if not len(ids):
+            return
+        end = self.size + len(ids)
+        if end > len(self.ids):
+            capacity = max(end, 2 * len(self.ids), 1024)
+            grown_ids = np.empty(capacity, dtype=np.int64)
+            grown_columns = np.full((len(self.fields), capacity), np.nan, dtype=np.float32)
+            grown_ids[:self.size] = self.ids[:self.size]
+            grown_columns[:, :self.size] = self.columns[:, :self.size]
+            self.ids, self.columns = grown_ids, grown_columns
+        self.ids[self.size:end] = ids
+        self.columns[:, self.size:end] = columns
+        self.size = end
+        # Ids only grow, but keep the column sorted should one ever be reused
+        if self.size > len(ids) and ids[0] < self.ids[self.size - len(ids) - 1]:
+            order = np.argsort(self.ids[:end], kind='stable')
+            self.ids[:end] = self.ids[:end][order]
+            self.columns[:, :end] = self.columns[:, :end][:, order]
+
+    # (order ids, distances) of the k profiles nearest to `query` ({field: value})
+    def nearest(self, query, weights, k):
+        with self.lock:
+            self.refresh()
+            size = self.size
+            distance = np.zeros(size, dtype=np.float32)
+            scratch = np.empty(size, dtype=np.float32)
+            for field, value in query.items():
+                np.subtract(self.columns[self.fields.index(field), :size], value, out=scratch)
+                np.square(scratch, out=scratch)
+                weight = weights.get(field, 1.0)
+                if weight != 1.0:
+                    scratch *= weight
+                distance += scratch
+            distance[np.isnan(distance)] = np.inf
+            k = min(k, size)
+            if k == 0:
+                return [], []
+            top = np.argpartition(distance, k - 1)[:k]
+            top = top[np.argsort(distance[top], kind='stable')]
+            top = top[np.isfinite(distance[top])]
+            return self.ids[top].tolist(), np.sqrt(distance[top]).tolist()
+
+
+_matrices = {garment: ProfileMatrix(garment) for garment in GARMENT_FIELDS}
+
+
+# "chest:2,waist:1.5" -> {'chest': 2.0, 'waist': 1.5}
+def parse_weights(raw, fields):
+    weights = {}
+    for part in filter(None, (p.strip() for p in raw.split(','))):
+        field, _, value = part.partition(':')
+        try:
+            weight = float(value)
+        except ValueError:
+            raise ValueError(f"Invalid weight '{part}', expected <field>:<number>")
+        if field not in fields or weight < 0:
+            raise ValueError(f"Invalid weight '{part}', expected one of {', '.join(fields)} with a weight of 0 or more")
+        weights[field] = weight
+    return weights
+
+
+class SimilarMeasurements(Resource):
+    def get(self):
+        if 'user_id' not in session or session.get('role') is None:
+            return {"message": "Unauthorized"}, 401
+
+        garment = request.args.get('garment')
+        if garment not in GARMENT_FIELDS:
+            return {"message": f"'garment' must be one of: {', '.join(GARMENT_FIELDS)}"}, 400
+        fields = GARMENT_FIELDS[garment]
+        try:
+            query = {f: float(request.args[f]) for f in fields if request.args.get(f)}
+        except ValueError:
+            return {"message": "Measurements must be numbers"}, 400
+        try:
+            weights = parse_weights(request.args.get('weights', ''), fields)
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        if not query:
+            return {"message": f"Give at least one measurement: {', '.join(fields)}"}, 400
+        k = min(max(request.args.get('k', DEFAULT_K, type=int), 1), MAX_K)
+
+        ids, distances = _matrices[garment].nearest(query, weights, k)
+        orders = {o.id: o for o in db.session.execute(
+            select(GarmentOrder.id, GarmentOrder.number, GarmentOrder.client, GarmentOrder.fabric,
+                   GarmentOrder.measurements, Client.username)
+            .join(Client, Client.id == GarmentOrder.client, isouter=True)
+            .where(GarmentOrder.id.in_(ids))
+        )}
+        matches = [
+            {'id': id, 'number': orders[id].number, 'client': orders[id].client,
+             'client_name': orders[id].username, 'fabric': orders[id].fabric,
+             'distance': round(distance, 3), 'measurements': orders[id].measurements}
+            for id, distance in zip(ids, distances) if id in orders
+        ]
+        return jsonify({'garment': garment, 'query': query, 'weights': weights, 'matches': matches})
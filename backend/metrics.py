@@ -0,0 +1,308 @@
+# Request instrumentation exposed at /metrics in the Prometheus text format.
+#
+# Every thread records into its own shard, so the request path never takes a
+# lock; /metrics adds the shards up when it is scraped. The shards of threads
+# that have exited (a server with a thread per connection starts one for every
+# client) are folded into a single retired shard then, so their number stays
+# that of the live threads. With several worker processes, set METRICS_DIR to a
+# directory shared by the workers: each one writes a snapshot of its totals
+# there every few seconds and /metrics merges all snapshots, whichever worker
+# answers the scrape. The snapshot of a worker that has exited (recycled by
+# max_requests, or restarted) is folded into metrics-retired.json in the same
+# way, keeping its counts but not its in-flight requests.
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+SIZE_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+QUERY_BUCKETS = [0, 1, 2, 5, 10, 20, 50, 100]
+
+HISTOGRAMS = {
+    'latency': ('http_request_duration_seconds', 'Request latency in seconds', LATENCY_BUCKETS),
+    'size': ('http_response_size_bytes', 'Response body size in bytes', SIZE_BUCKETS),
+    'queries': ('http_request_sql_queries', 'SQL statements executed per request', QUERY_BUCKETS),
+}
+
+# How often a worker writes its snapshot to METRICS_DIR
+SNAPSHOT_INTERVAL = 5
+
+
+# Name of the snapshot in METRICS_DIR holding the totals of workers that have exited
+RETIRED = 'metrics-retired.json'
+
+
+class Shard:
+    def __init__(self, thread=None):
+        self.thread = thread  # the thread recording into it
+        self.requests = {}  # (route, method, status) -> count
+        self.histograms = {name: {} for name in HISTOGRAMS}  # name -> (route, method) -> [bucket counts, sum]
+        self.in_flight = 0
+
+    def observe(self, name, key, value):
+        series = self.histograms[name].get(key)
+        if series is None:
+            buckets = HISTOGRAMS[name][2]
+            series = self.histograms[name][key] = [[0] * (len(buckets) + 1), 0]
+        series[0][bisect_left(HISTOGRAMS[name][2], value)] += 1
+        series[1] += value
+
+
+_local = threading.local()
+_shards = []
+_retired = Shard()  # counts of threads that have exited
+_retire_lock = threading.Lock()
+
+
+def shard():
+    s = getattr(_local, 'shard', None)
+    if s is None:
+        s = _local.shard = Shard(threading.current_thread())
+        _shards.append(s)
+    return s
+
+
+# Add the counts of shards whose thread has exited to _retired and drop them. Only
+# scrapes and snapshot writes take the lock; a dead thread's shard no longer changes.
+def retire_shards():
+    with _retire_lock:
+        for s in list(_shards):
+            if s.thread.is_alive():
+                continue
+            for key, count in s.requests.items():
+                _retired.requests[key] = _retired.requests.get(key, 0) + count
+            for name, series in s.histograms.items():
+                for key, (counts, total) in series.items():
+                    merged = _retired.histograms[name].setdefault(key, [[0] * len(counts), 0])
+                    merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                    merged[1] += total
+            _shards.remove(s)
+
+
+# A forked worker starts with empty metrics rather than a copy of its parent's
+def _reset_after_fork():
+    global _local, _retired, _retire_lock
+    _local = threading.local()
+    _shards.clear()
+    _retired = Shard()
+    _retire_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+# Totals of every shard in this process, as a JSON-friendly snapshot
+def snapshot():
+    retire_shards()
+    requests = {}
+    histograms = {name: {} for name in HISTOGRAMS}
+    in_flight = 0
+    for s in [_retired, *_shards]:
+        in_flight += s.in_flight
+        for key, count in list(s.requests.items()):
+            requests[key] = requests.get(key, 0) + count
+        for name, series in s.histograms.items():
+            for key, (counts, total) in list(series.items()):
+                merged = histograms[name].setdefault(key, [[0] * len(counts), 0])
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+    return as_snapshot(requests, histograms, in_flight)
+
+
+def as_snapshot(requests, histograms, in_flight):
+    return {
+        'requests': [[*key, count] for key, count in requests.items()],
+        'histograms': {name: [[*key, counts, total] for key, (counts, total) in series.items()]
+                       for name, series in histograms.items()},
+        'in_flight': in_flight,
+    }
+
+
+def merge(snapshots):
+    requests = {}
+    histograms = {name: {} for name in HISTOGRAMS}
+    in_flight = 0
+    for snap in snapshots:
+        in_flight += snap['in_flight']
+        for route, method, status, count in snap['requests']:
+            key = (route, method, status)
+            requests[key] = requests.get(key, 0) + count
+        for name, series in snap['histograms'].items():
+            for route, method, counts, total in series:
+                merged = histograms[name].setdefault((route, method), [[0] * len(counts), 0])
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+    return requests, histograms, in_flight
+
+
+def label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(requests, histograms, in_flight):
+    lines = [
+        '# HELP http_requests_total Requests served, by route, method and status code',
+        '# TYPE http_requests_total counter',
+    ]
+    for (route, method, status), count in sorted(requests.items()):
+        lines.append(f'http_requests_total{{route="{label(route)}",method="{method}",status="{status}"}} {count}')
+
+    lines += [
+        '# HELP http_requests_in_flight Requests currently being served',
+        '# TYPE http_requests_in_flight gauge',
+        f'http_requests_in_flight {in_flight}',
+    ]
+
+    for name, (metric, help, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {metric} {help}', f'# TYPE {metric} histogram']
+        for (route, method), (counts, total) in sorted(histograms[name].items()):
+            labels = f'route="{label(route)}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(buckets + ['+Inf'], counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{{labels}}} {total}')
+            lines.append(f'{metric}_count{{{labels}}} {cumulative}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def snapshot_path(directory, pid=None):
+    return os.path.join(directory, f'metrics-{pid or os.getpid()}.json')
+
+
+def write_json(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def write_snapshot(directory):
+    write_json(snapshot_path(directory), snapshot())
+
+
+def read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# Fold the snapshot of a worker that has exited into the retired totals and remove it.
+# Workers scraped at the same moment take turns on a lock file, and whoever comes
+# second finds the snapshot gone.
+def retire_snapshot(directory, path):
+    with open(os.path.join(directory, 'metrics.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = read_json(path) if os.path.exists(path) else None
+        if dead is None:
+            return
+        retired_path = os.path.join(directory, RETIRED)
+        retired = read_json(retired_path)
+        requests, histograms, _ = merge([retired, dead] if retired else [dead])
+        write_json(retired_path, as_snapshot(requests, histograms, 0))
+        os.remove(path)
+
+
+def read_snapshots(directory):
+    own = snapshot_path(directory)
+    paths = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not name.startswith('metrics-') or not name.endswith('.json') or path == own or name == RETIRED:
+            continue
+        pid = name[len('metrics-'):-len('.json')]
+        # os.kill() would end the process on Windows, where there is no fcntl either
+        if fcntl is not None and pid.isdigit() and not pid_alive(int(pid)):
+            retire_snapshot(directory, path)
+        else:
+            paths.append(path)
+    # Read after retiring, so the retired totals already include the workers just folded in
+    snapshots = [read_json(path) for path in paths + [os.path.join(directory, RETIRED)]]
+    return [snap for snap in snapshots if snap is not None]
+
+
+# Count statements per request for every engine
+@event.listens_for(Engine, 'after_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'metrics_started' in g:
+        g.metrics_queries += 1
+
+
+def before_request():
+    shard().in_flight += 1
+    g.metrics_queries = 0
+    g.metrics_started = time.perf_counter()
+
+
+def after_request(response):
+    if 'metrics_started' not in g:
+        return response
+    s = shard()
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    key = (route, request.method)
+    s.requests[(route, request.method, response.status_code)] = \
+        s.requests.get((route, request.method, response.status_code), 0) + 1
+    s.observe('latency', key, time.perf_counter() - g.metrics_started)
+    s.observe('queries', key, g.metrics_queries)
+    if response.content_length is not None:
+        s.observe('size', key, response.content_length)
+    return response
+
+
+def teardown_request(exc):
+    if 'metrics_started' not in g:
+        return
+    s = shard()
+    s.in_flight -= 1
+
+    directory = current_app.config.get('METRICS_DIR')
+    if directory and time.monotonic() - getattr(_local, 'written', 0) > SNAPSHOT_INTERVAL:
+        _local.written = time.monotonic()
+        write_snapshot(directory)
+
+
+def metrics_view():
+    snapshots = [snapshot()]
+    directory = current_app.config.get('METRICS_DIR')
+    if directory:
+        snapshots += read_snapshots(directory)
+    return Response(render(*merge(snapshots)), mimetype='text/plain; version=0.0.4')
+
+
+def init_metrics(app):
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.teardown_request(teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+    directory = app.config.get('METRICS_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        # Flush this worker's final totals when it exits
+        atexit.register(lambda: write_snapshot(directory))
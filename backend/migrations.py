@@ -0,0 +1,102 @@
+# Schema migrations, run from the CLI:
+#
+#   flask --app app migrate-garment-orders
+#   flask --app app migrate-version-columns
+#   flask --app app migrate-indexes
+#
+# consolidate_garment_orders() moves the four per-garment measurement tables into
+# garment_order in one transaction: each legacy row keeps its id as the order's
+# per-type number, so the old URLs still find it, and its measurement columns
+# become the JSON payload (nulls left out). The legacy tables are dropped once
+# copied. Change log entries written before the migration name the legacy
+# tables, so clients syncing through /changes should do a full fetch after it.
+#
+# add_version_columns() adds the version column the mutable models now use for
+# optimistic locking (see etags.py) to databases created before it, archived
+# copies included. Existing rows start at version 1.
+#
+# create_missing_indexes() brings the indexes of an older database in line with
+# the models: db.create_all() only creates missing tables, so an index added to a
+# model later, or one whose columns have changed, is created (or rebuilt) here.
+from sqlalchemy import Float, MetaData, Table, cast, func, insert, inspect, literal, select
+
+from models import GarmentOrder, GARMENT_FIELDS
+
+LEGACY_GARMENT_TABLES = {
+    'coat': 'coat_measurement',
+    'regular_shirt': 'regular_shirt_measurement',
+    'senator_shirt': 'senator_shirt_measurement',
+    'trouser': 'trouser_measurement',
+}
+
+ORDER_COLUMNS = ['garment_type', 'number', 'fabric', 'measurements', 'description', 'status', 'client',
+                 'assigned_to', 'created_by', 'date_created']
+
+
+def consolidate_garment_orders(conn, log=print):
+    if conn.dialect.name != 'sqlite':
+        raise RuntimeError("The garment order migration builds its JSON payloads with SQLite functions")
+
+    existing = set(inspect(conn).get_table_names())
+    GarmentOrder.__table__.create(conn, checkfirst=True)
+
+    moved = 0
+    for garment, name in LEGACY_GARMENT_TABLES.items():
+        if name not in existing:
+            continue
+        legacy = Table(name, MetaData(), autoload_with=conn)
+        pairs = []
+        for field in GARMENT_FIELDS[garment]:
+            if field in legacy.c:
+                pairs += [literal(field), cast(legacy.c[field], Float)]
+        # json_patch onto an empty object drops the null members
+        payload = func.json_patch('{}', func.json_object(*pairs))
+        rows = select(
+            literal(garment), legacy.c.id, legacy.c.fabric, payload, legacy.c.description, legacy.c.status,
+            legacy.c.client, legacy.c.assigned_to, legacy.c.created_by, legacy.c.date_created,
+        ).order_by(legacy.c.id)
+        count = conn.execute(insert(GarmentOrder.__table__).from_select(ORDER_COLUMNS, rows)).rowcount
+        legacy.drop(conn)
+        log(f"{name}: moved {count} orders")
+        moved += count
+    return moved
+
+
+# Tables whose models declare a version_id_col
+VERSIONED_TABLES = ('staff', 'advance_loan', 'client', 'garment_order', 'inventory')
+
+
+def add_version_columns(conn, log=print):
+    inspector = inspect(conn)
+    schemas = [None] + [name for name in inspector.get_schema_names() if name == 'archive']
+    altered = []
+    for schema in schemas:
+        existing = set(inspector.get_table_names(schema=schema))
+        for name in VERSIONED_TABLES:
+            if name not in existing or any(c['name'] == 'version' for c in inspector.get_columns(name, schema=schema)):
+                continue
+            qualified = f'{schema}.{name}' if schema else name
+            conn.exec_driver_sql(f'ALTER TABLE {qualified} ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+            log(f"{qualified}: added version")
+            altered.append(qualified)
+    return altered
+
+
+def create_missing_indexes(conn, metadata, log=print):
+    inspector = inspect(conn)
+    tables = set(inspector.get_table_names())
+    created = []
+    for table in metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {index['name']: index['column_names'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            columns = [c.name for c in index.columns]
+            if existing.get(index.name) == columns:
+                continue
+            if index.name in existing:
+                index.drop(conn)
+            index.create(conn)
+            log(f"{table.name}: created {index.name} ({', '.join(columns)})")
+            created.append(index.name)
+    return created
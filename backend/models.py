@@ -1,5 +1,6 @@
-from app import db
+from extensions import db
 from datetime import datetime, timezone
+from sqlalchemy import event, func, select
 
 # Staff Model
 class Staff(db.Model):
@@ -13,7 +14,9 @@ class Staff(db.Model):
     # status = db.Column(db.String(20), default='in_consideration')  # Approved, Rejected   >>this is loan status
     salary = db.Column(db.Integer, nullable=True)
     password = db.Column(db.String(250), nullable=False)  # Will store hashed password
-    created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    version = db.Column(db.Integer, nullable=False, default=1)  # bumped by every update, sent as the ETag
+    __mapper_args__ = {'version_id_col': version}
 
 # AdvanceLoan Model
 class AdvanceLoan(db.Model):
@@ -23,10 +26,13 @@ class AdvanceLoan(db.Model):
     taken_by = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
     status = db.Column(db.String(20), default='in consideration')  # Approved, Rejected, Paid
     comment = db.Column(db.Text, nullable=True)
-    date_taken = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    date_taken = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    version = db.Column(db.Integer, nullable=False, default=1)  # bumped by every update, sent as the ETag
+    __mapper_args__ = {'version_id_col': version}
 
 # Client Model
 class Client(db.Model):
+    __table_args__ = (db.Index('ix_client_group_name', 'group_name'),)
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), nullable=False)
     phone = db.Column(db.String(15), nullable=False)
@@ -37,86 +43,130 @@ class Client(db.Model):
     pickup_date = db.Column(db.DateTime, nullable=True)
     group_name = db.Column(db.String(20), nullable=True, default='none')
     created_by = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
-    date_created = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    date_created = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    version = db.Column(db.Integer, nullable=False, default=1)  # bumped by every update, sent as the ETag
+    __mapper_args__ = {'version_id_col': version}
 
-# CoatMeasurement Model
-class CoatMeasurement(db.Model):
+# Garment orders of every type; GARMENT_FIELDS lists the body measurements each type takes
+class GarmentOrder(db.Model):
+    __tablename__ = 'garment_order'
+    __table_args__ = (
+        db.UniqueConstraint('garment_type', 'number', name='uq_garment_order_number'),
+        db.Index('ix_garment_order_status', 'status', 'garment_type'),
+        db.Index('ix_garment_order_assigned_to', 'assigned_to', 'status', 'garment_type'),
+        db.Index('ix_garment_order_client', 'client', 'status'),
+        db.Index('ix_garment_order_date_created', 'date_created'),
+    )
     id = db.Column(db.Integer, primary_key=True)
+    garment_type = db.Column(db.String(20), nullable=False)  # a GARMENT_FIELDS key
+    number = db.Column(db.Integer, nullable=False)  # per-type id used by the /<garment>_measurement/<id> routes
     fabric = db.Column(db.String(50), nullable=False)
-    shoulder = db.Column(db.Numeric(5, 2), nullable=True)
-    sleeves = db.Column(db.Numeric(5, 2), nullable=True)
-    chest = db.Column(db.Numeric(5, 2), nullable=True)
-    waist = db.Column(db.Numeric(5, 2), nullable=True)
-    arm = db.Column(db.Numeric(5, 2), nullable=True)
-    full_length = db.Column(db.Numeric(5, 2), nullable=True)
-    bottom_length = db.Column(db.Numeric(5, 2), nullable=True)
+    measurements = db.Column(db.JSON, nullable=False, default=dict)  # {field: inches}, only the fields taken
     description = db.Column(db.Text, nullable=True)
     status = db.Column(db.String(20), default='booked')  # On progress, final touches, done, archived
     client = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
     assigned_to = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=True)
     created_by = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
-    date_created = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    date_created = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    version = db.Column(db.Integer, nullable=False, default=1)  # bumped by every update, sent as the ETag
+    __mapper_args__ = {'version_id_col': version}
 
-# RegularShirtMeasurement Model
-class RegularShirtMeasurement(db.Model):
+# Inventory Model
+class Inventory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    fabric = db.Column(db.String(50), nullable=False)
-    shoulder = db.Column(db.Numeric(5, 2), nullable=True)
-    sleeves = db.Column(db.Numeric(5, 2), nullable=True)
-    chest = db.Column(db.Numeric(5, 2), nullable=True)
-    waist = db.Column(db.Numeric(5, 2), nullable=True)
-    arm = db.Column(db.Numeric(5, 2), nullable=True)
-    full_length = db.Column(db.Numeric(5, 2), nullable=True)
-    bottom_length = db.Column(db.Numeric(5, 2), nullable=True)
+    item_name = db.Column(db.String(50), nullable=False)
+    quantity = db.Column(db.Numeric(5, 2), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    status = db.Column(db.String(20), default='booked')  # On progress, final touches, done, archived
-    client = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
-    assigned_to = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=True)
     created_by = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
-    date_created = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    date_created = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    version = db.Column(db.Integer, nullable=False, default=1)  # bumped by every update, sent as the ETag
+    __mapper_args__ = {'version_id_col': version}
 
-# SenatorShirtMeasurement Model
-class SenatorShirtMeasurement(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    fabric = db.Column(db.String(50), nullable=False)
-    shoulder = db.Column(db.Numeric(5, 2), nullable=True)
-    sleeves = db.Column(db.Numeric(5, 2), nullable=True)
-    chest = db.Column(db.Numeric(5, 2), nullable=True)
-    waist = db.Column(db.Numeric(5, 2), nullable=True)
-    arm = db.Column(db.Numeric(5, 2), nullable=True)
-    full_length = db.Column(db.Numeric(5, 2), nullable=True)
-    bottom_length = db.Column(db.Numeric(5, 2), nullable=True)
-    neck = db.Column(db.Numeric(5, 2), nullable=True)
-    wrist = db.Column(db.Numeric(5, 2), nullable=True)
-    description = db.Column(db.Text, nullable=True)
-    status = db.Column(db.String(20), default='booked')  # On progress, final touches, done, archived
-    client = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
-    assigned_to = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=True)
-    created_by = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
-    date_created = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+# Change log: one row per inserted, updated or deleted row, written by changes.py
+class Change(db.Model):
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        db.Index('ix_change_log_table_name', 'table_name', 'id'),  # a table's newest change (compression.py)
+        db.Index('ix_change_log_changed_at', 'table_name', 'changed_at'),  # rows changed lately (archive.py)
+        {'sqlite_autoincrement': True},  # versions are never reused
+    )
+    id = db.Column(db.Integer, primary_key=True)  # the change's version
+    table_name = db.Column(db.String(50), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    operation = db.Column(db.String(10), nullable=False)  # insert, update, delete
+    changed_at = db.Column(db.DateTime, nullable=False)
 
-# TrouserMeasurement Model
-class TrouserMeasurement(db.Model):
+# Daily money rollup per client group and creating staff member, kept current by revenue.py
+class RevenueDaily(db.Model):
+    __tablename__ = 'revenue_daily'
+    day = db.Column(db.Date, primary_key=True)
+    group_name = db.Column(db.String(20), primary_key=True)  # 'none' for clients outside a group
+    created_by = db.Column(db.Integer, primary_key=True)
+    clients = db.Column(db.Integer, nullable=False, default=0)  # clients added
+    booked = db.Column(db.Integer, nullable=False, default=0)  # buying_price booked
+    collected = db.Column(db.Integer, nullable=False, default=0)  # balance paid down
+    balance_change = db.Column(db.Integer, nullable=False, default=0)  # net change in balance outstanding
+
+# Standard sizes for batch pre-cutting, found by size_templates.py; one row per size of a garment type
+class SizeTemplate(db.Model):
+    __tablename__ = 'size_template'
     id = db.Column(db.Integer, primary_key=True)
-    fabric = db.Column(db.String(50), nullable=False)
-    waist = db.Column(db.Numeric(5, 2), nullable=True)
-    thigh = db.Column(db.Numeric(5, 2), nullable=True)
-    knee = db.Column(db.Numeric(5, 2), nullable=True)
-    bottom = db.Column(db.Numeric(5, 2), nullable=True)
-    fly = db.Column(db.Numeric(5, 2), nullable=True)
-    hips = db.Column(db.Numeric(5, 2), nullable=True)
-    description = db.Column(db.Text, nullable=True)
-    status = db.Column(db.String(20), default='booked')  # On progress, final touches, done, archived
-    client = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
-    assigned_to = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=True)
-    created_by = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
-    date_created = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    garment_type = db.Column(db.String(20), nullable=False, index=True)
+    size = db.Column(db.Integer, nullable=False)  # 1 is the smallest
+    measurements = db.Column(db.JSON, nullable=False)  # the cluster centre, {field: inches}
+    population = db.Column(db.Integer, nullable=False)  # orders nearest to it
+    through_order = db.Column(db.Integer, nullable=False)  # highest garment_order id taken into account
+    updated_at = db.Column(db.DateTime, nullable=False)
 
-# Inventory Model
-class Inventory(db.Model):
+# Nearest size template of each garment order, written by size_templates.py
+class OrderSize(db.Model):
+    __tablename__ = 'order_size'
+    order_id = db.Column(db.Integer, primary_key=True)
+    template_id = db.Column(db.Integer, nullable=False, index=True)
+    distance = db.Column(db.Float, nullable=False)  # inches, over the fields the order has
+
+# Status changes of garment orders, written by events.py as they commit; forecast.py reads throughput from it
+class OrderStatusHistory(db.Model):
+    __tablename__ = 'order_status_history'
+    __table_args__ = (db.Index('ix_order_status_history_to_status', 'to_status', 'changed_at'),)
     id = db.Column(db.Integer, primary_key=True)
-    item_name = db.Column(db.String(50), nullable=False)
-    quantity = db.Column(db.Numeric(5, 2), nullable=False)
-    description = db.Column(db.Text, nullable=True)
-    created_by = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False)
-    date_created = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    order_id = db.Column(db.Integer, nullable=False, index=True)
+    garment_type = db.Column(db.String(20), nullable=False)
+    from_status = db.Column(db.String(20), nullable=True)  # None when the order was booked
+    to_status = db.Column(db.String(20), nullable=False)
+    tailor = db.Column(db.Integer, nullable=True)  # assigned_to after the change
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+# Responses to POSTs sent with an Idempotency-Key, replayed to retries by idempotency.py
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_key'
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)  # sha256 of the user, method, path and body
+    status = db.Column(db.Integer, nullable=True)  # None while the first request is still running
+    body = db.Column(db.Text, nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+
+# Columns never sent to clients (versions go out as ETags)
+HIDDEN_COLUMNS = {'password', 'version'}
+
+# Body measurements taken for each garment type, in job card order. A new garment
+# type only needs an entry here.
+GARMENT_FIELDS = {
+    'coat': ('shoulder', 'sleeves', 'chest', 'waist', 'arm', 'full_length', 'bottom_length'),
+    'regular_shirt': ('shoulder', 'sleeves', 'chest', 'waist', 'arm', 'full_length', 'bottom_length'),
+    'senator_shirt': ('shoulder', 'sleeves', 'chest', 'waist', 'arm', 'full_length', 'bottom_length', 'neck', 'wrist'),
+    'trouser': ('waist', 'thigh', 'knee', 'bottom', 'fly', 'hips'),
+}
+
+
+# Number new orders per garment type. The number is worked out by the INSERT
+# itself, so concurrent bookings of one type cannot both take the same one.
+# Bulk loads into a fresh table can set numbers themselves and skip this.
+@event.listens_for(GarmentOrder, 'before_insert')
+def _number_order(mapper, connection, target):
+    if target.number is not None:
+        return
+    latest = select(func.coalesce(func.max(GarmentOrder.number), 0) + 1) \
+        .where(GarmentOrder.garment_type == target.garment_type).scalar_subquery()
+    target.number = latest
@@ -0,0 +1,118 @@
+# In-process sampling profiler for production workers.
+#
+#   GET /debug/profile?seconds=10&interval_ms=5            collapsed stacks (flamegraph.pl / speedscope)
+#   GET /debug/profile?seconds=10&format=json              the same plus a per-resource breakdown
+#
+# Opt-in with PROFILER_ENABLED and admin-only. The request that starts a profile
+# samples the stacks of every other thread in the worker for the given time, so
+# it needs a threaded server (the dev server, gunicorn gthread). Each stack is
+# rooted at the resource method the thread was serving, e.g.
+# "CoatMeasurementList.get;...;sqlite3:execute".
+import sys
+import threading
+import time
+
+from flask import Response, current_app, request, session
+from flask_restful import Resource
+
+from query_log import query_source
+
+MAX_SECONDS = 60
+
+# Where a sample's time went, judged by the innermost stack frame from one of these modules
+CATEGORIES = [
+    ('hashing', ('werkzeug.security', 'hashlib', 'bcrypt', 'flask_bcrypt')),
+    ('sqlite', ('sqlite3', 'sqlalchemy', 'flask_sqlalchemy')),
+    ('serialization', ('json', 'flask.json', 'flask_restful.representations')),
+]
+
+# Thread id -> resource method it is currently serving
+_active = {}
+_running = threading.Lock()
+
+
+def mark_request():
+    _active[threading.get_ident()] = query_source()
+
+
+def clear_request(exc):
+    _active.pop(threading.get_ident(), None)
+
+
+def frame_label(frame):
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+# `modules` runs from the innermost frame outwards
+def categorize(modules):
+    for module in modules:
+        for category, prefixes in CATEGORIES:
+            if any(module == p or module.startswith(p + '.') for p in prefixes):
+                return category
+    return 'other'
+
+
+# Sample every other thread's stack for `seconds`, counting collapsed stacks
+def sample(seconds, interval):
+    me = threading.get_ident()
+    stacks = {}
+    categories = {}
+    samples = 0
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            source = _active.get(thread_id)
+            if thread_id == me or source is None:
+                continue
+            labels = []
+            modules = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                modules.append(frame.f_globals.get('__name__', ''))
+                frame = frame.f_back
+            key = ';'.join([source] + labels[::-1])
+            stacks[key] = stacks.get(key, 0) + 1
+            per_source = categories.setdefault(source, {})
+            category = categorize(modules)
+            per_source[category] = per_source.get(category, 0) + 1
+        samples += 1
+        time.sleep(interval)
+
+    return stacks, categories, samples
+
+
+def init_profiler(app):
+    if app.config.get('PROFILER_ENABLED'):
+        app.before_request(mark_request)
+        app.teardown_request(clear_request)
+
+
+class Profile(Resource):
+    def get(self):
+        if not current_app.config.get('PROFILER_ENABLED'):
+            return {"message": "Profiler is disabled"}, 404
+        if 'user_id' not in session or session.get('role') not in ['ADMIN', 'CEO']:
+            return {"message": "Unauthorized"}, 401
+
+        seconds = min(request.args.get('seconds', 10, type=float), MAX_SECONDS)
+        interval = max(request.args.get('interval_ms', 10, type=float), 1) / 1000
+
+        # One profile per worker at a time
+        if not _running.acquire(blocking=False):
+            return {"message": "A profile is already running"}, 409
+        try:
+            stacks, categories, samples = sample(seconds, interval)
+        finally:
+            _running.release()
+
+        collapsed = '\n'.join(f'{stack} {count}' for stack, count in sorted(stacks.items()))
+        if request.args.get('format') == 'json':
+            return {
+                'seconds': seconds,
+                'interval_ms': interval * 1000,
+                'samples': samples,
+                'by_resource': categories,
+                'collapsed': collapsed,
+            }
+        return Response(collapsed + '\n', mimetype='text/plain')
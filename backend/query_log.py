@@ -0,0 +1,171 @@
+# Statement timing, slow-query log and N+1 detection.
+#
+# Every statement is timed by engine events and attributed to the resource
+# method that issued it (e.g. CoatMeasurementList.get). Statements slower than
+# SLOW_QUERY_MS are logged with the shape of their bound parameters and their
+# EXPLAIN QUERY PLAN. A request that runs the same statement shape
+# N_PLUS_ONE_THRESHOLD times or more is flagged as a likely N+1. /debug/queries
+# summarises the worst offenders since the worker started.
+import logging
+import re
+import threading
+import time
+
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from flask_restful import Resource
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+WHITESPACE = re.compile(r'\s+')
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE', 'WITH')
+
+_lock = threading.Lock()
+_stats = {}       # statement shape -> aggregate timings
+_n_plus_one = {}  # (source, statement shape) -> {'requests': n, 'max_repeats': n}
+_plans = {}       # statement shape -> EXPLAIN QUERY PLAN rows
+
+
+# Statement with whitespace collapsed and IN (?, ?, ...) lists of any length folded together
+def statement_shape(statement):
+    return IN_LIST.sub('(?...)', WHITESPACE.sub(' ', statement).strip())
+
+
+def parameter_shape(parameters, executemany):
+    if executemany:
+        parameters = list(parameters)
+        return f"{len(parameters)} x {parameter_shape(parameters[0], False) if parameters else '()'}"
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f'{k}: {type(v).__name__}' for k, v in parameters.items()) + '}'
+    return '(' + ', '.join(type(v).__name__ for v in parameters or ()) + ')'
+
+
+# The resource method behind the current request, e.g. "CoatMeasurementList.get"
+def query_source():
+    if not has_request_context():
+        return 'cli'
+    view = current_app.view_functions.get(request.endpoint)
+    view_class = getattr(view, 'view_class', None)
+    if view_class is None:
+        return request.endpoint or 'unmatched'
+    return f'{view_class.__name__}.{request.method.lower()}'
+
+
+def explain(conn, statement, parameters):
+    if conn.dialect.name != 'sqlite' or not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        cursor.close()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'handle_error')
+def _drop_timer(context):
+    started = context.connection.info.get('query_started') if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info['query_started'].pop()) * 1000
+    if not has_app_context() or not current_app.config.get('QUERY_LOG_ENABLED'):
+        return
+
+    shape = statement_shape(statement)
+    source = query_source()
+
+    slow = elapsed_ms >= current_app.config['SLOW_QUERY_MS']
+    with _lock:
+        stats = _stats.get(shape)
+        if stats is None:
+            stats = _stats[shape] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'slow': 0, 'sources': {}}
+        stats['count'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        stats['sources'][source] = stats['sources'].get(source, 0) + 1
+        stats['slow'] += slow
+
+    if has_request_context():
+        shapes = g.setdefault('query_shapes', {})
+        shapes[shape] = shapes.get(shape, 0) + 1
+
+    if slow:
+        # Plans are captured once per shape; the same statement keeps the same plan
+        if shape not in _plans and not executemany:
+            _plans[shape] = explain(conn, statement, parameters)
+        log.warning(
+            "Slow query %.1fms in %s\n  %s\n  params: %s\n  plan: %s",
+            elapsed_ms, source, shape, parameter_shape(parameters, executemany),
+            '; '.join(_plans.get(shape) or ['n/a']),
+        )
+
+
+# Flag statement shapes repeated within one request
+def check_n_plus_one(exc):
+    shapes = g.pop('query_shapes', None)
+    if not shapes:
+        return
+    threshold = current_app.config['N_PLUS_ONE_THRESHOLD']
+    source = query_source()
+    for shape, repeats in shapes.items():
+        if repeats < threshold:
+            continue
+        log.warning("Possible N+1 in %s: %d x %s", source, repeats, shape)
+        with _lock:
+            entry = _n_plus_one.setdefault((source, shape), {'requests': 0, 'max_repeats': 0})
+            entry['requests'] += 1
+            entry['max_repeats'] = max(entry['max_repeats'], repeats)
+
+
+def summary(limit=20):
+    with _lock:
+        rows = [
+            {
+                'statement': shape,
+                'count': s['count'],
+                'total_ms': round(s['total_ms'], 2),
+                'mean_ms': round(s['total_ms'] / s['count'], 3),
+                'max_ms': round(s['max_ms'], 2),
+                'slow': s['slow'],
+                'sources': dict(sorted(s['sources'].items(), key=lambda item: -item[1])),
+                'plan': _plans.get(shape),
+            }
+            for shape, s in _stats.items()
+        ]
+        n_plus_one = [
+            {'source': source, 'statement': shape, **entry}
+            for (source, shape), entry in _n_plus_one.items()
+        ]
+    return {
+        'by_total_time': sorted(rows, key=lambda r: -r['total_ms'])[:limit],
+        'by_max_time': sorted(rows, key=lambda r: -r['max_ms'])[:limit],
+        'n_plus_one': sorted(n_plus_one, key=lambda r: -r['requests'] * r['max_repeats'])[:limit],
+    }
+
+
+def init_query_log(app):
+    if app.config.get('QUERY_LOG_ENABLED'):
+        app.teardown_request(check_n_plus_one)
+
+
+class DebugQueries(Resource):
+    def get(self):
+        if 'user_id' not in session or session.get('role') not in ['ADMIN', 'CEO']:
+            return {"message": "Unauthorized"}, 401
+        if not current_app.config.get('QUERY_LOG_ENABLED'):
+            return {"message": "Query log is disabled"}, 404
+
+        return summary(limit=request.args.get('limit', 20, type=int))
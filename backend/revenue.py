@@ -0,0 +1,176 @@
+# Revenue and receivables reporting from daily rollups.
+#
+#   GET /reports/revenue?from=2024-01-01&to=2024-06-30&granularity=month&by=group_name
+#
+# revenue_daily holds one row per (day, client group, creating staff member) with
+# the clients added, buying_price booked, balance paid down and the net change in
+# balance outstanding. Every flush that creates, edits or deletes clients adds its
+# deltas to today's rows (a new client counts on the day it was created) with one
+# upsert on the flush's own connection, so the rollup commits or rolls back with
+# the write. A client moved to another group is taken out of the old group's row
+# and added to the new one's. Reports only read the rollup; outstanding balance at
+# the end of each period is the running total of balance changes.
+#
+# `flask backfill-revenue` rebuilds the rollup from the clients table, e.g. after
+# a bulk load. The clients table keeps no payment history, so a rebuild books
+# every client on the day it was created with nothing collected.
+from datetime import date, datetime, timedelta
+
+from flask import jsonify, request, session
+from flask_restful import Resource
+from sqlalchemy import delete, event, func, inspect as sa_inspect, literal, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import Client, RevenueDaily
+
+# Client columns the rollup depends on
+FIELDS = ('group_name', 'created_by', 'buying_price', 'balance_amount')
+MEASURES = ('clients', 'booked', 'collected', 'balance_change')
+
+# Granularity -> the period a day falls in, as text
+PERIODS = {
+    'day': lambda day: func.date(day),
+    'week': lambda day: func.date(day, '-6 days', 'weekday 1'),  # the Monday starting the week
+    'month': lambda day: func.strftime('%Y-%m', day),
+    'year': lambda day: func.strftime('%Y', day),
+}
+
+# Breakdowns a report can be split by
+DIMENSIONS = ('group_name', 'created_by')
+
+DEFAULT_DAYS = 30
+
+
+def rollup_key(day, group_name, created_by):
+    return day, group_name or 'none', created_by
+
+
+def add_deltas(deltas, key, *values):
+    current = deltas.setdefault(key, [0] * len(MEASURES))
+    for i, value in enumerate(values):
+        current[i] += value or 0
+
+
+# A dirty client's value for `name` before this flush
+def previous(state, name):
+    history = state.attrs[name].history
+    return history.deleted[0] if history.deleted else getattr(state.obj(), name)
+
+
+# Add deltas to revenue_daily: {(day, group, staff): [clients, booked, collected, balance change]}
+def apply_deltas(connection, deltas):
+    rows = [dict(zip(('day', 'group_name', 'created_by') + MEASURES, key + tuple(values)))
+            for key, values in deltas.items() if any(values)]
+    if not rows:
+        return
+    table = RevenueDaily.__table__
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.day, table.c.group_name, table.c.created_by],
+        set_={name: table.c[name] + statement.excluded[name] for name in MEASURES},
+    )
+    connection.execute(statement, rows)
+
+
+@event.listens_for(Session, 'after_flush')
+def _rollup(session, flush_context):
+    today = datetime.now().date()
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, Client):
+            day = obj.date_created.date() if obj.date_created else today
+            add_deltas(deltas, rollup_key(day, obj.group_name, obj.created_by),
+                       1, obj.buying_price, 0, obj.balance_amount)
+    for obj in session.dirty:
+        if not isinstance(obj, Client):
+            continue
+        state = sa_inspect(obj)
+        if not any(state.attrs[name].history.has_changes() for name in FIELDS):
+            continue
+        old = {name: previous(state, name) for name in FIELDS}
+        paid = (old['balance_amount'] or 0) - (obj.balance_amount or 0)
+        add_deltas(deltas, rollup_key(today, old['group_name'], old['created_by']),
+                   -1, -(old['buying_price'] or 0), 0, -(old['balance_amount'] or 0))
+        add_deltas(deltas, rollup_key(today, obj.group_name, obj.created_by),
+                   1, obj.buying_price, max(paid, 0), obj.balance_amount)
+    for obj in session.deleted:
+        if isinstance(obj, Client):
+            add_deltas(deltas, rollup_key(today, obj.group_name, obj.created_by),
+                       -1, -(obj.buying_price or 0), 0, -(obj.balance_amount or 0))
+    apply_deltas(session.connection(), deltas)
+
+
+# Recompute revenue_daily from the clients table on `conn`; returns the rollup rows written
+def rebuild_revenue(conn):
+    conn.execute(delete(RevenueDaily.__table__))
+    columns = ('day', 'group_name', 'created_by') + MEASURES
+    day = func.date(Client.date_created)
+    group_name = func.coalesce(Client.group_name, 'none')
+    totals = select(
+        day, group_name, Client.created_by, func.count(),
+        func.coalesce(func.sum(Client.buying_price), 0), literal(0),
+        func.coalesce(func.sum(Client.balance_amount), 0),
+    ).where(Client.date_created.is_not(None)).group_by(day, group_name, Client.created_by)
+    conn.execute(insert(RevenueDaily.__table__).from_select(columns, totals))
+    return conn.scalar(select(func.count()).select_from(RevenueDaily.__table__))
+
+
+# Report rows for [start, end]: one per period (and per `by` value when given)
+def revenue_report(start, end, granularity='day', by=None):
+    table = RevenueDaily.__table__
+    period = PERIODS[granularity](table.c.day).label('period')
+    dimension = [table.c[by]] if by else []
+    sums = [func.sum(table.c[name]).label(name) for name in MEASURES]
+
+    # Outstanding balance going into the first period
+    opening = dict(db.session.execute(
+        select(*(dimension or [literal(None)]), func.coalesce(func.sum(table.c.balance_change), 0))
+        .where(table.c.day < start).group_by(*dimension)
+    ).all())
+
+    rows = db.session.execute(
+        select(period, *dimension, *sums)
+        .where(table.c.day >= start, table.c.day <= end)
+        .group_by(period, *dimension).order_by(period, *dimension)
+    ).all()
+
+    outstanding = dict(opening)
+    report = []
+    for row in rows:
+        key = row[1] if by else None
+        outstanding[key] = outstanding.get(key, 0) + row.balance_change
+        entry = {'period': row.period}
+        if by:
+            entry[by] = key
+        entry.update({'clients': row.clients, 'booked': row.booked, 'collected': row.collected,
+                      'outstanding': outstanding[key]})
+        report.append(entry)
+
+    totals = {name: sum(entry[name] for entry in report) for name in ('clients', 'booked', 'collected')}
+    totals['outstanding'] = sum(outstanding.values())
+    return report, totals
+
+
+class RevenueReport(Resource):
+    def get(self):
+        if 'user_id' not in session or session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
+            return {"message": "Unauthorized"}, 401
+
+        try:
+            end = date.fromisoformat(request.args['to']) if request.args.get('to') else date.today()
+            start = date.fromisoformat(request.args['from']) if request.args.get('from') \
+                else end - timedelta(days=DEFAULT_DAYS)
+        except ValueError:
+            return {"message": "'from' and 'to' must be dates like 2024-05-01"}, 400
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in PERIODS:
+            return {"message": f"'granularity' must be one of: {', '.join(PERIODS)}"}, 400
+        by = request.args.get('by')
+        if by is not None and by not in DIMENSIONS:
+            return {"message": f"'by' must be one of: {', '.join(DIMENSIONS)}"}, 400
+
+        periods, totals = revenue_report(start, end, granularity, by)
+        return jsonify({'from': start.isoformat(), 'to': end.isoformat(), 'granularity': granularity,
+                        'by': by, 'periods': periods, 'totals': totals})
@@ -0,0 +1,174 @@
+# Automatic tailor assignment for booked orders nobody has taken.
+#
+#   POST /work_orders/schedule              {"dry_run": true, "max_load": 25}
+#   flask --app app schedule-orders --dry-run
+#   flask --app app schedule-orders --every 300
+#
+# Pending orders (booked and unassigned, of every garment type) come off a heap
+# keyed by their client's pickup date, soonest first and undated last, then by
+# booking order. Each goes to the least-loaded tailor who makes that garment type.
+# A tailor's load is their open orders (not done or archived), and their skills
+# are the garment types they have been assigned before; a tailor with no orders
+# yet takes any type, and a type no tailor has made yet goes to any tailor.
+# Tailors at max_load take no more, so what is left waits for a later run with
+# the most urgent orders first in line. Per garment type the able tailors sit in
+# a heap keyed by load; an assignment pushes the tailor back into each of their
+# heaps, and entries left stale by it are skipped when popped. Statuses are
+# compared lowercased, as in work_orders.py, so legacy "Booked" orders count.
+#
+# Every assignment is written in one transaction, one UPDATE per tailor, and only
+# to orders still booked and unassigned, so an order someone took meanwhile keeps
+# its tailor.
+import heapq
+from datetime import datetime
+
+from flask import current_app, request, session
+from flask_restful import Resource
+from sqlalchemy import func, literal, select, union_all, update
+
+from changes import track
+from events import order_event, stage
+from extensions import db
+from models import Client, GarmentOrder, GARMENT_FIELDS, Staff
+from work_orders import CLOSED, MAX_IDS, STATUS_TRANSITIONS
+
+OPEN = [status for status in STATUS_TRANSITIONS if status not in CLOSED]
+
+
+# Open orders and garment types handled per tailor: ({tailor: load}, {tailor: {garment types}}).
+# Both queries seek (assigned_to, status, garment_type) on assigned_to and read the rest from the index.
+def tailor_loads():
+    tailors = db.session.scalars(select(Staff.id).where(Staff.role == 'TAILOR')).all()
+    loads = dict.fromkeys(tailors, 0)
+    loads.update(db.session.execute(
+        select(GarmentOrder.assigned_to, func.count())
+        .where(GarmentOrder.assigned_to.in_(tailors), func.lower(GarmentOrder.status).in_(OPEN))
+        .group_by(GarmentOrder.assigned_to)
+    ).all())
+
+    # A tailor makes a garment type if they have ever been given one
+    handled = union_all(*(
+        select(Staff.id, literal(garment)).where(Staff.role == 'TAILOR', select(GarmentOrder.id).where(
+            GarmentOrder.assigned_to == Staff.id, func.lower(GarmentOrder.status).in_(STATUS_TRANSITIONS),
+            GarmentOrder.garment_type == garment).exists())
+        for garment in GARMENT_FIELDS
+    ))
+    skills = {tailor: set() for tailor in tailors}
+    for tailor, garment in db.session.execute(handled):
+        skills[tailor].add(garment)
+    for garments in skills.values():
+        if not garments:
+            garments.update(GARMENT_FIELDS)
+    # Nobody has made these yet, so nobody would ever be given one
+    unclaimed = set(GARMENT_FIELDS).difference(*skills.values())
+    for garments in skills.values():
+        garments.update(unclaimed)
+    return loads, skills
+
+
+# Booked, unassigned orders as a heap of (pickup date, order id, garment type)
+def pending_orders():
+    orders = [
+        (pickup_date or datetime.max, id, garment)
+        for id, garment, pickup_date in db.session.execute(
+            select(GarmentOrder.id, GarmentOrder.garment_type, Client.pickup_date)
+            .join(Client, Client.id == GarmentOrder.client)
+            .where(func.lower(GarmentOrder.status) == 'booked', GarmentOrder.assigned_to.is_(None))
+        )
+    ]
+    heapq.heapify(orders)
+    return orders
+
+
+# Choose a tailor for each pending order: ({tailor: [order ids]}, {tailor: load before}, pending, left waiting)
+def plan_assignments(max_load=None):
+    loads, skills = tailor_loads()
+    before = dict(loads)
+    heaps = {garment: [] for garment in GARMENT_FIELDS}
+    for tailor, garments in skills.items():
+        for garment in garments:
+            heaps.setdefault(garment, []).append((loads[tailor], tailor))
+    for heap in heaps.values():
+        heapq.heapify(heap)
+
+    orders = pending_orders()
+    pending = len(orders)
+    plan = {}
+    waiting = 0
+    while orders:
+        _, id, garment = heapq.heappop(orders)
+        heap = heaps.get(garment)
+        # Drop entries whose tailor has taken orders since they were pushed
+        while heap and heap[0][0] != loads[heap[0][1]]:
+            heapq.heappop(heap)
+        if not heap or (max_load is not None and heap[0][0] >= max_load):
+            waiting += 1
+            continue
+        load, tailor = heapq.heappop(heap)
+        plan.setdefault(tailor, []).append(id)
+        loads[tailor] = load + 1
+        for skill in skills[tailor]:
+            heapq.heappush(heaps[skill], (load + 1, tailor))
+    return plan, before, pending, waiting
+
+
+# Write the planned assignments in one transaction; returns the order ids assigned
+def apply_assignments(plan):
+    table = GarmentOrder.__table__
+    assigned = []
+    for tailor, ids in plan.items():
+        for start in range(0, len(ids), MAX_IDS):
+            rows = db.session.execute(
+                update(table)
+                .where(table.c.id.in_(ids[start:start + MAX_IDS]), func.lower(table.c.status) == 'booked',
+                       table.c.assigned_to.is_(None))
+                .values(assigned_to=tailor, version=table.c.version + 1)
+                .returning(table.c.id, table.c.garment_type, table.c.number, table.c.status,
+                           table.c.assigned_to, table.c.client)
+            ).all()
+            for row in rows:
+                event = order_event(row)
+                event['previous_status'] = row.status
+                event['previous_assigned_to'] = None
+                stage(db.session, event)
+                assigned.append(row.id)
+    track(db.session, [(table.name, id, 'update') for id in assigned])
+    db.session.commit()
+    return assigned
+
+
+# Assign pending orders to tailors (or only plan it when dry_run); returns the report.
+# max_load=None places no limit on a tailor's open orders.
+def schedule(dry_run=False, max_load=None):
+    plan, before, pending, waiting = plan_assignments(max_load)
+    if dry_run:
+        db.session.rollback()
+        assigned = {id for ids in plan.values() for id in ids}
+    else:
+        assigned = set(apply_assignments(plan))
+    usernames = dict(db.session.execute(select(Staff.id, Staff.username).where(Staff.id.in_(before))).all())
+    return {
+        'dry_run': dry_run,
+        'max_load': max_load,
+        'pending': pending,
+        'assigned': len(assigned),
+        'waiting': waiting,
+        'skipped': pending - waiting - len(assigned),  # taken or moved on while scheduling
+        'tailors': [
+            {'id': tailor, 'username': usernames.get(tailor), 'load_before': load,
+             'orders': [id for id in plan.get(tailor, ()) if id in assigned]}
+            for tailor, load in sorted(before.items())
+        ],
+    }
+
+
+class Schedule(Resource):
+    def post(self):
+        if 'user_id' not in session or session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
+            return {"message": "Unauthorized"}, 401
+
+        data = request.get_json(silent=True) or {}
+        max_load = data.get('max_load', current_app.config['SCHEDULER_MAX_LOAD'])
+        if max_load is not None and (not isinstance(max_load, int) or isinstance(max_load, bool) or max_load < 1):
+            return {"message": "'max_load' must be a whole number of orders, 1 or more"}, 400
+        return schedule(dry_run=bool(data.get('dry_run')), max_load=max_load)
@@ -0,0 +1,177 @@
+# Synthetic data for scale testing, written with Core bulk inserts.
+#
+# Rows are built as plain dicts and inserted in large executemany batches inside
+# a single transaction, bypassing the ORM, the per-request password hashing and
+# the one-commit-per-row pattern of the API. The same seed always produces the
+# same rows on an empty database; every account gets the password "password".
+import random
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, func, select
+from werkzeug.security import generate_password_hash
+
+from extensions import db
+from models import Staff, AdvanceLoan, Client, Inventory, GarmentOrder, GARMENT_FIELDS
+from revenue import rebuild_revenue
+
+# Body measurements in inches: (mean, standard deviation)
+BODY = {
+    'shoulder': (17.5, 1.2), 'sleeves': (24.5, 1.5), 'chest': (40, 4), 'waist': (34, 4.5), 'arm': (13, 1.5),
+    'full_length': (30, 2), 'bottom_length': (21, 2), 'neck': (15.5, 1), 'wrist': (7, 0.5),
+    'thigh': (24, 2.5), 'knee': (17, 1.5), 'bottom': (15, 1.2), 'fly': (11, 1), 'hips': (41, 4),
+}
+
+# Share of orders per garment type
+GARMENT_WEIGHTS = {'coat': 25, 'regular_shirt': 30, 'senator_shirt': 20, 'trouser': 25}
+
+FABRICS = ['wool', 'linen', 'cotton', 'polyester', 'kitenge', 'silk', 'tweed', 'gabardine']
+FIRST_NAMES = ['Amina', 'Brian', 'Cynthia', 'David', 'Esther', 'Felix', 'Grace', 'Hassan', 'Irene', 'James',
+               'Kevin', 'Lucy', 'Mercy', 'Njeri', 'Otieno', 'Peter', 'Rose', 'Samuel', 'Wanjiru', 'Zawadi']
+
+
+def next_id(conn, model):
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bulk_insert(conn, model, rows, batch_size):
+    count = 0
+    statement = insert(model.__table__)
+    for batch in batched(rows, batch_size):
+        conn.execute(statement, batch)
+        count += len(batch)
+    return count
+
+
+# A client's measurements share one size factor, so the profiles stay plausible
+def body_value(field, size, rng):
+    mean, sd = BODY[field]
+    return round((mean + sd * (0.8 * size + 0.6 * rng.gauss(0, 1))) * 2) / 2
+
+
+def order_status(age_days, rng):
+    if age_days > 60:
+        return rng.choice(['done', 'done', 'done', 'archived'])
+    if age_days > 14:
+        return rng.choice(['on progress', 'final touches', 'done'])
+    return rng.choice(['booked', 'booked', 'on progress'])
+
+
+def seed(clients=10000, measurements=100000, tailors=20, managers=3, inventory=200, seed=1,
+         batch_size=50000, days=365, log=print):
+    rng = random.Random(seed)
+    password = generate_password_hash('password')
+    now = datetime(2024, 1, 1) + timedelta(days=days)
+    started = time.perf_counter()
+    totals = {}
+
+    with db.engine.begin() as conn:
+        if conn.dialect.name == 'sqlite':
+            # Only this connection, only while seeding: no fsync per page and an in-memory journal
+            conn.exec_driver_sql('PRAGMA synchronous=OFF')
+            conn.exec_driver_sql('PRAGMA journal_mode=MEMORY')
+
+        # Staff: one admin, some managers, the tailors
+        first_staff = next_id(conn, Staff)
+        roles = ['ADMIN'] + ['MANAGER'] * managers + ['TAILOR'] * tailors
+        staff_rows = [
+            {'id': first_staff + i, 'username': f'{rng.choice(FIRST_NAMES)} {i}', 'national_id': 10000000 + first_staff + i,
+             'phone': f'07{rng.randint(0, 99999999):08d}', 'email': f'staff{first_staff + i}@example.com',
+             'passport': 'logo', 'role': role, 'salary': rng.randint(15, 80) * 1000 if role != 'ADMIN' else None,
+             'password': password, 'created_at': now - timedelta(days=days)}
+            for i, role in enumerate(roles)
+        ]
+        totals['staff'] = bulk_insert(conn, Staff, staff_rows, batch_size)
+        creators = [s['id'] for s in staff_rows if s['role'] in ('ADMIN', 'MANAGER')]
+        tailor_ids = [s['id'] for s in staff_rows if s['role'] == 'TAILOR']
+
+        # Clients: about a third belong to a group order (weddings, choirs) of 5-30 people
+        first_client = next_id(conn, Client)
+        sizes = {}
+        created = {}
+
+        def client_rows():
+            group, left = None, 0
+            for i in range(clients):
+                id = first_client + i
+                if left == 0 and rng.random() < 0.03:
+                    group, left = f'party-{id}', rng.randint(5, 30)
+                name = group if left else 'none'
+                left = max(left - 1, 0)
+                date_created = now - timedelta(days=rng.random() * days)
+                price = rng.randint(20, 400) * 100
+                sizes[id] = rng.gauss(0, 1)
+                created[id] = date_created
+                yield {
+                    'id': id, 'username': f'{rng.choice(FIRST_NAMES)} {id}', 'phone': f'07{rng.randint(0, 99999999):08d}',
+                    'email': f'client{id}@example.com', 'password': password, 'buying_price': price,
+                    'balance_amount': rng.choice([0, 0, price // 2, price]),
+                    'pickup_date': date_created + timedelta(days=rng.randint(7, 45)),
+                    'group_name': name, 'created_by': rng.choice(creators), 'date_created': date_created,
+                }
+        totals['client'] = bulk_insert(conn, Client, client_rows(), batch_size)
+        client_ids = list(sizes)
+
+        # Garment orders, split across the garment types and numbered per type
+        garments = rng.choices(list(GARMENT_WEIGHTS), weights=list(GARMENT_WEIGHTS.values()), k=measurements)
+        numbers = dict(conn.execute(
+            select(GarmentOrder.garment_type, func.max(GarmentOrder.number)).group_by(GarmentOrder.garment_type)
+        ).all())
+
+        def order_rows():
+            for garment in garments:
+                client = rng.choice(client_ids)
+                size = sizes[client]
+                date_created = created[client] + timedelta(hours=rng.random() * 48)
+                age = (now - date_created).days
+                status = order_status(age, rng)
+                numbers[garment] = numbers.get(garment, 0) + 1
+                yield {
+                    'garment_type': garment, 'number': numbers[garment], 'fabric': rng.choice(FABRICS),
+                    'measurements': {f: body_value(f, size, rng) for f in GARMENT_FIELDS[garment]},
+                    'description': None, 'status': status, 'client': client,
+                    'assigned_to': rng.choice(tailor_ids) if status != 'booked' or rng.random() < 0.5 else None,
+                    'created_by': rng.choice(creators), 'date_created': date_created,
+                }
+        # Into an empty table it is quicker to build the secondary indexes once, after loading
+        indexes = GarmentOrder.__table__.indexes if not numbers else set()
+        for index in indexes:
+            index.drop(conn)
+        totals['garment_order'] = bulk_insert(conn, GarmentOrder, order_rows(), batch_size)
+        for index in indexes:
+            index.create(conn)
+
+        # Advances and loans for the tailors, inventory of fabric rolls
+        loan_rows = [
+            {'amount': rng.randint(5, 100) * 100, 'type': rng.choice(['ADVANCE', 'LOAN']), 'taken_by': tailor,
+             'status': rng.choice(['in consideration', 'Approved', 'Rejected', 'Paid']), 'comment': None,
+             'date_taken': now - timedelta(days=rng.random() * days)}
+            for tailor in tailor_ids for _ in range(rng.randint(0, 12))
+        ]
+        totals['advance_loan'] = bulk_insert(conn, AdvanceLoan, loan_rows, batch_size)
+        inventory_rows = [
+            {'item_name': f'{rng.choice(FABRICS)} roll {i}', 'quantity': rng.randint(1, 999) / 10,
+             'description': None, 'created_by': rng.choice(creators), 'date_created': now - timedelta(days=rng.random() * days)}
+            for i in range(inventory)
+        ]
+        totals['inventory'] = bulk_insert(conn, Inventory, inventory_rows, batch_size)
+
+        # Bulk inserts skip the ORM hooks that keep the revenue rollup current
+        rebuild_revenue(conn)
+
+    elapsed = time.perf_counter() - started
+    rows = sum(totals.values())
+    log(', '.join(f'{n} {table}' for table, n in totals.items()))
+    log(f'{rows} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)')
+    return totals
@@ -0,0 +1,173 @@
+# Standard sizes for batch pre-cutting, found by k-means over our own customers.
+#
+#   flask --app app size-templates --garments coat,trouser --sizes 8
+#
+# A garment type's complete profiles (orders with every field taken) are
+# clustered with Lloyd's k-means in NumPy, seeded by k-means++. The cluster
+# centres become size_template rows, numbered from the smallest, with the number
+# of orders nearest to each, and every order of the type is mapped to its nearest
+# template in order_size (orders with fields missing are matched on the fields
+# they have). Garment types are clustered side by side in threads: NumPy releases
+# the GIL in the array work, so this needs no copying of profiles into processes.
+#
+# A later run only reads the orders booked since the previous one. Each is
+# mapped to its nearest existing template and that template's centre moves to the
+# running mean of its members (one mini-batch k-means step). --full clusters a
+# type again from scratch, e.g. once deleted orders have thinned the counts.
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import delete, insert, select
+
+from extensions import db
+from measurement_search import ProfileMatrix
+from models import GarmentOrder, GARMENT_FIELDS, OrderSize, SizeTemplate
+
+DEFAULT_GARMENTS = ('coat', 'trouser')
+DEFAULT_SIZES = 8
+MAX_ITERATIONS = 100
+TOLERANCE = 0.01  # inches a centre may still move when the clustering is taken as settled
+WRITE_BATCH = 50000
+
+
+# Squared distance of every profile to every centre, over the fields each
+# profile has: profiles are the columns of `columns` (fields x n), centres the
+# rows of `centroids` (k x fields). Returns an n x k array.
+def distances(columns, centroids):
+    total = np.zeros((columns.shape[1], len(centroids)))
+    for field, values in enumerate(columns):
+        difference = values[:, None] - centroids[None, :, field]
+        np.square(difference, out=difference)
+        total += np.nan_to_num(difference, nan=0.0)
+    return total
+
+
+def kmeans_plus_plus(points, k, rng):
+    centroids = [points[rng.integers(len(points))]]
+    nearest = ((points - centroids[0]) ** 2).sum(axis=1)
+    for _ in range(1, k):
+        centroids.append(points[rng.choice(len(points), p=nearest / nearest.sum())])
+        nearest = np.minimum(nearest, ((points - centroids[-1]) ** 2).sum(axis=1))
+    return np.array(centroids)
+
+
+# Lloyd's k-means over complete profiles (fields x n); returns the centres
+def kmeans(columns, k, rng):
+    points = np.ascontiguousarray(columns.T)
+    centroids = kmeans_plus_plus(points, k, rng)
+    for _ in range(MAX_ITERATIONS):
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, and |x|^2 does not change which centre is nearest
+        labels = ((centroids ** 2).sum(axis=1) - 2 * points @ centroids.T).argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.stack([np.bincount(labels, weights=values, minlength=k) for values in columns], axis=1)
+        moved = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centroids)
+        shift = np.abs(moved - centroids).max()
+        centroids = moved
+        if shift < TOLERANCE:
+            break
+    return centroids
+
+
+# Nearest centre and distance in inches for every profile that has any field taken
+def assign(columns, centroids):
+    measured = ~np.isnan(columns).all(axis=0)
+    squared = distances(columns[:, measured], centroids)
+    labels = squared.argmin(axis=1)
+    return measured, labels, np.sqrt(squared[np.arange(len(labels)), labels])
+
+
+# Cluster (or update) one garment type; runs in a worker thread and touches no database
+def fit(garment, ids, columns, existing, sizes, seed):
+    columns = columns.astype(np.float64)
+    if existing:
+        centroids = np.array([[t.measurements[f] for f in GARMENT_FIELDS[garment]] for t in existing])
+        population = np.array([t.population for t in existing], dtype=np.int64)
+    else:
+        complete = columns[:, ~np.isnan(columns).any(axis=0)]
+        k = min(sizes, complete.shape[1])
+        if k == 0:
+            return None
+        centroids = kmeans(complete, k, np.random.default_rng(seed))
+        population = np.zeros(k, dtype=np.int64)
+
+    measured, labels, distance = assign(columns, centroids)
+    counts = np.bincount(labels, minlength=len(centroids))
+    if existing:
+        # Move each centre to the running mean of its old and new members, over complete profiles
+        complete = ~np.isnan(columns[:, measured]).any(axis=0)
+        new = np.bincount(labels[complete], minlength=len(centroids))
+        sums = np.stack([np.bincount(labels[complete], weights=values[measured][complete], minlength=len(centroids))
+                         for values in columns], axis=1)
+        weight = population + new
+        centroids = np.where(new[:, None] > 0,
+                             (centroids * population[:, None] + sums) / np.maximum(weight, 1)[:, None], centroids)
+    return centroids, population + counts, ids[measured], labels, distance
+
+
+# Write a type's templates and its orders' sizes in one transaction
+def save(conn, garment, result, existing, through_order):
+    centroids, population, ids, labels, distance = result
+    fields = GARMENT_FIELDS[garment]
+    now = datetime.now()
+    templates = SizeTemplate.__table__
+    if existing:
+        template_ids = [t.id for t in existing]
+        for template_id, centre, count in zip(template_ids, centroids, population):
+            conn.execute(templates.update().where(templates.c.id == template_id).values(
+                measurements={f: round(float(v), 2) for f, v in zip(fields, centre)},
+                population=int(count), through_order=through_order, updated_at=now))
+    else:
+        old = select(templates.c.id).where(templates.c.garment_type == garment)
+        conn.execute(delete(OrderSize.__table__).where(OrderSize.template_id.in_(old)))
+        conn.execute(delete(templates).where(templates.c.garment_type == garment))
+        # Sizes numbered from the smallest overall
+        order = np.argsort(centroids.sum(axis=1), kind='stable')
+        rank = np.empty_like(order)
+        rank[order] = np.arange(1, len(order) + 1)
+        template_ids = [conn.execute(insert(templates).values(
+            garment_type=garment, size=int(size), measurements={f: round(float(v), 2) for f, v in zip(fields, centre)},
+            population=int(count), through_order=through_order, updated_at=now,
+        )).inserted_primary_key[0] for centre, count, size in zip(centroids, population, rank)]
+
+    template_ids = np.array(template_ids)
+    rows = [{'order_id': order_id, 'template_id': template_id, 'distance': round(d, 3)}
+            for order_id, template_id, d in zip(ids.tolist(), template_ids[labels].tolist(), distance.tolist())]
+    statement = insert(OrderSize.__table__).prefix_with('OR REPLACE')
+    for start in range(0, len(rows), WRITE_BATCH):
+        conn.execute(statement, rows[start:start + WRITE_BATCH])
+    return len(rows)
+
+
+# Cluster or update every garment type in `garments`; returns {garment: orders mapped}
+def build_size_templates(garments=DEFAULT_GARMENTS, sizes=DEFAULT_SIZES, full=False, seed=1, log=print):
+    jobs = {}
+    for garment in garments:
+        existing = [] if full else db.session.execute(
+            select(SizeTemplate.id, SizeTemplate.measurements, SizeTemplate.population, SizeTemplate.through_order)
+            .where(SizeTemplate.garment_type == garment).order_by(SizeTemplate.id)
+        ).all()
+        since = existing[0].through_order if existing else 0
+        ids, columns = ProfileMatrix(garment).load(GarmentOrder.id > since)
+        if not len(ids):
+            log(f"  {garment}: no new orders since order {since}")
+            continue
+        log(f"  {garment}: {'updating' if existing else 'clustering'} with {len(ids)} orders")
+        jobs[garment] = (ids, columns, existing, int(ids.max()))
+    db.session.rollback()  # release the read snapshot before writing
+
+    with ThreadPoolExecutor(max_workers=max(len(jobs), 1)) as pool:
+        futures = {garment: pool.submit(fit, garment, ids, columns, existing, sizes, seed)
+                   for garment, (ids, columns, existing, _) in jobs.items()}
+        results = {garment: future.result() for garment, future in futures.items()}
+
+    mapped = {}
+    for garment, result in results.items():
+        if result is None:
+            log(f"  {garment}: no complete profiles to cluster")
+            continue
+        _, _, existing, through_order = jobs[garment]
+        with db.engine.begin() as conn:
+            mapped[garment] = save(conn, garment, result, existing, through_order)
+        log(f"  {garment}: {len(result[0])} sizes, {mapped[garment]} orders mapped")
+    return mapped
@@ -0,0 +1,57 @@
+# Fixtures shared by the backend tests: an app on a fresh SQLite file, its
+# staff, and test clients logged in as them.
+import os
+import sys
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from extensions import db  # noqa: E402
+from models import Staff  # noqa: E402
+
+PASSWORD = 'secret'
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'METRICS_DIR': None,
+        'QUERY_LOG_ENABLED': False,
+    })
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Staff(username='admin', national_id=1, phone='0700000001', email='admin@example.com',
+                  role='ADMIN', salary=50000, password=generate_password_hash(PASSWORD)),
+            Staff(username='tailor', national_id=2, phone='0700000002', email='tailor@example.com',
+                  role='TAILOR', salary=20000, password=generate_password_hash(PASSWORD)),
+        ])
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def login(app, email):
+    client = app.test_client()
+    response = client.post('/login', json={'email': email, 'password': PASSWORD})
+    assert response.status_code == 200, response.get_json()
+    return client
+
+
+# Logged in as the ADMIN
+@pytest.fixture
+def admin(app):
+    return login(app, 'admin@example.com')
+
+
+# Logged in as a TAILOR
+@pytest.fixture
+def tailor(app):
+    return login(app, 'tailor@example.com')
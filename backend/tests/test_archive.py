@@ -0,0 +1,36 @@
+# Archiving finished orders records them as deleted for /changes
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from archive import archive_finished
+from extensions import db
+from models import Change, Client, GarmentOrder
+
+
+def test_archived_orders_are_sent_as_deletes(app, admin):
+    old = datetime.now() - timedelta(days=400)
+    with app.app_context():
+        db.session.add(Client(username='wanjiku', phone='0711111111', email='w@example.com', password='x',
+                              created_by=1))
+        db.session.flush()
+        db.session.add_all([
+            GarmentOrder(garment_type='coat', fabric='wool', status='Done', client=1, created_by=1, date_created=old),
+            GarmentOrder(garment_type='coat', fabric='wool', status='booked', client=1, created_by=1,
+                         date_created=old),
+            GarmentOrder(garment_type='coat', fabric='wool', status='done', client=1, created_by=1),
+        ])
+        db.session.commit()
+        db.session.execute(update(Change).values(changed_at=old))
+        db.session.commit()
+
+    since = admin.get('/changes').get_json()['version']
+    with app.app_context():
+        moved = archive_finished(db.engine, 180, log=lambda message: None)
+    assert moved == {'garment_order': 1, 'advance_loan': 0}
+
+    changes = admin.get(f'/changes?since={since}').get_json()['changes']
+    assert [(c['table'], c['id'], c['operation']) for c in changes] == [('garment_order', 1, 'delete')]
+
+    assert [o['id'] for o in admin.get('/garment_orders').get_json()] == [2, 3]
+    assert [o['id'] for o in admin.get('/garment_orders?include_archived=1').get_json()] == [1, 2, 3]
@@ -0,0 +1,38 @@
+# POST /batch runs every call, in order, and one failing does not stop the rest
+import gzip
+import json
+
+from extensions import db
+from models import Inventory
+
+
+def test_failures_are_isolated(app, admin):
+    with app.app_context():
+        db.session.add(Inventory(item_name='wool', quantity=10, created_by=1))
+        db.session.commit()
+
+    response = admin.post('/batch', json={'requests': [
+        {'method': 'GET', 'path': '/inventory/99'},
+        {'method': 'PATCH', 'path': '/inventory/1', 'headers': {'If-Match': '"7"'}, 'body': {'quantity': 1}},
+        {'method': 'POST', 'path': '/inventories', 'body': {'item_name': 'thread'}},
+        {'method': 'PATCH', 'path': '/inventory/1', 'headers': {'If-Match': '"1"'}, 'body': {'quantity': 4}},
+        {'method': 'GET', 'path': '/inventory/1'},
+        {'method': 'GET', 'path': '/events'},
+    ]})
+    assert response.status_code == 200
+    results = response.get_json()['responses']
+    assert [r['status'] for r in results] == [404, 412, 400, 200, 200, 400]
+    assert results[4]['headers']['ETag'] == '"2"'
+    assert float(results[4]['body']['quantity']) == 4
+
+
+def test_sub_responses_are_not_compressed(app, admin):
+    for index in range(40):
+        admin.post('/inventories', json={'item_name': f'item {index}', 'quantity': 1, 'created_by': 1,
+                                         'description': 'a fairly long description ' * 4})
+    response = admin.post('/batch', json={'requests': [
+        {'method': 'GET', 'path': '/inventories', 'headers': {'accept-encoding': 'gzip'}},
+    ]}, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    body = json.loads(gzip.decompress(response.get_data()))
+    assert len(body['responses'][0]['body']) == 40
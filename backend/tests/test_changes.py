@@ -0,0 +1,53 @@
+# /changes sends what changed after a client's version, compacted and in pages
+from extensions import db
+from models import AdvanceLoan, Inventory
+
+
+def write(app):
+    with app.app_context():
+        db.session.add_all(Inventory(item_name=name, quantity=10, created_by=1) for name in ('wool', 'linen', 'silk'))
+        db.session.commit()
+        db.session.get(Inventory, 1).quantity = 4
+        db.session.commit()
+        db.session.add(Inventory(item_name='cotton', quantity=1, created_by=1))
+        db.session.commit()
+        db.session.delete(db.session.get(Inventory, 4))
+        db.session.commit()
+
+
+def test_compacted(app, admin):
+    start = admin.get('/changes').get_json()
+    assert start['changes'] == [] and not start['more']
+    write(app)
+
+    page = admin.get(f'/changes?since={start["version"]}').get_json()
+    assert page['version'] == start['version'] + 6 and not page['more']
+    # Item 1 once with its latest values; item 4 came and went, so it is not sent
+    assert [(c['id'], c['operation'], float(c['row']['quantity'])) for c in page['changes']] == \
+        [(2, 'upsert', 10), (3, 'upsert', 10), (1, 'upsert', 4)]
+    assert admin.get(f'/changes?since={page["version"]}').get_json() == \
+        {'version': page['version'], 'changes': [], 'more': False}
+
+
+def test_paging(app, admin):
+    version = admin.get('/changes').get_json()['version']
+    write(app)
+
+    pages = []
+    while True:
+        page = admin.get(f'/changes?since={version}&limit=2').get_json()
+        pages.append(([c['id'] for c in page['changes']], page['version'] - version))
+        version = page['version']
+        if not page['more']:
+            break
+    # Each page covers two log entries; the last holds cotton's insert and delete, which cancel out
+    assert pages == [([1, 2], 2), ([3, 1], 2), ([], 2)]
+
+
+def test_staff_see_their_own_private_rows(app, tailor):
+    version = tailor.get('/changes').get_json()['version']
+    with app.app_context():
+        db.session.add_all(AdvanceLoan(amount=5000, type='ADVANCE', taken_by=staff) for staff in (1, 2))
+        db.session.commit()
+    changes = tailor.get(f'/changes?since={version}').get_json()['changes']
+    assert [(c['table'], c['row']['taken_by']) for c in changes] == [('advance_loan', 2)]
@@ -0,0 +1,27 @@
+# Client routes take pickup dates as ISO strings and reject anything else with a 400
+from extensions import db
+from models import Client
+
+CLIENT = {'username': 'achieng', 'phone': '0722222222', 'email': 'a@example.com', 'password': 'x',
+          'balance_amount': 0, 'created_by': 1}
+BAD_DATE = "'pickup_date' must be a date like 2024-05-01"
+
+
+def test_create_with_pickup_date(app, admin):
+    assert admin.post('/create_client', json={**CLIENT, 'pickup_date': '2024-05-01'}).status_code == 201
+    with app.app_context():
+        assert db.session.query(Client.pickup_date).scalar().isoformat() == '2024-05-01T00:00:00'
+
+
+def test_bad_pickup_date(app, admin):
+    for value in ('next week', '2024-13-01', 20240501):
+        for path in ('/create_client', '/clients'):
+            response = admin.post(path, json={**CLIENT, 'pickup_date': value})
+            assert response.status_code == 400 and response.get_json()['message'] == BAD_DATE
+    with app.app_context():
+        assert db.session.query(Client).count() == 0
+
+    assert admin.post('/clients', json={**CLIENT, 'pickup_date': None}).status_code == 201
+    response = admin.patch('/client/1', json={'username': 'renamed', 'pickup_date': 'soon'})
+    assert response.status_code == 400 and response.get_json()['message'] == BAD_DATE
+    assert admin.get('/client/1').get_json()['username'] == 'achieng'
@@ -0,0 +1,56 @@
+# List routes cache their serialised and compressed bodies per table version
+import gzip
+import threading
+
+import compression
+
+
+def add_inventory(admin, count):
+    for index in range(count):
+        response = admin.post('/inventories', json={'item_name': f'item {index}', 'quantity': 1, 'created_by': 1,
+                                                    'description': 'a fairly long description ' * 4})
+        assert response.status_code == 201
+
+
+def test_compressed_list_and_not_modified(app, admin):
+    add_inventory(admin, 30)
+    plain = admin.get('/inventories')
+    assert 'Content-Encoding' not in plain.headers and len(plain.get_json()) == 30
+
+    packed = admin.get('/inventories', headers={'Accept-Encoding': 'gzip'})
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in packed.headers['Vary']
+    assert gzip.decompress(packed.get_data()) == plain.get_data()
+    assert len(packed.get_data()) < len(plain.get_data()) / 4
+    assert 'gzip' in compression._cache['/inventories?'][3]
+
+    etag = packed.headers['ETag']
+    assert etag.startswith('W/') and etag == plain.headers['ETag']
+    cached = admin.get('/inventories', headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.get_data() == b''
+
+    add_inventory(admin, 1)
+    fresh = admin.get('/inventories', headers={'If-None-Match': etag})
+    assert fresh.status_code == 200 and fresh.headers['ETag'] != etag
+    assert len(fresh.get_json()) == 31
+
+
+def test_concurrent_requests_share_the_cache(app, admin):
+    add_inventory(admin, 2)
+    cookie = admin.get_cookie('session').value
+    statuses = []
+
+    def fetch(offset):
+        client = app.test_client()
+        client.set_cookie('session', cookie)
+        for index in range(20):
+            # Distinct query strings are distinct cache entries, so entries are evicted throughout
+            statuses.append(client.get(f'/inventories?n={offset * 20 + index}').status_code)
+
+    threads = [threading.Thread(target=fetch, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert statuses == [200] * 160
+    assert len(compression._cache) <= compression.RESPONSE_CACHE_SIZE
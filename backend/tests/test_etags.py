@@ -0,0 +1,72 @@
+# Item routes send their row's version as the ETag and check If-Match against it
+import pytest
+from sqlalchemy import event, update
+
+from extensions import db
+from models import AdvanceLoan, Inventory
+
+
+@pytest.fixture
+def item(app, admin):
+    with app.app_context():
+        db.session.add(Inventory(item_name='wool', quantity=10, created_by=1))
+        db.session.commit()
+    return admin.get('/inventory/1').headers['ETag']
+
+
+# Have another writer change the row between the handler's read and its UPDATE
+@pytest.fixture
+def concurrent_write():
+    def bump(mapper, connection, target):
+        table = Inventory.__table__
+        with db.engine.begin() as other:
+            other.execute(update(table).where(table.c.id == target.id).values(version=table.c.version + 1))
+
+    event.listen(Inventory, 'before_update', bump, once=True)
+    yield
+    if event.contains(Inventory, 'before_update', bump):
+        event.remove(Inventory, 'before_update', bump)
+
+
+def test_etag_and_not_modified(admin, item):
+    assert item == '"1"'
+    assert admin.get('/inventory/1', headers={'If-None-Match': item}).status_code == 304
+
+
+def test_if_match(admin, item):
+    assert admin.patch('/inventory/1', json={'quantity': 8}, headers={'If-Match': item}).status_code == 200
+    assert admin.get('/inventory/1').headers['ETag'] == '"2"'
+
+    stale = admin.patch('/inventory/1', json={'quantity': 5}, headers={'If-Match': item})
+    assert stale.status_code == 412
+    assert admin.delete('/inventory/1', headers={'If-Match': item}).status_code == 412
+    assert float(admin.get('/inventory/1').get_json()['quantity']) == 8
+
+
+def test_lost_race_is_412_with_if_match(admin, item, concurrent_write):
+    response = admin.patch('/inventory/1', json={'quantity': 5}, headers={'If-Match': item})
+    assert response.status_code == 412
+    assert float(admin.get('/inventory/1').get_json()['quantity']) == 10
+
+
+def test_lost_race_retries_without_if_match(admin, item, concurrent_write):
+    assert admin.patch('/inventory/1', json={'quantity': 5}).status_code == 200
+    response = admin.get('/inventory/1')
+    assert float(response.get_json()['quantity']) == 5
+    assert response.headers['ETag'] == '"3"'
+
+
+# A staff member's loans are listed together, so each one carries its own version
+def test_loan_versions_for_if_match(app, tailor):
+    with app.app_context():
+        db.session.add(AdvanceLoan(amount=5000, type='ADVANCE', taken_by=2))
+        db.session.commit()
+    loan, = tailor.get('/advance_loan/2').get_json()
+    assert loan['version'] == 1
+    path, version = f'/advance_loan/{loan["id"]}', f'"{loan["version"]}"'
+
+    assert tailor.patch(path, json={'amount': 4000}, headers={'If-Match': version}).status_code == 200
+    assert tailor.get('/advance_loan/2').get_json()[0]['version'] == 2
+    stale = tailor.patch(path, json={'amount': 3000}, headers={'If-Match': version})
+    assert stale.status_code == 412
+    assert tailor.get('/advance_loan/2').get_json()[0]['amount'] == 4000
@@ -0,0 +1,13 @@
+# /events must not leave a subscriber behind when it fails before streaming
+import events
+
+
+def test_failed_replay_unsubscribes(app, admin, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(events, 'replay', broken)
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    subscribers = len(events.bus)
+    assert admin.get('/events', headers={'Last-Event-ID': '5'}).status_code == 500
+    assert len(events.bus) == subscribers
@@ -0,0 +1,34 @@
+# The roll planner sets open orders' fabric against the rolls in stock
+from extensions import db
+from fabric_plan import best_fit_decreasing
+from models import Client, GarmentOrder, Inventory
+
+
+def test_best_fit_decreasing():
+    placed, left, unplaced = best_fit_decreasing(
+        [(3.0, 'a'), (1.0, 'b'), (2.5, 'c'), (6.0, 'd')], [(4.0, 1), (3.0, 2)])
+    # Largest first, each into the roll it leaves the least on: 3 fills the 3 m roll exactly
+    assert placed == {1: ['c', 'b'], 2: ['a']}
+    assert left == {1: 0.5, 2: 0.0}
+    assert unplaced == ['d']
+
+
+def test_plan_skips_closed_orders(app, admin):
+    with app.app_context():
+        db.session.add(Client(username='wanjiku', phone='0711111111', email='w@example.com', password='x',
+                              created_by=1))
+        db.session.flush()
+        db.session.add_all(
+            [GarmentOrder(garment_type='trouser', fabric='wool', status=status, client=1, created_by=1,
+                          measurements={'hips': 40})
+             for status in ('booked', 'On progress', 'Done', 'Archived')]
+            + [Inventory(item_name='Wool roll 1', quantity=3, created_by=1),
+               Inventory(item_name='linen roll', quantity=10, created_by=1)])
+        db.session.commit()
+
+    report = admin.get('/fabric/plan?fabric=wool').get_json()
+    [wool] = report['fabrics']
+    # Two open trousers of (41 + 8) inches, 1.24 m each, fit one 3 m roll
+    assert (wool['orders'], wool['demand_m'], wool['rolls_used'], wool['unplanned_orders']) == (2, 2.48, 1, 0)
+    assert [o['id'] for o in report['rolls'][0]['orders']] == [1, 2]
+    assert report['rolls'][0]['left_m'] == 0.52
@@ -0,0 +1,38 @@
+# The capacity forecast counts every open order's remaining work
+from datetime import date, datetime, timedelta
+
+from extensions import db
+from models import Client, GarmentOrder
+
+
+def add_orders(app, orders):
+    today = datetime.combine(date.today(), datetime.min.time())
+    with app.app_context():
+        for offset in sorted({offset for _, offset in orders}):
+            db.session.add(Client(username=f'client{offset}', phone='0711111111', email=f'c{offset}@example.com',
+                                  password='x', created_by=1, pickup_date=today + timedelta(days=offset)))
+        db.session.flush()
+        clients = {c.pickup_date: c.id for c in Client.query}
+        db.session.add_all([GarmentOrder(garment_type='coat', fabric='wool', status=status, created_by=1,
+                                         client=clients[today + timedelta(days=offset)])
+                            for status, offset in orders])
+        db.session.commit()
+
+
+def test_open_work_by_status(app, admin):
+    add_orders(app, [('Booked', 3), ('On progress', 3), ('final touches', 3), ('Done', 3), ('booked', -1)])
+    report = admin.get('/reports/capacity?days=7').get_json()
+    assert report['open_orders'] == 4
+    assert report['overdue'] == 1 and report['at_risk'] == 1
+    assert [o['id'] for o in report['at_risk_orders']] == [5]
+    assert round(sum(day['demand'] for day in report['daily']), 2) == 2.8  # 1 + 1 + 0.6 + 0.2
+    assert report['daily'][0]['due_orders'] == 1 and report['daily'][3]['due_orders'] == 3
+    # The one tailor at the default rate
+    assert report['capacity_per_workday'] == 3.0
+
+
+def test_cached_until_an_order_changes(app, admin):
+    add_orders(app, [('booked', 3)])
+    assert admin.get('/reports/capacity').get_json()['open_orders'] == 1
+    add_orders(app, [('booked', 4)])
+    assert admin.get('/reports/capacity').get_json()['open_orders'] == 2
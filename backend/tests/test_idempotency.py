@@ -0,0 +1,45 @@
+# A retried POST with the same Idempotency-Key gets the first response back
+import uuid
+
+import pytest
+
+from extensions import db
+from models import Client
+
+CLIENT = {'username': 'wanjiku', 'phone': '0711111111', 'email': 'w@example.com', 'password': 'x',
+          'created_by': 1}
+
+
+# Responses are also kept per worker, which outlives each test's database
+@pytest.fixture
+def key():
+    return str(uuid.uuid4())
+
+
+def clients(app):
+    with app.app_context():
+        return db.session.query(Client).count()
+
+
+def test_retry_is_replayed(app, admin, key):
+    first = admin.post('/create_client', json=CLIENT, headers={'Idempotency-Key': key})
+    retry = admin.post('/create_client', json=CLIENT, headers={'Idempotency-Key': key})
+    assert first.status_code == retry.status_code == 201
+    assert retry.get_json() == first.get_json()
+    assert retry.headers['Idempotent-Replayed'] == 'true' and 'Idempotent-Replayed' not in first.headers
+    assert clients(app) == 1
+
+
+def test_key_reused_for_another_request(app, admin, key):
+    assert admin.post('/create_client', json=CLIENT, headers={'Idempotency-Key': key}).status_code == 201
+    other = admin.post('/create_client', json={**CLIENT, 'email': 'x@example.com'}, headers={'Idempotency-Key': key})
+    assert other.status_code == 422
+    assert clients(app) == 1
+
+
+def test_errors_are_not_kept(app, admin, key):
+    bad = admin.post('/create_client', json={**CLIENT, 'created_by': 2}, headers={'Idempotency-Key': key})
+    assert bad.status_code == 403  # a TAILOR cannot be the creator
+    fixed = admin.post('/create_client', json=CLIENT, headers={'Idempotency-Key': key})
+    assert fixed.status_code == 201 and 'Idempotent-Replayed' not in fixed.headers
+    assert clients(app) == 1
@@ -0,0 +1,106 @@
+# The async reads in asgi.py must answer exactly as the Flask routes do
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+from asgi import AsyncReadApp
+from extensions import db
+from models import AdvanceLoan, Client, GarmentOrder, Inventory
+
+ROUTES = ['/staffs', '/clients', '/advance_loans', '/inventories', '/coat_measurements',
+          '/staff/1', '/client/1', '/advance_loan/2', '/inventory/1', '/coat_measurement/1',
+          '/staff/99', '/inventory/99', '/advance_loan/99']
+
+
+@pytest.fixture
+def data(app):
+    with app.app_context():
+        client = Client(username='wanjiku', phone='0711111111', email='wanjiku@example.com', password='x',
+                        buying_price=9000, balance_amount=3000, pickup_date=datetime(2024, 5, 1),
+                        group_name='bridal', created_by=1)
+        db.session.add(client)
+        db.session.flush()
+        db.session.add_all([
+            AdvanceLoan(amount=5000, type='ADVANCE', taken_by=2, status='Approved', comment='rent'),
+            Inventory(item_name='wool', quantity=12.5, description='navy', created_by=1),
+            GarmentOrder(garment_type='coat', fabric='wool', measurements={'chest': 40}, client=client.id,
+                         created_by=1, date_created=datetime(2024, 4, 1)),
+        ])
+        db.session.commit()
+
+
+def asgi_get(application, path, cookie, headers=(), method='GET', body=b''):
+    scope = {
+        'type': 'http', 'http_version': '1.1', 'method': method, 'path': path, 'query_string': b'', 'root_path': '',
+        'scheme': 'http', 'server': ('localhost', 80), 'client': ('127.0.0.1', 1234),
+        'headers': [(b'cookie', f'session={cookie}'.encode()), *headers],
+    }
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        try:
+            await application(scope, receive, send)
+        finally:
+            if application.engine is not None:
+                await application.engine.dispose()
+                application.engine = None
+
+    asyncio.run(run())
+    headers = {name.decode(): value.decode() for name, value in sent[0]['headers']}
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    return sent[0]['status'], headers, json.loads(body) if body else None
+
+
+@pytest.mark.parametrize('path', ROUTES)
+def test_asgi_matches_flask(app, tailor, data, path):
+    application = AsyncReadApp(app)
+    cookie = tailor.get_cookie('session').value
+
+    flask = tailor.get(path)
+    status, headers, body = asgi_get(application, path, cookie)
+    assert status == flask.status_code
+    assert body == flask.get_json()
+    assert headers.get('etag') == flask.headers.get('ETag')
+
+
+def test_lists_hide_private_fields(app, tailor, data):
+    application = AsyncReadApp(app)
+    cookie = tailor.get_cookie('session').value
+    _, _, staff = asgi_get(application, '/staffs', cookie)
+    _, _, clients = asgi_get(application, '/clients', cookie)
+    assert not {'national_id', 'salary', 'created_at', 'password'} & set(staff[0])
+    assert not {'buying_price', 'password'} & set(clients[0])
+
+
+def test_list_etag_is_shared(app, tailor, data):
+    application = AsyncReadApp(app)
+    cookie = tailor.get_cookie('session').value
+    etag = tailor.get('/clients').headers['ETag']
+    assert etag.startswith('W/')
+
+    status, _, body = asgi_get(application, '/clients', cookie, [(b'if-none-match', etag.encode())])
+    assert status == 304 and body is None
+    assert tailor.get('/clients', headers={'If-None-Match': etag}).status_code == 304
+
+    with app.app_context():
+        db.session.get(Client, 1).balance_amount = 0
+        db.session.commit()
+    status, headers, _ = asgi_get(application, '/clients', cookie, [(b'if-none-match', etag.encode())])
+    assert status == 200 and headers['etag'] != etag
+    assert tailor.get('/clients').headers['ETag'] == headers['etag']
+
+
+def test_other_requests_go_to_flask(app, tailor):
+    application = AsyncReadApp(app)
+    cookie = tailor.get_cookie('session').value
+    for _ in range(2):  # each in a fresh context, also on a kept-alive connection
+        status, _, body = asgi_get(application, '/logout', cookie, method='POST')
+        assert (status, body) == (200, {"message": "Logged out successfully"})
@@ -0,0 +1,53 @@
+# /measurements/similar ranks earlier profiles by weighted distance to the given measurements
+import pytest
+
+import measurement_search
+from extensions import db
+from measurement_search import ProfileMatrix
+from models import Client, GarmentOrder
+
+COATS = [{'chest': 40, 'waist': 34}, {'chest': 44, 'waist': 38}, {'chest': 41, 'waist': 30}, {'waist': 34},
+         {'chest': 38, 'waist': 35}]
+
+
+# The matrices outlive each test's database, so give the test a new one
+@pytest.fixture
+def coats(app, monkeypatch):
+    monkeypatch.setitem(measurement_search._matrices, 'coat', ProfileMatrix('coat'))
+    with app.app_context():
+        db.session.add(Client(username='wanjiku', phone='0711111111', email='w@example.com', password='x',
+                              created_by=1))
+        db.session.flush()
+        db.session.add_all(GarmentOrder(garment_type='coat', fabric='wool', status='booked', client=1, created_by=1,
+                                        measurements=m) for m in COATS)
+        db.session.commit()
+
+
+def similar(client, query):
+    response = client.get(f'/measurements/similar?garment=coat&{query}')
+    assert response.status_code == 200
+    return [(m['id'], m['distance']) for m in response.get_json()['matches']]
+
+
+def test_nearest_first(admin, coats):
+    # Order 4 has no chest, so it cannot be compared
+    assert similar(admin, 'chest=40&waist=34') == [(1, 0.0), (5, 2.236), (3, 4.123), (2, 5.657)]
+    assert similar(admin, 'chest=40&waist=34&k=2') == [(1, 0.0), (5, 2.236)]
+    # Weighting the chest puts 3 (one inch off) ahead of 5 (two inches off)
+    assert [id for id, _ in similar(admin, 'chest=40&waist=34&weights=chest:10,waist:0')][:3] == [1, 3, 5]
+
+
+def test_changes_are_picked_up(app, admin, coats):
+    assert similar(admin, 'chest=42&waist=36&k=1') == [(1, 2.828)]
+    with app.app_context():
+        db.session.add(GarmentOrder(garment_type='coat', fabric='wool', status='booked', client=1, created_by=1,
+                                    measurements={'chest': 42, 'waist': 36}))
+        db.session.get(GarmentOrder, 1).measurements = {'chest': 30, 'waist': 30}
+        db.session.commit()
+    assert similar(admin, 'chest=42&waist=36&k=2') == [(6, 0.0), (2, 2.828)]
+
+
+def test_bad_query(admin):
+    assert admin.get('/measurements/similar?garment=cape&chest=40').status_code == 400
+    assert admin.get('/measurements/similar?garment=coat').status_code == 400
+    assert admin.get('/measurements/similar?garment=coat&chest=big').status_code == 400
@@ -0,0 +1,54 @@
+# /metrics keeps the counts of threads and workers that have gone, without keeping them around
+import json
+import re
+import subprocess
+import sys
+import threading
+
+import metrics
+
+
+def count(text, route):
+    found = re.search(rf'http_requests_total{{route="{re.escape(route)}",method="GET",status="200"}} (\d+)', text)
+    return int(found.group(1)) if found else 0
+
+
+def in_flight(text):
+    return int(re.search(r'http_requests_in_flight (\d+)', text).group(1))
+
+
+def test_exited_threads_are_folded_into_one_shard(app, admin):
+    before = count(admin.get('/metrics').get_data(as_text=True), '/staffs')
+
+    def fetch():
+        client = app.test_client()
+        client.set_cookie('session', admin.get_cookie('session').value)
+        assert client.get('/staffs').status_code == 200
+
+    for _ in range(5):
+        threads = [threading.Thread(target=fetch) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    text = admin.get('/metrics').get_data(as_text=True)
+    assert count(text, '/staffs') == before + 50
+    assert len(metrics._shards) <= 2  # this thread's and the one serving the scrape
+
+
+def test_exited_workers_snapshots_are_retired(app, admin, tmp_path):
+    directory = tmp_path / 'metrics'
+    directory.mkdir()
+    app.config['METRICS_DIR'] = str(directory)
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    snapshot = metrics.as_snapshot({('/exited', 'GET', 200): 7}, {name: {} for name in metrics.HISTOGRAMS}, 3)
+    (directory / f'metrics-{exited.pid}.json').write_text(json.dumps(snapshot))
+
+    own = in_flight(admin.get('/metrics').get_data(as_text=True))
+    text = admin.get('/metrics').get_data(as_text=True)
+    assert count(text, '/exited') == 7
+    assert in_flight(text) == own
+    assert not (directory / f'metrics-{exited.pid}.json').exists()
+    assert (directory / metrics.RETIRED).exists()
@@ -0,0 +1,61 @@
+# The daily revenue rollup books each client on the day it was created
+from datetime import datetime, timezone
+
+import pytest
+
+import models
+from extensions import db
+from revenue import rebuild_revenue
+
+
+class Clock(datetime):
+    current = datetime(2024, 5, 1, 9, tzinfo=timezone.utc)
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.current
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(models, 'datetime', Clock)
+    monkeypatch.setattr(Clock, 'current', datetime(2024, 5, 1, 9, tzinfo=timezone.utc))
+    return Clock
+
+
+def create_client(admin, email, **fields):
+    response = admin.post('/create_client', json={
+        'username': email.split('@')[0], 'phone': '0711111111', 'email': email, 'password': 'x',
+        'group_name': 'bridal', 'created_by': 1, **fields,
+    })
+    assert response.status_code == 201, response.get_json()
+
+
+def test_clients_are_booked_on_their_own_day(admin, clock):
+    create_client(admin, 'a@example.com', buying_price=9000, balance_amount=4000)
+    clock.current = datetime(2024, 5, 3, 15, tzinfo=timezone.utc)
+    create_client(admin, 'b@example.com', buying_price=6000, balance_amount=1000)
+
+    report = admin.get('/reports/revenue?from=2024-05-01&to=2024-05-31').get_json()
+    assert report['periods'] == [
+        {'period': '2024-05-01', 'clients': 1, 'booked': 9000, 'collected': 0, 'outstanding': 4000},
+        {'period': '2024-05-03', 'clients': 1, 'booked': 6000, 'collected': 0, 'outstanding': 5000},
+    ]
+    assert report['totals'] == {'clients': 2, 'booked': 15000, 'collected': 0, 'outstanding': 5000}
+
+
+def test_payment_is_collected_and_rebuild_matches(app, admin, clock):
+    create_client(admin, 'a@example.com', buying_price=9000, balance_amount=4000)
+    etag = admin.get('/client/1').headers['ETag']
+    assert admin.patch('/client/1', json={'balance_amount': 1500}, headers={'If-Match': etag}).status_code == 200
+
+    report = admin.get('/reports/revenue?from=2000-01-01&to=2100-01-01&granularity=year').get_json()
+    assert report['totals'] == {'clients': 1, 'booked': 9000, 'collected': 2500, 'outstanding': 1500}
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            rebuild_revenue(conn)
+    rebuilt = admin.get('/reports/revenue?from=2024-05-01&to=2024-05-01').get_json()
+    assert rebuilt['periods'] == [
+        {'period': '2024-05-01', 'clients': 1, 'booked': 9000, 'collected': 0, 'outstanding': 1500},
+    ]
@@ -0,0 +1,68 @@
+# Booked orders go to the least-loaded tailor who makes the garment, soonest pickup first
+from datetime import datetime
+
+from werkzeug.security import generate_password_hash
+
+from extensions import db
+from models import Client, GarmentOrder, Staff
+
+
+def setup(app, orders):
+    with app.app_context():
+        db.session.add(Staff(username='tailor2', national_id=3, phone='0700000003', email='tailor2@example.com',
+                             role='TAILOR', password=generate_password_hash('x')))
+        for day in (20, 5):
+            db.session.add(Client(username=f'client{day}', phone='0711111111', email=f'c{day}@example.com',
+                                  password='x', created_by=1, pickup_date=datetime(2024, 5, day)))
+        db.session.flush()
+        db.session.add_all([GarmentOrder(garment_type=garment, fabric='wool', status=status, client=client,
+                                         assigned_to=tailor, created_by=1)
+                            for garment, status, client, tailor in orders])
+        db.session.commit()
+
+
+def assignments(app):
+    with app.app_context():
+        return {o.id: o.assigned_to for o in GarmentOrder.query.filter_by(status='booked')}
+
+
+def test_orders_go_to_tailors_who_make_them(app, admin):
+    setup(app, [
+        ('coat', 'done', 1, 2),
+        ('regular_shirt', 'done', 1, 3),
+        ('coat', 'booked', 1, None),
+        ('regular_shirt', 'booked', 2, None),
+        ('trouser', 'booked', 1, None),  # nobody has made one yet
+    ])
+    report = admin.post('/work_orders/schedule', json={}).get_json()
+    assert (report['pending'], report['assigned'], report['waiting']) == (3, 3, 0)
+    assigned = assignments(app)
+    assert assigned[3] == 2 and assigned[4] == 3 and assigned[5] in (2, 3)
+
+
+def test_soonest_pickup_first_under_max_load(app, admin):
+    setup(app, [
+        ('coat', 'done', 1, 2),
+        ('coat', 'done', 1, 3),
+        ('coat', 'booked', 1, None),  # pickup on the 20th
+        ('coat', 'booked', 2, None),  # pickup on the 5th
+        ('coat', 'booked', 2, None),
+    ])
+    report = admin.post('/work_orders/schedule', json={'max_load': 1, 'dry_run': True}).get_json()
+    assert (report['assigned'], report['waiting']) == (2, 1)
+    assert sorted(id for tailor in report['tailors'] for id in tailor['orders']) == [4, 5]
+    assert assignments(app) == {3: None, 4: None, 5: None}
+
+
+def test_legacy_statuses(app, admin):
+    setup(app, [
+        ('coat', 'Done', 1, 2),
+        ('coat', 'Done', 1, 3),
+        ('coat', 'On progress', 1, 2),  # tailor 2 is busier
+        ('coat', 'Booked', 2, None),
+    ])
+    report = admin.post('/work_orders/schedule', json={}).get_json()
+    assert (report['pending'], report['assigned']) == (1, 1)
+    assert {t['id']: t['load_before'] for t in report['tailors']} == {2: 1, 3: 0}
+    with app.app_context():
+        assert db.session.get(GarmentOrder, 4).assigned_to == 3
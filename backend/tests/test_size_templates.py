@@ -0,0 +1,56 @@
+# Size templates cluster complete profiles and map every order to its nearest size
+import numpy as np
+
+from extensions import db
+from models import Client, GarmentOrder, OrderSize, SizeTemplate
+from size_templates import build_size_templates, kmeans
+
+SMALL = {'thigh': 22, 'knee': 16, 'bottom': 14, 'fly': 10, 'hips': 36}
+LARGE = {'thigh': 28, 'knee': 20, 'bottom': 18, 'fly': 12, 'hips': 46}
+
+
+def test_kmeans_separates_groups():
+    rng = np.random.default_rng(0)
+    points = np.concatenate([rng.normal(30, 0.5, (50, 3)), rng.normal(45, 0.5, (50, 3))])
+    centres = kmeans(points.T, 2, np.random.default_rng(1))
+    centres = centres[np.argsort(centres[:, 0])]
+    assert np.allclose(centres, [points[:50].mean(axis=0), points[50:].mean(axis=0)])
+
+
+def add_trousers(app, profiles):
+    with app.app_context():
+        db.session.add_all(GarmentOrder(garment_type='trouser', fabric='wool', status='booked', client=1, created_by=1,
+                                        measurements=m) for m in profiles)
+        db.session.commit()
+
+
+def templates(app):
+    with app.app_context():
+        return [(t.size, t.measurements, t.population, t.through_order)
+                for t in SizeTemplate.query.order_by(SizeTemplate.size)]
+
+
+def test_build_then_update(app):
+    with app.app_context():
+        db.session.add(Client(username='wanjiku', phone='0711111111', email='w@example.com', password='x',
+                              created_by=1))
+        db.session.commit()
+    add_trousers(app, [{'waist': waist, **LARGE} for waist in (40, 41, 42)]
+                 + [{'waist': waist, **SMALL} for waist in (30, 31, 32)] + [{'waist': 41}])
+
+    with app.app_context():
+        assert build_size_templates(['trouser'], sizes=2, log=lambda line: None) == {'trouser': 7}
+        sizes = {row.order_id: row.template_id for row in OrderSize.query}
+    small, large = templates(app)
+    assert small == (1, {'waist': 31.0, **SMALL}, 3, 7)
+    assert large == (2, {'waist': 41.0, **LARGE}, 4, 7)
+    # The order with only a waist goes to the size with that waist
+    assert sizes[7] == sizes[1] != sizes[4]
+
+    # A later run folds only the new order into its nearest size
+    add_trousers(app, [{'waist': 46, **LARGE}])
+    with app.app_context():
+        assert build_size_templates(['trouser'], sizes=2, log=lambda line: None) == {'trouser': 1}
+    small, large = templates(app)
+    assert small == (1, {'waist': 31.0, **SMALL}, 3, 8)
+    assert large == (2, {'waist': 42.0, **LARGE}, 5, 8)
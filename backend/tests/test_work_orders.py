@@ -0,0 +1,35 @@
+# Bulk status transitions compare statuses case-insensitively
+from extensions import db
+from models import Client, GarmentOrder
+
+
+def add_orders(app, *statuses):
+    with app.app_context():
+        db.session.add(Client(username='wanjiku', phone='0711111111', email='w@example.com', password='x',
+                              created_by=1))
+        db.session.flush()
+        db.session.add_all([GarmentOrder(garment_type='coat', fabric='wool', status=status, client=1, created_by=1)
+                            for status in statuses])
+        db.session.commit()
+
+
+def statuses(app):
+    with app.app_context():
+        return [o.status for o in GarmentOrder.query.order_by(GarmentOrder.id)]
+
+
+def test_legacy_status_moves_on(app, admin):
+    add_orders(app, 'On progress', 'on progress', 'booked')
+    response = admin.post('/work_orders/bulk_update', json={'filter': {'status': 'On Progress'},
+                                                            'status': 'Final touches'})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['updated'] == 2
+    assert statuses(app) == ['final touches', 'final touches', 'booked']
+
+
+def test_invalid_transition_is_rejected(app, admin):
+    add_orders(app, 'Booked', 'done')
+    response = admin.post('/work_orders/bulk_update', json={'ids': [1, 2], 'status': 'final touches'})
+    assert response.status_code == 409
+    assert response.get_json()['rejected'] == {'booked -> final touches': 1, 'done -> final touches': 1}
+    assert statuses(app) == ['Booked', 'done']
@@ -0,0 +1,151 @@
+# Bulk status transitions and reassignment of garment orders.
+#
+#   POST /work_orders/bulk_update
+#   {"ids": [12, 13, 14], "status": "done"}
+#   {"filter": {"assigned_to": 7, "status": "on progress"}, "assigned_to": 9}
+#
+# Orders are picked by garment_order id or by a filter on garment_type, status,
+# assigned_to and client, across garment types. The matched orders are counted
+# per (status, tailor) group in one query, every group is checked against
+# STATUS_TRANSITIONS, and each allowed group is then changed with one UPDATE,
+# all in a single transaction. If any order would make a transition that is not
+# allowed nothing is changed and the response is a 409 listing them, unless
+# "skip_invalid" is set, in which case only the allowed orders are changed.
+#
+# Statuses are compared lowercased, as archive.py does, so orders saved with a
+# legacy spelling ("On progress") move like any other; the new status is
+# written lowercased.
+from flask import request, session
+from flask_restful import Resource
+from sqlalchemy import func, select, update
+
+from changes import track
+from events import order_event, stage
+from extensions import db
+from models import GarmentOrder, Staff
+
+# Where an order may move from each status (lowercase)
+STATUS_TRANSITIONS = {
+    'booked': {'on progress'},
+    'on progress': {'booked', 'final touches'},
+    'final touches': {'on progress', 'done'},
+    'done': {'archived'},
+    'archived': set(),
+}
+
+# Orders past these statuses are no longer reassigned
+CLOSED = {'done', 'archived'}
+
+FILTERS = ('garment_type', 'status', 'assigned_to', 'client')
+MAX_IDS = 10000
+
+
+def normal(status):
+    return status.lower() if isinstance(status, str) else status
+
+
+def match_condition(data):
+    if 'ids' in data:
+        ids = data['ids']
+        if not isinstance(ids, list) or not ids or len(ids) > MAX_IDS or not all(isinstance(i, int) for i in ids):
+            raise ValueError(f"'ids' must be a list of 1 to {MAX_IDS} order ids")
+        return GarmentOrder.id.in_(ids)
+
+    criteria = data.get('filter') or {}
+    unknown = set(criteria) - set(FILTERS)
+    if unknown or not criteria:
+        raise ValueError(f"'filter' must use one or more of: {', '.join(FILTERS)}")
+    return db.and_(*(func.lower(GarmentOrder.status) == normal(value) if name == 'status'
+                     else getattr(GarmentOrder, name) == value for name, value in criteria.items()))
+
+
+# Why a group of orders may not take the change, or None
+def rejection(status, assigned_to, values):
+    status = normal(status)
+    new_status = values.get('status', status)
+    if new_status != status and new_status not in STATUS_TRANSITIONS.get(status, ()):
+        return f"{status} -> {new_status}"
+    if values.get('assigned_to', assigned_to) != assigned_to and new_status in CLOSED:
+        return f"reassigning {new_status} orders"
+    return None
+
+
+# Apply `values` (status, assigned_to or both) to the orders matching `condition`.
+# Returns the report and whether anything was applied.
+def bulk_update(condition, values, skip_invalid=False):
+    groups = db.session.execute(
+        select(GarmentOrder.status, GarmentOrder.assigned_to, func.count())
+        .where(condition)
+        .group_by(GarmentOrder.status, GarmentOrder.assigned_to)
+    ).all()
+
+    report = {'matched': sum(count for _, _, count in groups), 'updated': 0, 'unchanged': 0,
+              'rejected': {}, 'by_garment': {}}
+    allowed = []
+    for status, assigned_to, count in groups:
+        if values.get('status', normal(status)) == normal(status) and \
+                values.get('assigned_to', assigned_to) == assigned_to:
+            report['unchanged'] += count
+            continue
+        reason = rejection(status, assigned_to, values)
+        if reason:
+            report['rejected'][reason] = report['rejected'].get(reason, 0) + count
+        else:
+            allowed.append((status, assigned_to))
+
+    if report['rejected'] and not skip_invalid:
+        return report, False
+
+    # One UPDATE per (status, tailor) group, so each changed order's previous state is known
+    table = GarmentOrder.__table__
+    changed = []
+    for status, assigned_to in allowed:
+        group = table.c.assigned_to.is_(None) if assigned_to is None else table.c.assigned_to == assigned_to
+        rows = db.session.execute(
+            update(table)
+            .where(condition, table.c.status == status, group)
+            .values(**values, version=table.c.version + 1)
+            .returning(table.c.id, table.c.garment_type, table.c.number, table.c.status,
+                       table.c.assigned_to, table.c.client)
+        ).all()
+        for row in rows:
+            event = order_event(row)
+            event['previous_status'] = status
+            event['previous_assigned_to'] = assigned_to
+            stage(db.session, event)
+            report['by_garment'][row.garment_type] = report['by_garment'].get(row.garment_type, 0) + 1
+            changed.append(row.id)
+
+    track(db.session, [(table.name, id, 'update') for id in changed])
+    db.session.commit()
+    report['updated'] = len(changed)
+    return report, True
+
+
+class BulkUpdate(Resource):
+    def post(self):
+        if 'user_id' not in session or session.get('role') not in ['ADMIN', 'CEO', 'MANAGER']:
+            return {"message": "Unauthorized"}, 401
+
+        data = request.get_json() or {}
+        values = {name: data[name] for name in ('status', 'assigned_to') if name in data}
+        if 'status' in values:
+            values['status'] = normal(values['status'])
+        if not values:
+            return {"message": "Provide a new 'status', 'assigned_to' or both"}, 400
+        if 'status' in values and values['status'] not in STATUS_TRANSITIONS:
+            return {"message": f"Unknown status '{values['status']}'"}, 400
+        if values.get('assigned_to') is not None and not db.session.get(Staff, values['assigned_to']):
+            return {"message": f"Staff member {values['assigned_to']} not found"}, 400
+        try:
+            condition = match_condition(data)
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+        report, applied = bulk_update(condition, values, bool(data.get('skip_invalid')))
+        if 'ids' in data:
+            found = set(db.session.scalars(select(GarmentOrder.id).where(condition)))
+            report['missing'] = sorted(set(data['ids']) - found)
+        if not applied:
+            return {"message": "Some orders cannot take this change; nothing was updated", **report}, 409
+        return report